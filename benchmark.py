@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+框架性能基准脚本
+测量Appium HTTP客户端在默认配置和调优配置下的单命令开销，以及页面对象在模拟服务器上的操作耗时
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from appium.webdriver.appium_connection import AppiumConnection
+from appium.webdriver.client_config import AppiumClientConfig
+from src.config import config
+from src.core.http_client import create_command_executor
+from src.core.fake_appium import FakeAppiumServer
+
+
+BENCH_COMMAND = 'benchStatus'
+
+
+def _percentile(samples, percent):
+    """计算百分位数"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+    return ordered[index]
+
+
+def _run_commands(executor, requests_count: int, threads: int) -> list:
+    """并发执行命令，返回每条命令的耗时（毫秒）"""
+    executor.add_command(BENCH_COMMAND, 'GET', '/status')
+
+    def one_call(_):
+        start = time.perf_counter()
+        executor.execute(BENCH_COMMAND, {})
+        return (time.perf_counter() - start) * 1000
+
+    # 预热连接
+    one_call(0)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(one_call, range(requests_count)))
+
+
+def _print_result(name: str, samples: list, elapsed: float):
+    """输出一组结果"""
+    print(f"{name:<10} 请求数: {len(samples):<6} 吞吐: {len(samples) / elapsed:8.1f} req/s  "
+          f"平均: {statistics.mean(samples):7.2f}ms  p50: {_percentile(samples, 50):7.2f}ms  "
+          f"p99: {_percentile(samples, 99):7.2f}ms")
+
+
+def bench_client(server_url: str, requests_count: int, threads: int):
+    """对比默认客户端与调优客户端的单命令开销"""
+    print(f"服务器: {server_url}  并发线程: {threads}")
+
+    executors = {
+        '默认配置': AppiumConnection(client_config=AppiumClientConfig(server_url)),
+        '调优配置': create_command_executor(server_url),
+    }
+    for name, executor in executors.items():
+        start = time.perf_counter()
+        samples = _run_commands(executor, requests_count, threads)
+        _print_result(name, samples, time.perf_counter() - start)
+
+
+def bench_fake(hierarchy: str, latency: float, iterations: int):
+    """在模拟Appium服务器上测量页面对象常用操作的端到端耗时（含框架开销）"""
+    from src.core import driver_manager
+    from src.pages.app.login_page import LoginPage
+
+    with FakeAppiumServer(hierarchy, latency=latency) as server:
+        print(f"模拟服务器: {server.server_url}  页面层级: {hierarchy}  注入延迟: {latency * 1000:.0f}ms")
+        driver = driver_manager.create_drivers([{'name': 'bench', 'platform': 'android',
+                                                 'server_url': server.server_url}])['bench']
+        page = LoginPage(driver)
+        operations = {
+            'find(text)': lambda: page.find_element(LoginPage.LOGIN_BUTTON),
+            'find(xpath)': lambda: page.find_element(LoginPage.PHONE_INPUT_ALT),
+            'click': lambda: page.click(LoginPage.GET_VERIFICATION_CODE_BUTTON),
+            'send_keys': lambda: page.send_keys(LoginPage.PHONE_INPUT_ALT, '13800000000'),
+            'page_source': lambda: driver.page_source,
+            'screenshot': lambda: driver.get_screenshot_as_base64(),
+            'window_size': lambda: driver.get_window_size(),
+        }
+        try:
+            for name, operation in operations.items():
+                operation()
+                samples = []
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    op_start = time.perf_counter()
+                    operation()
+                    samples.append((time.perf_counter() - op_start) * 1000)
+                _print_result(name, samples, time.perf_counter() - start)
+        finally:
+            driver_manager.quit_driver('bench')
+        print(f"服务器收到请求: {server.request_count}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="框架性能基准")
+    subparsers = parser.add_subparsers(dest="command", help="可用基准")
+
+    client_parser = subparsers.add_parser("client", help="HTTP客户端单命令开销")
+    client_parser.add_argument("--server", default=config.get_appium_config().get('server_url', 'http://localhost:4723'),
+                               help="Appium服务器地址")
+    client_parser.add_argument("--requests", type=int, default=500, help="请求数量")
+    client_parser.add_argument("--threads", type=int, default=4, help="并发线程数")
+
+    fake_parser = subparsers.add_parser("fake", help="页面对象在模拟Appium服务器上的操作耗时")
+    fake_parser.add_argument("--hierarchy", default=config.get('fake_appium.hierarchy', './src/pages/app/login.xml'),
+                             help="页面层级XML")
+    fake_parser.add_argument("--latency", type=float, default=0.0, help="每条命令注入的延迟（秒）")
+    fake_parser.add_argument("--iterations", type=int, default=200, help="每个操作的执行次数")
+
+    args = parser.parse_args()
+
+    if args.command == "client":
+        bench_client(args.server.replace('/wd/hub', ''), args.requests, args.threads)
+    elif args.command == "fake":
+        bench_fake(args.hierarchy, args.latency, args.iterations)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
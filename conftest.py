@@ -44,6 +44,15 @@ def pytest_configure(config):
     config.addinivalue_line(
         "markers", "ios: iOS测试用例"
     )
+    config.addinivalue_line(
+        "markers", "isolation(level): 用例要求的应用隔离级别 none/restart/clear_data/reinstall（会话池启用时生效）"
+    )
+    
+    # 线程并行执行：同一进程内多个线程各自驱动一台设备
+    threads = config.getoption("--threads")
+    if threads > 1:
+        from src.utils.thread_executor import ThreadExecutorPlugin
+        config.pluginmanager.register(ThreadExecutorPlugin(threads), "thread_executor")
 
 
 def pytest_sessionstart(session):
@@ -51,6 +60,23 @@ def pytest_sessionstart(session):
     print("\\n" + "="*80)
     print("UI自动化测试开始执行")
     print("="*80)
+    
+    # 多设备并行预安装APK（只在主进程执行，xdist worker创建会话时索引已是最新）
+    from src.core.apk_installer import apk_installer
+    from src.core.command_cassette import cassette_session
+    if (not hasattr(session.config, 'workerinput') and not appium_server_manager.fake_enabled
+            and cassette_session.mode == 'off'):
+        # 主进程并行启动Appium服务器池并负责监控，xdist worker直接使用已运行的实例
+        if session.config.getoption('--platform') != 'web':
+            servers = appium_server_manager.start_pool()
+            if servers:
+                print(f"Appium服务器池: {sum(servers.values())}/{len(servers)} 个实例就绪")
+        
+        results = apk_installer.preinstall()
+        if results:
+            installed = [serial for serial, result in results.items() if result is True]
+            print(f"APK预安装: {len(results)} 台设备, 安装 {len(installed)} 台, "
+                  f"跳过 {sum(result is False for result in results.values())} 台")
 
 
 def pytest_sessionfinish(session, exitstatus):
@@ -58,9 +84,72 @@ def pytest_sessionfinish(session, exitstatus):
     print("\\n" + "="*80)
     print("UI自动化测试执行完成")
     print(f"退出状态: {exitstatus}")
+    
+    # 导出命令耗时统计
+    from src.utils.command_metrics import command_metrics
+    if command_metrics.enabled:
+        command_metrics.export()
+    
+    # 输出会话预热命中统计
+    from src.core import driver_manager
+    if driver_manager.prewarm_enabled:
+        stats = driver_manager.pool.stats
+        print(f"会话预热: 命中 {stats['prewarm_hits']}, 部分命中 {stats['prewarm_partial']}, "
+              f"未命中 {stats['prewarm_misses']}, 浪费 {stats['prewarm_wasted']}, 累计等待 {stats['prewarm_wait']:.2f}s")
+    
+    # 在会话结束时并行清理驱动（atexit中的清理只作为兜底），输出释放缓慢的会话
+    from src.config import config as app_config
+    from src.core.session_teardown import format_teardown_report
+    driver_manager.shutdown()
+    slow_lines = format_teardown_report(driver_manager.teardown_results,
+                                        app_config.get('driver_teardown.slow_threshold', 5))
+    if slow_lines:
+        print("释放缓慢的会话:")
+        for line in slow_lines:
+            print(f"  {line}")
+    
+    # 输出每台设备完整初始化与快速启动的会话启动耗时
+    from src.core.fast_start import fast_start, format_start_times
+    if fast_start.enabled:
+        for line in format_start_times(fast_start.load()):
+            print(line)
+    
+    # 输出Appium服务器池各实例的负载，之后停止监控（默认实例保持运行，下次运行直接复用）
+    if (not hasattr(session.config, 'workerinput') and appium_server_manager.pool is not None
+            and not appium_server_manager.fake_enabled):
+        for url, load in appium_server_manager.server_load().items():
+            print(f"Appium实例 {url}: {'运行中' if load['running'] else '未运行'}, "
+                  f"会话 {load['sessions'] if load['sessions'] is not None else '-'}, 重启 {load['restarts']} 次")
+        appium_server_manager.stop_pool()
+    
+    # 保存录制的磁带，或输出回放统计（去掉设备耗时后的框架开销）
+    from src.core.command_cassette import cassette_session, format_replay_summary
+    replay_summary = cassette_session.finish()
+    if replay_summary:
+        for line in format_replay_summary(replay_summary):
+            print(line)
     print("="*80)
 
 
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_protocol(item, nextitem):
+    """执行每个测试项前，记录当前用例（命令耗时统计）、下一个测试项所需的平台（会话预热）和隔离级别"""
+    from src.core import driver_manager
+    from src.utils.command_metrics import command_metrics
+    command_metrics.set_current_test(item.nodeid)
+    next_cls = getattr(nextitem, 'cls', None) if nextitem else None
+    driver_manager.set_next_platform(getattr(next_cls, 'platform', None))
+    driver_manager.set_isolation(_get_isolation(item), _get_isolation(nextitem) if nextitem else None)
+
+
+def _get_isolation(item):
+    """读取用例的isolation标记，未标记时返回None（使用会话池默认重置策略）"""
+    marker = item.get_closest_marker('isolation')
+    if marker is None:
+        return None
+    return marker.args[0] if marker.args else marker.kwargs.get('level')
+
+
 @pytest.hookimpl(tryfirst=True, hookwrapper=True)
 def pytest_runtest_makereport(item, call):
     """生成测试报告，在每个测试步骤（setup/call/teardown）生成报告时调用"""
@@ -96,6 +185,13 @@ def pytest_runtest_makereport(item, call):
 
 def pytest_collection_modifyitems(config, items):
     """修改收集到的测试项"""
+    # 隔离级别标记写错时在收集阶段报告用法错误，而不是在执行用例时中断
+    from src.core.session_pool import RESET_STRATEGIES
+    for item in items:
+        level = _get_isolation(item)
+        if level is not None and level not in RESET_STRATEGIES:
+            raise pytest.UsageError(f"{item.nodeid}: 不支持的隔离级别 {level!r}，可选: {', '.join(RESET_STRATEGIES)}")
+    
     # 为没有标记的测试添加默认标记
     for item in items:
         if not any(mark.name in ['smoke', 'regression'] for mark in item.iter_markers()):
@@ -141,7 +237,7 @@ def pytest_addoption(parser):
         "--platform",
         action="store",
         default="android",
-        help="测试平台: android 或 ios"
+        help="测试平台: android、ios 或 web"
     )
     parser.addoption(
         "--device",
@@ -161,6 +257,13 @@ def pytest_addoption(parser):
         default="test",
         help="测试环境: dev, test, staging, prod"
     )
+    parser.addoption(
+        "--threads",
+        action="store",
+        type=int,
+        default=1,
+        help="线程并行数：同一进程内按测试类分组，多个线程各自使用独立的设备和驱动"
+    )
 
 
 @pytest.fixture
@@ -20,6 +20,7 @@ from src.config.environment import Environment
 from src.core import appium_server_manager
 from src.utils import get_logger, generate_reports
 from src.utils.report_manager import allure_manager
+from src.utils.command_metrics import load_command_stats, format_slowest_commands
 
 logger = get_logger(__name__)
 
@@ -35,7 +36,7 @@ class TestRunner:
     def run_tests(self, test_path: str = None, markers: List[str] = None, 
                   platform: str = "android", device: str = None, 
                   app: str = None, env: str = "test", 
-                  parallel: int = 1, verbose: bool = False) -> bool:
+                  parallel: int = 1, threads: int = 1, verbose: bool = False) -> bool:
         """运行测试"""
         
         # 设置环境
@@ -74,6 +75,28 @@ class TestRunner:
         # 并行执行
         if parallel > 1:
             cmd.extend(["-n", str(parallel)])
+            
+            # 每个worker需要独占一台设备（web平台每个worker各自启动无头浏览器）
+            inventory = config.get(f"device_inventory.{platform}", []) or []
+            if platform == "web":
+                logger.info(f"web平台 {parallel} 个worker并行运行无头浏览器")
+            elif not inventory:
+                logger.warning(f"未配置 device_inventory.{platform}，{parallel} 个worker将共用同一台设备")
+            elif parallel > len(inventory):
+                logger.warning(f"并行数 {parallel} 超过设备数 {len(inventory)}，多余的worker将无法租借设备")
+        
+        # 线程并行执行：同一进程内每个线程独占一台设备
+        if threads > 1:
+            cmd.extend(["--threads", str(threads)])
+            
+            inventory = config.get(f"device_inventory.{platform}", []) or []
+            workers = threads * max(parallel, 1)
+            if platform == "web":
+                logger.info(f"web平台 {workers} 个线程并行运行无头浏览器")
+            elif not inventory:
+                logger.warning(f"未配置 device_inventory.{platform}，{threads} 个线程将共用同一台设备")
+            elif workers > len(inventory):
+                logger.warning(f"线程数 {workers} 超过设备数 {len(inventory)}，多余的线程将无法租借设备")
         
         # 详细输出
         if verbose:
@@ -94,11 +117,26 @@ class TestRunner:
         try:
             result = subprocess.run(cmd, cwd=self.project_root, 
                                   capture_output=False, text=True)
+            self.print_slowest_commands()
             return result.returncode == 0
         except Exception as e:
             logger.error(f"运行测试失败: {e}")
             return False
     
+    def print_slowest_commands(self, top_n: int = None):
+        """输出本次运行中总耗时最多的命令"""
+        if not config.get("command_metrics.enabled", False):
+            return
+        
+        top_n = top_n or config.get("command_metrics.top_n", 10)
+        stats = load_command_stats(str(allure_manager.results_dir))
+        if not stats:
+            return
+        
+        print(f"\n最慢的 {top_n} 个命令:")
+        for line in format_slowest_commands(stats, top_n):
+            print(line)
+    
     def run_smoke_tests(self, platform: str = "android") -> bool:
         """运行冒烟测试"""
         logger.info("开始执行冒烟测试")
@@ -206,28 +244,35 @@ def main():
     run_parser = subparsers.add_parser("run", help="运行测试")
     run_parser.add_argument("--path", help="测试路径")
     run_parser.add_argument("--markers", nargs="+", help="测试标记")
-    run_parser.add_argument("--platform", default="android", choices=["android", "ios"], help="测试平台")
+    run_parser.add_argument("--platform", default="android", choices=["android", "ios", "web"], help="测试平台")
     run_parser.add_argument("--device", help="设备名称")
     run_parser.add_argument("--app", help="应用路径")
     run_parser.add_argument("--env", default="test", choices=["dev", "test", "staging", "prod"], help="测试环境")
     run_parser.add_argument("--parallel", type=int, default=1, help="并行数量")
+    run_parser.add_argument("--threads", type=int, default=1, help="线程并行数（同一进程内执行，比--parallel节省内存）")
     run_parser.add_argument("--verbose", action="store_true", help="详细输出")
+    run_parser.add_argument("--reuse-session", action="store_true", help="保留并复用Appium会话（本地调试）")
+    run_parser.add_argument("--cassette", choices=["record", "replay"], help="录制命令到磁带，或回放磁带（无需设备）")
     
     # 冒烟测试命令
     smoke_parser = subparsers.add_parser("smoke", help="运行冒烟测试")
-    smoke_parser.add_argument("--platform", default="android", choices=["android", "ios"], help="测试平台")
+    smoke_parser.add_argument("--platform", default="android", choices=["android", "ios", "web"], help="测试平台")
     
     # 回归测试命令
     regression_parser = subparsers.add_parser("regression", help="运行回归测试")
-    regression_parser.add_argument("--platform", default="android", choices=["android", "ios"], help="测试平台")
+    regression_parser.add_argument("--platform", default="android", choices=["android", "ios", "web"], help="测试平台")
     
     # 登录测试命令
     login_parser = subparsers.add_parser("login", help="运行登录测试")
     login_parser.add_argument("--platform", default="android", choices=["android", "ios"], help="测试平台")
+    login_parser.add_argument("--reuse-session", action="store_true", help="保留并复用Appium会话（本地调试）")
+    login_parser.add_argument("--cassette", choices=["record", "replay"], help="录制命令到磁带，或回放磁带（无需设备）")
     
     # 主页测试命令
     home_parser = subparsers.add_parser("home", help="运行主页测试")
     home_parser.add_argument("--platform", default="android", choices=["android", "ios"], help="测试平台")
+    home_parser.add_argument("--reuse-session", action="store_true", help="保留并复用Appium会话（本地调试）")
+    home_parser.add_argument("--cassette", choices=["record", "replay"], help="录制命令到磁带，或回放磁带（无需设备）")
     
     # 报告命令
     report_parser = subparsers.add_parser("report", help="生成测试报告")
@@ -247,6 +292,14 @@ def main():
     
     runner = TestRunner()
     
+    # 会话复用通过环境变量传递给pytest子进程
+    if getattr(args, "reuse_session", False):
+        os.environ["REUSE_SESSION"] = "1"
+    
+    # 录制回放模式同样通过环境变量传递
+    if getattr(args, "cassette", None):
+        os.environ["CASSETTE_MODE"] = args.cassette
+    
     try:
         if args.command == "run":
             success = runner.run_tests(
@@ -257,6 +310,7 @@ def main():
                 app=args.app,
                 env=args.env,
                 parallel=args.parallel,
+                threads=args.threads,
                 verbose=args.verbose
             )
             if success:
@@ -89,9 +89,23 @@ class Config:
                     'fullReset': False
                 }
             },
+            'session_pool': {
+                'enabled': False,
+                'max_size': 2,
+                'max_idle': 300,
+                'reset_strategy': 'restart',
+                'prewarm': False,
+                'heartbeat': {
+                    'enabled': True,
+                    'interval': 10,
+                    'timeout': 5,
+                    'max_failures': 2
+                }
+            },
             'test': {
                 'default_timeout': 10,
                 'implicit_wait': 5,
+                'lazy_driver': False,
                 'screenshot_on_failure': True,
                 'screenshot_dir': './reports/screenshots',
                 'log_level': 'INFO'
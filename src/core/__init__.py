@@ -1,7 +1,14 @@
-from .driver_manager import driver_manager, DriverManager, DriverFactory
-from .appium_server import appium_server_manager, AppiumServer, AppiumServerManager
+from .driver_manager import driver_manager, DriverManager, DriverFactory, MultiDriverCreationError
+from .capability_profile import CapabilityProfile
+from .appium_server import appium_server_manager, AppiumServer, AppiumServerManager, AppiumServerPool
+from .fake_appium import FakeAppiumServer
+from .fake_webdriver import FakeWebDriverServer
+from .async_driver import AsyncDriverClient, AsyncElement
 
 __all__ = [
-    'driver_manager', 'DriverManager', 'DriverFactory',
-    'appium_server_manager', 'AppiumServer', 'AppiumServerManager'
+    'driver_manager', 'DriverManager', 'DriverFactory', 'MultiDriverCreationError',
+    'CapabilityProfile',
+    'appium_server_manager', 'AppiumServer', 'AppiumServerManager', 'AppiumServerPool', 'FakeAppiumServer',
+    'FakeWebDriverServer',
+    'AsyncDriverClient', 'AsyncElement'
 ]
\ No newline at end of file
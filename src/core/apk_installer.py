@@ -0,0 +1,273 @@
+"""
+APK安装缓存模块
+按APK内容哈希和设备上已安装的versionCode判断是否需要安装，结果按设备序列号记录在本地索引中；
+安装包未变化时会话不再重复推送和安装APK，多台设备并行安装
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+from ..config import config
+from .capability_profile import CapabilityProfile
+from .device_leaser import DeviceLeaser
+from .resource_lock import ResourceLock
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 计算哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ApkInstallError(RuntimeError):
+    """adb安装APK失败"""
+
+
+class ApkInstallCache:
+    """APK安装缓存
+
+    索引按 "设备序列号 -> 包名" 记录安装的APK哈希和设备上的versionCode、lastUpdateTime。
+    设备上的lastUpdateTime与索引一致说明安装后没有被替换过，哈希相同即可跳过安装；
+    索引缺失或失效时，versionCode相同再比较设备上base.apk的哈希，都不一致才安装。
+    """
+
+    def __init__(self):
+        # {(路径, 大小, 修改时间): (哈希, APK信息)}
+        self._apk_cache: Dict[Tuple[str, int, int], Tuple[str, Dict[str, Any]]] = {}
+        # {包名: APK路径}，会话能力中去掉app后，按包名找回安装包（reinstall重置策略使用）
+        self._apk_paths: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'installs': 0}
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用APK安装缓存"""
+        return bool(config.get('apk_cache.enabled', False))
+
+    @property
+    def index_file(self) -> Path:
+        """索引文件路径"""
+        return Path(config.get('apk_cache.index_file', './reports/.apk_install_index.json'))
+
+    @property
+    def adb(self) -> str:
+        """adb可执行文件"""
+        return config.get('apk_cache.adb', 'adb')
+
+    # APK信息
+    def inspect(self, apk_path: str) -> Tuple[str, Dict[str, Any]]:
+        """计算APK的SHA-256并读取包名、versionCode和启动Activity（按文件大小和修改时间缓存）"""
+        stat = os.stat(apk_path)
+        key = (os.path.abspath(apk_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._apk_cache:
+                return self._apk_cache[key]
+
+        digest = hashlib.sha256()
+        with open(apk_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        from ..utils.app_info_extractor import get_app_info
+        info = get_app_info(apk_path) or {}
+        result = (digest.hexdigest(), info)
+        with self._lock:
+            self._apk_cache[key] = result
+            if info.get('appPackage'):
+                self._apk_paths[info['appPackage']] = key[0]
+        return result
+
+    def apk_for_package(self, package: str) -> Optional[str]:
+        """已检查过的包名对应的APK路径"""
+        return self._apk_paths.get(package)
+
+    # 设备状态
+    def _adb(self, serial: str, *args: str, timeout: float = 30) -> subprocess.CompletedProcess:
+        return subprocess.run([self.adb, '-s', serial, *args], capture_output=True, text=True, timeout=timeout)
+
+    def installed_state(self, serial: str, package: str) -> Optional[Dict[str, str]]:
+        """设备上已安装包的versionCode和lastUpdateTime，未安装时返回None"""
+        output = self._adb(serial, 'shell', 'dumpsys', 'package', package).stdout
+        version = re.search(r'versionCode=(\d+)', output)
+        if version is None:
+            return None
+        update_time = re.search(r'lastUpdateTime=([^\r\n]+)', output)
+        return {'versionCode': version.group(1),
+                'lastUpdateTime': update_time.group(1).strip() if update_time else ''}
+
+    def installed_digest(self, serial: str, package: str) -> Optional[str]:
+        """设备上base.apk的SHA-256（拆分APK或设备不支持sha256sum时返回None）"""
+        paths = [line[len('package:'):].strip() for line in self._adb(serial, 'shell', 'pm', 'path', package).stdout.splitlines()
+                 if line.startswith('package:')]
+        if len(paths) != 1:
+            return None
+        output = self._adb(serial, 'shell', 'sha256sum', paths[0], timeout=60).stdout.split()
+        return output[0] if output and re.fullmatch(r'[0-9a-f]{64}', output[0]) else None
+
+    # 索引
+    def load(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """读取索引文件"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _record(self, serial: str, package: str, entry: Dict[str, Any]):
+        """在跨进程锁内更新索引（并行worker共享同一索引文件）"""
+        lock = ResourceLock(f"apk-index-{self.index_file.name}")
+        deadline = time.time() + 5
+        while not lock.acquire():
+            if time.time() > deadline:
+                logger.debug("获取APK安装索引锁超时，跳过本次记录")
+                return
+            time.sleep(0.05)
+        try:
+            with self._lock:
+                index = self.load()
+                index.setdefault(serial, {})[package] = entry
+                self.index_file.parent.mkdir(parents=True, exist_ok=True)
+                temp_file = self.index_file.with_suffix('.tmp')
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(index, f, ensure_ascii=False, indent=2)
+                os.replace(temp_file, self.index_file)
+        finally:
+            lock.release()
+
+    # 安装
+    def needs_install(self, serial: str, apk_path: str) -> bool:
+        """APK与设备上已安装的版本是否不同"""
+        sha256, info = self.inspect(apk_path)
+        package = info.get('appPackage')
+        if not package:
+            return True
+        state = self.installed_state(serial, package)
+        if state is None:
+            return True
+
+        entry = self.load().get(serial, {}).get(package, {})
+        if entry.get('sha256') == sha256 and entry.get('lastUpdateTime') == state['lastUpdateTime']:
+            return False
+        if info.get('versionCode') and info['versionCode'] != state['versionCode']:
+            return True
+        # 索引缺失或设备上的应用被替换过：比较已安装APK的内容
+        if self.installed_digest(serial, package) != sha256:
+            return True
+        self._record(serial, package, dict(state, sha256=sha256, apk=os.path.abspath(apk_path)))
+        return False
+
+    def install(self, serial: str, apk_path: str):
+        """adb安装APK（签名不一致时先卸载）并记录索引"""
+        sha256, info = self.inspect(apk_path)
+        package = info.get('appPackage')
+        timeout = config.get('apk_cache.install_timeout', 300)
+        start = time.time()
+        result = self._adb(serial, 'install', '-r', '-d', apk_path, timeout=timeout)
+        output = result.stdout + result.stderr
+        if 'INSTALL_FAILED_UPDATE_INCOMPATIBLE' in output and package:
+            logger.warning(f"设备 {serial} 上的 {package} 签名不一致，卸载后重新安装")
+            self._adb(serial, 'uninstall', package, timeout=timeout)
+            result = self._adb(serial, 'install', '-r', '-d', apk_path, timeout=timeout)
+            output = result.stdout + result.stderr
+        if result.returncode != 0 or 'Success' not in output:
+            raise ApkInstallError(f"设备 {serial} 安装APK失败: {output.strip()[-200:]}")
+
+        self.stats['installs'] += 1
+        logger.info(f"设备 {serial} 安装APK {os.path.basename(apk_path)} 耗时 {time.time() - start:.1f}s")
+        state = self.installed_state(serial, package) if package else None
+        if state is not None:
+            self._record(serial, package, dict(state, sha256=sha256, apk=os.path.abspath(apk_path)))
+
+    def ensure_installed(self, serial: str, apk_path: str) -> bool:
+        """APK有变化时安装，返回是否执行了安装（同一设备同时只有一个进程安装）"""
+        lock = ResourceLock(f"apk-install-{serial}")
+        deadline = time.time() + config.get('apk_cache.install_timeout', 300)
+        while not lock.acquire():
+            if time.time() > deadline:
+                raise ApkInstallError(f"等待设备 {serial} 上的其他安装超时")
+            time.sleep(0.2)
+        try:
+            if not self.needs_install(serial, apk_path):
+                self.stats['hits'] += 1
+                logger.info(f"设备 {serial} 已安装相同APK，跳过安装: {os.path.basename(apk_path)}")
+                return False
+            self.install(serial, apk_path)
+            return True
+        finally:
+            lock.release()
+
+    def ensure_installed_all(self, serials: Iterable[str], apk_path: str) -> Dict[str, Any]:
+        """多台设备并行安装，返回 {序列号: 是否安装 | 异常}"""
+        serials = list(dict.fromkeys(serials))
+        if not serials:
+            return {}
+        self.inspect(apk_path)  # 哈希只计算一次
+        results: Dict[str, Any] = {}
+        with ThreadPoolExecutor(max_workers=len(serials), thread_name_prefix='apk-install') as executor:
+            futures = {serial: executor.submit(self.ensure_installed, serial, apk_path) for serial in serials}
+            for serial, future in futures.items():
+                try:
+                    results[serial] = future.result()
+                except Exception as e:
+                    logger.warning(f"设备 {serial} 预安装APK失败: {e}")
+                    results[serial] = e
+        return results
+
+    def preinstall(self) -> Dict[str, Any]:
+        """测试开始前在设备清单（未配置时为 devices.android 中的设备）上并行安装APK"""
+        if not self.enabled or not config.get('apk_cache.preinstall', True):
+            return {}
+        device_config = config.get_device_config('android')
+        apk_path = self.local_apk(CapabilityProfile.from_dict('android', dict(device_config)))
+        if apk_path is None:
+            return {}
+        devices = DeviceLeaser.get_inventory('android') or [device_config]
+        serials = [device.get('udid') or device.get('deviceName') for device in devices]
+        try:
+            if not self.inspect(apk_path)[1].get('appPackage'):
+                return {}
+        except OSError as e:
+            logger.warning(f"读取APK失败，跳过预安装: {e}")
+            return {}
+        return self.ensure_installed_all([serial for serial in serials if serial], apk_path)
+
+    # 能力配置
+    @staticmethod
+    def local_apk(profile: CapabilityProfile) -> Optional[str]:
+        """能力配置中指向本地APK文件的app，不适用时返回None"""
+        app = profile.get('app')
+        if profile.platform != 'android' or not isinstance(app, str) or not app.lower().endswith('.apk'):
+            return None
+        if profile.get('fullReset') or not os.path.isfile(app):
+            return None
+        return app
+
+    def prepare(self, profile: CapabilityProfile) -> CapabilityProfile:
+        """确保设备上已安装APK，返回去掉app的能力配置（Appium直接启动已安装的应用）；失败时交给Appium安装"""
+        apk_path = self.local_apk(profile) if self.enabled else None
+        if apk_path is None or not profile.device_name:
+            return profile
+        try:
+            _, info = self.inspect(apk_path)
+            if not info.get('appPackage'):
+                # 读不出包名（未安装aapt）时无法判断设备上的版本
+                return profile
+            self.ensure_installed(profile.device_name, apk_path)
+        except (OSError, subprocess.SubprocessError, ApkInstallError) as e:
+            logger.warning(f"APK安装缓存不可用，交给Appium安装: {e}")
+            return profile
+        overrides = {'app': None}
+        for name in ('appPackage', 'appActivity'):
+            if not profile.get(name) and info.get(name):
+                overrides[name] = info[name]
+        return profile.with_overrides(**overrides)
+
+
+# 全局APK安装缓存实例
+apk_installer = ApkInstallCache()
@@ -1,14 +1,22 @@
 """
 Appium服务器管理模块
-负责Appium服务器的启动、停止和状态检查
+负责Appium服务器的启动、停止和状态检查；启用服务器池时在端口范围内启动多个实例，按设备或worker分配并监控重启
 """
+import os
 import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import requests
 import psutil
 import logging
-from typing import Optional
+from typing import Any, Dict, List, Optional, Union
 from ..config import config
+from .device_leaser import device_leaser, DeviceLeaser, get_worker_index
+from .resource_lock import ResourceLock
+from .fake_appium import FakeAppiumServer
+from .fake_webdriver import FakeWebDriverServer
 
 logger = logging.getLogger(__name__)
 
@@ -40,11 +48,12 @@ class AppiumServer:
             if kwargs.get('log_file'):
                 cmd.extend(['--log', kwargs['log_file']])
             
-            # 启动服务器
+            # 启动服务器（输出写入日志文件时不接管管道，避免长时间运行后管道写满阻塞服务器）
+            output = subprocess.DEVNULL if kwargs.get('log_file') else subprocess.PIPE
             self.process = subprocess.Popen(
                 cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+                stdout=output,
+                stderr=output,
                 text=True
             )
             
@@ -85,15 +94,19 @@ class AppiumServer:
         time.sleep(2)  # 等待端口释放
         return self.start(**kwargs)
     
-    def is_running(self) -> bool:
+    def is_running(self, timeout: float = 5) -> bool:
         """检查Appium服务器是否运行"""
         try:
             # Appium 3.0+ 使用新的端点
-            response = requests.get(f"{self.server_url}/status", timeout=5)
+            response = requests.get(f"{self.server_url}/status", timeout=timeout)
             return response.status_code == 200
         except requests.RequestException:
             return False
     
+    def has_exited(self) -> bool:
+        """本进程启动的服务器进程是否已退出"""
+        return self.process is not None and self.process.poll() is not None
+    
     def _wait_for_server_start(self, timeout: int = 30) -> bool:
         """等待服务器启动"""
         start_time = time.time()
@@ -114,6 +127,53 @@ class AppiumServer:
             pass
         return {}
     
+    def session_count(self, timeout: float = 2) -> Optional[int]:
+        """服务器上的活动会话数（Appium 2.0+ 为 /appium/sessions，1.x 为 /sessions），无法获取时返回None"""
+        for path in ('/appium/sessions', '/sessions'):
+            try:
+                response = requests.get(f"{self.server_url}{path}", timeout=timeout)
+            except requests.RequestException:
+                return None
+            if response.status_code == 200:
+                value = response.json().get('value')
+                return len(value) if isinstance(value, list) else None
+        return None
+    
+    def listening_pids(self) -> List[int]:
+        """监听本服务器端口的进程ID（不含本进程）"""
+        def listens(conn) -> bool:
+            return conn.status == psutil.CONN_LISTEN and bool(conn.laddr) and conn.laddr.port == self.port
+        
+        try:
+            pids = {conn.pid for conn in psutil.net_connections(kind='tcp') if listens(conn) and conn.pid}
+        except psutil.AccessDenied:
+            # macOS上获取全部连接需要root，逐个查询可访问的进程
+            pids = set()
+            for process in psutil.process_iter(['pid']):
+                try:
+                    # psutil 6.0起connections更名为net_connections
+                    connections = getattr(process, 'net_connections', None) or process.connections
+                    if any(listens(conn) for conn in connections(kind='tcp')):
+                        pids.add(process.pid)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+        pids.discard(os.getpid())
+        return sorted(pids)
+    
+    def kill_port_listeners(self, timeout: float = 5) -> List[int]:
+        """终止监听本服务器端口的进程（例如其他进程启动后无响应的实例），返回终止的进程ID"""
+        processes = []
+        for pid in self.listening_pids():
+            try:
+                process = psutil.Process(pid)
+                process.kill()
+                processes.append(process)
+                logger.warning(f"已终止占用端口 {self.port} 的进程: {pid}")
+            except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
+                logger.warning(f"无法终止占用端口 {self.port} 的进程 {pid}: {e}")
+        psutil.wait_procs(processes, timeout=timeout)
+        return [process.pid for process in processes]
+    
     def kill_existing_servers(self):
         """杀死现有的Appium服务器进程"""
         for process in psutil.process_iter(['pid', 'name', 'cmdline']):
@@ -130,6 +190,176 @@ class AppiumServer:
                 continue
 
 
+class AppiumServerPool:
+    """多实例Appium服务器池
+    
+    端口范围内每个端口一个Appium实例，设备按清单序号（未配置清单时worker按序号）轮流映射到实例。
+    每个实例用跨进程资源锁确定负责进程：持有锁的进程启动实例并在后台线程中监控，进程退出或
+    连续多次状态检查失败时重启；其他进程（xdist worker）直接使用已运行的实例，实例不可用时等待负责进程重启，
+    负责进程退出后由下一个使用该实例的进程接管。
+    """
+    
+    def __init__(self, host: str, ports: List[int], check_interval: float = None,
+                 failure_threshold: int = None, max_restarts: int = None):
+        pool_config = config.get('appium.server_pool', {}) or {}
+        self.host = host
+        self.servers: Dict[int, AppiumServer] = {port: AppiumServer(host, port) for port in ports}
+        self.check_interval = float(check_interval if check_interval is not None
+                                    else pool_config.get('check_interval', 5))
+        self.failure_threshold = int(failure_threshold if failure_threshold is not None
+                                     else pool_config.get('failure_threshold', 3))
+        self.max_restarts = int(max_restarts if max_restarts is not None else pool_config.get('max_restarts', 3))
+        self.start_timeout = float(pool_config.get('start_timeout', 60))
+        self.log_dir = Path(pool_config.get('log_dir', './logs'))
+        self.restarts: Dict[int, int] = {port: 0 for port in ports}
+        self._failures: Dict[int, int] = {port: 0 for port in ports}
+        self._start_kwargs: Dict[int, Dict[str, Any]] = {}
+        # {端口: 资源锁}，持有锁的实例由本进程负责启动和监控
+        self._owned: Dict[int, ResourceLock] = {}
+        # 每个实例一把启动锁，多个执行线程同时使用同一实例时只启动一次
+        self._start_locks: Dict[int, threading.Lock] = {port: threading.Lock() for port in ports}
+        self._lock = threading.Lock()
+        self._supervisor: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+    
+    @classmethod
+    def from_config(cls) -> Optional['AppiumServerPool']:
+        """按 appium.server_pool 配置创建，未启用时返回None"""
+        ports = DeviceLeaser.get_pool_ports()
+        return cls(DeviceLeaser.get_appium_host(), ports) if ports else None
+    
+    @property
+    def ports(self) -> List[int]:
+        return list(self.servers)
+    
+    def server_for(self, index: int) -> AppiumServer:
+        """第index台设备（或第index个worker）使用的实例"""
+        return self.servers[DeviceLeaser.get_server_port(index)]
+    
+    def owns(self, server: AppiumServer) -> bool:
+        """实例是否由本进程负责"""
+        return server.port in self._owned
+    
+    def _claim(self, server: AppiumServer) -> bool:
+        """尝试成为实例的负责进程（原负责进程已退出时接管）"""
+        with self._lock:
+            if server.port in self._owned:
+                return True
+            lock = ResourceLock(f"appium-server-{server.port}")
+            if not lock.acquire():
+                return False
+            self._owned[server.port] = lock
+        self._ensure_supervisor()
+        return True
+    
+    def _server_kwargs(self, server: AppiumServer, **kwargs) -> Dict[str, Any]:
+        """实例启动参数（每个实例单独的日志文件）"""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        kwargs.setdefault('log_file', str(self.log_dir / f"appium-{server.port}.log"))
+        return kwargs
+    
+    def ensure(self, server: AppiumServer, **kwargs) -> bool:
+        """确保实例运行：本进程负责时启动，否则等待负责进程启动或重启"""
+        claimed = self._claim(server)
+        if server.is_running():
+            return True
+        if not claimed:
+            logger.info(f"Appium实例由其他进程负责，等待其就绪: {server.server_url}")
+            return server._wait_for_server_start(int(self.start_timeout))
+        
+        with self._start_locks[server.port]:
+            if server.is_running():
+                return True
+            self._start_kwargs[server.port] = self._server_kwargs(server, **kwargs)
+            return server.start(**self._start_kwargs[server.port])
+    
+    def start_all(self, **kwargs) -> Dict[str, bool]:
+        """并行启动全部实例，返回 {地址: 是否就绪}"""
+        with ThreadPoolExecutor(max_workers=len(self.servers), thread_name_prefix='appium-start') as executor:
+            futures = {server.server_url: executor.submit(self.ensure, server, **kwargs)
+                       for server in self.servers.values()}
+            results = {url: future.result() for url, future in futures.items()}
+        logger.info(f"Appium服务器池: {sum(results.values())}/{len(results)} 个实例就绪")
+        return results
+    
+    def _ensure_supervisor(self):
+        with self._lock:
+            if self._supervisor is None or not self._supervisor.is_alive():
+                self._stopped.clear()
+                self._supervisor = threading.Thread(target=self._supervise, name='appium-supervisor', daemon=True)
+                self._supervisor.start()
+    
+    def _supervise(self):
+        """后台监控本进程负责的实例"""
+        while not self._stopped.wait(self.check_interval):
+            for port in list(self._owned):
+                try:
+                    self.check(self.servers[port])
+                except Exception as e:
+                    logger.warning(f"检查Appium实例失败: {self.servers[port].server_url} ({e})")
+    
+    def check(self, server: AppiumServer) -> bool:
+        """检查实例，进程已退出或连续failure_threshold次无响应时重启，返回实例是否可用"""
+        port = server.port
+        exited = server.has_exited()
+        if not exited and server.is_running(timeout=2):
+            self._failures[port] = 0
+            return True
+        self._failures[port] += 1
+        if not exited and self._failures[port] < self.failure_threshold:
+            return False
+        if self.restarts[port] >= self.max_restarts:
+            # 放弃负责权，由下一个使用该实例的进程接管
+            logger.error(f"Appium实例已重启 {self.restarts[port]} 次仍不可用，不再重启: {server.server_url}")
+            self.release(server)
+            return False
+        
+        self.restarts[port] += 1
+        self._failures[port] = 0
+        reason = f"进程已退出(code={server.process.returncode})" if exited else "无响应"
+        logger.warning(f"Appium实例{reason}，第 {self.restarts[port]} 次重启: {server.server_url}")
+        with self._start_locks[port]:
+            server.stop()
+            # 接管的实例不是本进程启动的（process为None），stop无效，无响应的进程仍占用端口
+            server.kill_port_listeners()
+            return server.restart(**self._start_kwargs.get(port) or self._server_kwargs(server))
+    
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """各实例负载 {地址: {running, owned, pid, sessions, restarts}}"""
+        def probe(server: AppiumServer) -> Dict[str, Any]:
+            running = server.is_running(timeout=2)
+            return {
+                'running': running,
+                'owned': self.owns(server),
+                'pid': server.process.pid if server.process is not None and not server.has_exited() else None,
+                'sessions': server.session_count() if running else None,
+                'restarts': self.restarts[server.port],
+            }
+        
+        with ThreadPoolExecutor(max_workers=len(self.servers), thread_name_prefix='appium-load') as executor:
+            futures = {server.server_url: executor.submit(probe, server) for server in self.servers.values()}
+            return {url: future.result() for url, future in futures.items()}
+    
+    def release(self, server: AppiumServer):
+        """放弃实例的负责权（不停止实例）"""
+        with self._lock:
+            lock = self._owned.pop(server.port, None)
+        if lock is not None:
+            lock.release()
+    
+    def stop_all(self, stop_servers: bool = True):
+        """停止监控并释放负责权，stop_servers为True时同时停止本进程负责的实例"""
+        self._stopped.set()
+        with self._lock:
+            owned = list(self._owned.items())
+            self._owned.clear()
+        for port, lock in owned:
+            if stop_servers:
+                self.servers[port].stop()
+                self.servers[port].kill_port_listeners()
+            lock.release()
+
+
 class AppiumServerManager:
     """Appium服务器管理器"""
     
@@ -143,17 +373,117 @@ class AppiumServerManager:
         port = int(parts[1]) if len(parts) > 1 else 4723
         
         self.server = AppiumServer(host, port)
+        self._device_servers: Dict[int, AppiumServer] = {}
+        self.pool: Optional[AppiumServerPool] = AppiumServerPool.from_config()
+        self._fake_server: Optional[FakeAppiumServer] = None
+        self._fake_web_server: Optional[FakeWebDriverServer] = None
+        # 线程并行执行时多个线程同时获取服务器
+        self._lock = threading.Lock()
+    
+    @property
+    def fake_enabled(self) -> bool:
+        """是否使用进程内模拟Appium服务器（环境变量FAKE_APPIUM=1优先）"""
+        return os.getenv('FAKE_APPIUM') == '1' or bool(config.get('fake_appium.enabled', False))
+    
+    def get_fake_server(self) -> FakeAppiumServer:
+        """获取模拟Appium服务器（按配置创建）"""
+        with self._lock:
+            if self._fake_server is None:
+                fake_config = config.get('fake_appium', {}) or {}
+                self._fake_server = FakeAppiumServer(
+                    hierarchy=os.getenv('FAKE_APPIUM_HIERARCHY') or fake_config.get('hierarchy'),
+                    port=fake_config.get('port', 0),
+                    latency=float(os.getenv('FAKE_APPIUM_LATENCY') or fake_config.get('latency', 0.0))
+                )
+            return self._fake_server
+    
+    def get_fake_web_server(self) -> FakeWebDriverServer:
+        """获取模拟WebDriver服务器（web平台，与模拟Appium服务器共用端口以外的配置）"""
+        with self._lock:
+            if self._fake_web_server is None:
+                fake_config = config.get('fake_appium', {}) or {}
+                self._fake_web_server = FakeWebDriverServer(
+                    latency=float(os.getenv('FAKE_APPIUM_LATENCY') or fake_config.get('latency', 0.0))
+                )
+                self._fake_web_server.load_pages(fake_config.get('web_pages') or {})
+            return self._fake_web_server
     
-    def ensure_server_running(self, **kwargs) -> bool:
+    @staticmethod
+    def web_server_ready() -> bool:
+        """外部WebDriver服务（Selenium Grid/chromedriver）是否可用"""
+        server_url = config.get('web.server_url', 'http://localhost:4444').rstrip('/')
+        try:
+            response = requests.get(f"{server_url}/status", timeout=5)
+            return response.status_code == 200
+        except requests.RequestException:
+            return False
+    
+    def get_server(self, platform: str = 'android') -> Union[AppiumServer, FakeAppiumServer]:
+        """获取当前worker使用的服务器，配置了设备清单时每台设备使用独立端口"""
+        if self.fake_enabled:
+            return self.get_fake_web_server() if platform == 'web' else self.get_fake_server()
+        if not device_leaser.has_inventory(platform):
+            # 服务器池中worker按序号使用实例
+            return self.pool.server_for(get_worker_index()) if self.pool is not None else self.server
+        
+        lease = device_leaser.lease(platform)
+        if self.pool is not None and lease.appium_port in self.pool.servers:
+            return self.pool.servers[lease.appium_port]
+        if lease.appium_port == self.server.port:
+            return self.server
+        with self._lock:
+            if lease.appium_port not in self._device_servers:
+                self._device_servers[lease.appium_port] = AppiumServer(self.server.host, lease.appium_port)
+            return self._device_servers[lease.appium_port]
+    
+    def ensure_server_running(self, platform: str = 'android', **kwargs) -> bool:
         """确保Appium服务器运行"""
-        if not self.server.is_running():
-            logger.info("Appium服务器未运行，正在启动...")
-            return self.server.start(**kwargs)
+        from .command_cassette import cassette_session
+        if cassette_session.replaying:
+            logger.info("回放模式，无需Appium服务器")
+            return True
+        if platform == 'web' and not self.fake_enabled:
+            # WebDriver服务由外部提供，不启动Appium
+            if not self.web_server_ready():
+                logger.warning(f"WebDriver服务不可用: {config.get('web.server_url', 'http://localhost:4444')}")
+                return False
+            return True
+        
+        server = self.get_server(platform)
+        if self.pool is not None and server is self.pool.servers.get(server.port):
+            return self.pool.ensure(server, **kwargs)
+        if not server.is_running():
+            logger.info(f"Appium服务器未运行，正在启动: {server.server_url}")
+            return server.start(**kwargs)
         return True
     
     def auto_start_server(self, **kwargs) -> bool:
         """自动启动服务器（如果需要）"""
         return self.ensure_server_running(**kwargs)
+    
+    def start_pool(self, **kwargs) -> Dict[str, bool]:
+        """并行启动服务器池的全部实例（未启用服务器池或使用模拟服务器时不启动）"""
+        if self.pool is None or self.fake_enabled:
+            return {}
+        return self.pool.start_all(**kwargs)
+    
+    def stop_pool(self):
+        """运行结束时停止服务器池的监控；appium.server_pool.keep_running为false时同时停止本进程负责的实例"""
+        if self.pool is None or self.fake_enabled:
+            return
+        keep_running = config.get('appium.server_pool.keep_running', True)
+        self.pool.stop_all(stop_servers=not keep_running)
+        logger.info("Appium服务器池已停止监控" + ("，实例保持运行" if keep_running else "并停止实例"))
+    
+    def server_load(self) -> Dict[str, Dict[str, Any]]:
+        """各Appium服务器的负载（未启用服务器池时为单个服务器）"""
+        if self.pool is not None:
+            return self.pool.load()
+        running = self.server.is_running(timeout=2)
+        return {self.server.server_url: {'running': running, 'owned': self.server.process is not None,
+                                         'pid': self.server.process.pid if self.server.process is not None else None,
+                                         'sessions': self.server.session_count() if running else None,
+                                         'restarts': 0}}
 
 
 # 全局服务器管理器实例
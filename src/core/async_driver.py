@@ -0,0 +1,161 @@
+"""
+异步驱动客户端模块
+基于aiohttp的非阻塞W3C命令客户端，一个事件循环即可同时驱动多台设备，多设备之间的等待可以重叠
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+from appium.webdriver.errorhandler import MobileErrorHandler
+from appium.webdriver.webdriver import WebDriver
+from ..config import config
+from .capability_profile import CapabilityProfile
+from .session_heartbeat import get_executor_url
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# W3C元素标识的key
+ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+
+
+def _import_aiohttp():
+    """延迟导入aiohttp（可选依赖，只有使用异步客户端时才需要）"""
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise ImportError("异步驱动客户端需要aiohttp，请运行: pip install aiohttp") from e
+    return aiohttp
+
+
+class AsyncElement:
+    """异步元素"""
+
+    def __init__(self, client: 'AsyncDriverClient', element_id: str):
+        self.client = client
+        self.id = element_id
+
+    async def _execute(self, method: str, path: str, payload: Dict[str, Any] = None) -> Any:
+        return await self.client.execute(method, f"element/{self.id}/{path}", payload)
+
+    async def click(self):
+        await self._execute('POST', 'click', {})
+
+    async def clear(self):
+        await self._execute('POST', 'clear', {})
+
+    async def send_keys(self, text: str):
+        await self._execute('POST', 'value', {'text': text, 'value': list(text)})
+
+    async def text(self) -> str:
+        return await self._execute('GET', 'text')
+
+    async def get_attribute(self, name: str) -> Optional[str]:
+        return await self._execute('GET', f"attribute/{name}")
+
+    async def is_displayed(self) -> bool:
+        return bool(await self._execute('GET', 'displayed'))
+
+    async def rect(self) -> Dict[str, int]:
+        return await self._execute('GET', 'rect')
+
+    def __repr__(self):
+        return f"AsyncElement(session={self.client.session_id}, id={self.id})"
+
+
+class AsyncDriverClient:
+    """异步Appium会话客户端
+
+    可以绑定已有的同步驱动会话（from_driver，与同步驱动共用同一会话），也可以直接创建新会话（create）。
+    命令直接发送到服务器，不经过同步驱动命令执行器上挂载的中间件（命令耗时统计、录制回放）。
+    HTTP连接在当前事件循环中首次发送命令时创建，使用完毕后调用close()或使用async with。
+    """
+
+    def __init__(self, server_url: str, session_id: str = None, owns_session: bool = False):
+        client_config = config.get('appium.client', {}) or {}
+        self.server_url = server_url.rstrip('/')
+        self.session_id = session_id
+        self.owns_session = owns_session
+        self.timeout = float(client_config.get('timeout', 120))
+        self.pool_maxsize = int(client_config.get('pool_maxsize', 10))
+        self._http = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_driver(cls, driver: WebDriver) -> 'AsyncDriverClient':
+        """绑定同步驱动的会话（退出由同步驱动负责）"""
+        return cls(get_executor_url(driver), driver.session_id)
+
+    @classmethod
+    async def create(cls, server_url: str, profile: CapabilityProfile) -> 'AsyncDriverClient':
+        """创建新会话（quit时删除会话）"""
+        client = cls(server_url, owns_session=True)
+        capabilities = profile.build_options().to_capabilities()
+        value = await client.execute('POST', '', {'capabilities': {'firstMatch': [{}], 'alwaysMatch': capabilities}})
+        client.session_id = value['sessionId']
+        logger.info(f"异步客户端创建会话: {client.session_id} ({profile})")
+        return client
+
+    def _get_http(self):
+        """当前事件循环的HTTP会话（事件循环变化时重新创建）"""
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.closed or self._loop is not loop:
+            aiohttp = _import_aiohttp()
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_maxsize),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._loop = loop
+        return self._http
+
+    async def execute(self, method: str, path: str, payload: Dict[str, Any] = None) -> Any:
+        """发送命令，path为会话下的相对路径（为空时表示会话本身），返回value；失败时抛出与同步驱动相同的异常"""
+        if self.session_id is None:
+            url = f"{self.server_url}/session"
+        else:
+            url = f"{self.server_url}/session/{self.session_id}" + (f"/{path}" if path else '')
+        data = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json;charset=UTF-8'} if data is not None else None
+        async with self._get_http().request(method, url, data=data, headers=headers) as response:
+            body = await response.text()
+            status = response.status
+        if status >= 400:
+            # 与RemoteConnection一致，交给Appium的错误处理器映射为具体异常
+            MobileErrorHandler().check_response({'status': status, 'value': body})
+        return json.loads(body).get('value') if body else None
+
+    async def find_element(self, by: str, value: str) -> AsyncElement:
+        result = await self.execute('POST', 'element', {'using': by, 'value': value})
+        return AsyncElement(self, result.get(ELEMENT_KEY) or result.get('ELEMENT'))
+
+    async def find_elements(self, by: str, value: str) -> List[AsyncElement]:
+        results = await self.execute('POST', 'elements', {'using': by, 'value': value})
+        return [AsyncElement(self, result.get(ELEMENT_KEY) or result.get('ELEMENT')) for result in results]
+
+    async def page_source(self) -> str:
+        return await self.execute('GET', 'source')
+
+    async def quit(self):
+        """删除自己创建的会话并关闭HTTP连接"""
+        if self.owns_session and self.session_id is not None:
+            try:
+                await self.execute('DELETE', '')
+            except Exception as e:
+                logger.warning(f"删除会话时出错: {e}")
+            self.session_id = None
+        await self.close()
+
+    async def close(self):
+        """关闭HTTP连接（不影响会话）"""
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+
+    async def __aenter__(self) -> 'AsyncDriverClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.quit()
+
+    def __repr__(self):
+        return f"AsyncDriverClient({self.server_url}, session={self.session_id})"
@@ -0,0 +1,131 @@
+"""
+能力配置模块
+由config.yaml和覆盖项生成不可变、可哈希的能力配置，每个配置只编译一次Options对象
+"""
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Union
+from appium.options.android import UiAutomator2Options
+from appium.options.ios import XCUITestOptions
+from appium.options.common.base import AppiumOptions
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.common.options import ArgOptions
+from selenium.webdriver.edge.options import Options as EdgeOptions
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from ..config import config, env_manager
+
+
+# 平台对应的Options类
+PLATFORM_OPTIONS = {
+    'android': UiAutomator2Options,
+    'ios': XCUITestOptions,
+}
+# web平台按browserName选择浏览器Options类
+BROWSER_OPTIONS = {
+    'chrome': ChromeOptions,
+    'MicrosoftEdge': EdgeOptions,
+    'firefox': FirefoxOptions,
+}
+# web平台的框架配置项（编译为浏览器参数，不作为capability发送）
+WEB_OPTION_KEYS = ('headless', 'arguments', 'mobileEmulation')
+# 只对Appium会话有意义的capability（开发环境和会话复用会统一设置，web会话忽略）
+MOBILE_ONLY_CAPABILITIES = ('newCommandTimeout',)
+
+
+@dataclass(frozen=True)
+class CapabilityProfile:
+    """能力配置
+
+    capabilities以规范化JSON保存，保证不可变且可哈希，可直接作为会话池的key；
+    创建后不会再受全局Config变化的影响，多线程并发创建会话时是安全的。
+    """
+
+    platform: str
+    capabilities_json: str
+
+    @classmethod
+    def from_dict(cls, platform: str, capabilities: Dict[str, Any]) -> 'CapabilityProfile':
+        """由capabilities字典创建，None值会被忽略"""
+        capabilities = {k: v for k, v in capabilities.items() if v is not None}
+        return cls(platform.lower(), json.dumps(capabilities, sort_keys=True, ensure_ascii=False))
+
+    @classmethod
+    def from_config(cls, platform: str = 'android', base: Optional[Dict[str, Any]] = None,
+                    **overrides) -> 'CapabilityProfile':
+        """由设备配置（或base）加覆盖项创建"""
+        capabilities = dict(base if base is not None else config.get_device_config(platform))
+
+        # 环境相关配置调整
+        if env_manager.is_development():
+            capabilities['newCommandTimeout'] = 300
+
+        capabilities.update(overrides)
+        return cls.from_dict(platform, capabilities)
+
+    def with_overrides(self, **overrides) -> 'CapabilityProfile':
+        """生成带覆盖项的新配置"""
+        capabilities = self.as_dict()
+        capabilities.update(overrides)
+        return self.from_dict(self.platform, capabilities)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """capabilities字典（副本）"""
+        return json.loads(self.capabilities_json)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """获取单个capability"""
+        return self.as_dict().get(key, default)
+
+    @property
+    def device_name(self) -> Optional[str]:
+        """设备标识（优先udid，web平台为浏览器名）"""
+        capabilities = self.as_dict()
+        return capabilities.get('udid') or capabilities.get('deviceName') or capabilities.get('browserName')
+
+    def build_options(self) -> Union[AppiumOptions, ArgOptions]:
+        """获取编译后的Options对象（按配置缓存，调用方不应修改）"""
+        return compile_options(self)
+
+    def __str__(self):
+        return f"{self.platform}:{self.device_name}"
+
+
+@lru_cache(maxsize=64)
+def compile_options(profile: CapabilityProfile) -> Union[AppiumOptions, ArgOptions]:
+    """将能力配置编译为Options对象，同一配置只编译一次"""
+    if profile.platform == 'web':
+        return compile_browser_options(profile)
+
+    options_class = PLATFORM_OPTIONS.get(profile.platform)
+    if options_class is None:
+        raise ValueError(f"不支持的平台: {profile.platform}")
+
+    options = options_class()
+    for key, value in profile.as_dict().items():
+        options.set_capability(key, value)
+    return options
+
+
+def compile_browser_options(profile: CapabilityProfile) -> ArgOptions:
+    """将web平台能力配置编译为浏览器Options（无头模式、启动参数、移动端模拟）"""
+    capabilities = profile.as_dict()
+    browser_name = capabilities.pop('browserName', 'chrome')
+    options_class = BROWSER_OPTIONS.get(browser_name)
+    if options_class is None:
+        raise ValueError(f"不支持的浏览器: {browser_name}")
+
+    options = options_class()
+    web_options = {key: capabilities.pop(key) for key in WEB_OPTION_KEYS if key in capabilities}
+    if web_options.get('headless'):
+        options.add_argument('-headless' if options_class is FirefoxOptions else '--headless=new')
+    for argument in web_options.get('arguments') or []:
+        options.add_argument(argument)
+    if web_options.get('mobileEmulation'):
+        if not hasattr(options, 'add_experimental_option'):
+            raise ValueError(f"{browser_name} 不支持移动端模拟")
+        options.add_experimental_option('mobileEmulation', web_options['mobileEmulation'])
+    for key, value in capabilities.items():
+        if key not in MOBILE_ONLY_CAPABILITIES:
+            options.set_capability(key, value)
+    return options
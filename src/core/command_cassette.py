@@ -0,0 +1,275 @@
+"""
+命令录制回放模块
+录制真实运行中每条WebDriver命令的请求和响应到压缩的磁带文件，回放时无需设备即可执行页面对象用例
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+from selenium.common.exceptions import WebDriverException
+from ..config import config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+CASSETTE_MODES = ('off', 'record', 'replay')
+# 超过该长度的响应（page_source、截图）单独存放并按内容去重
+BLOB_MIN_SIZE = 4096
+# 匹配命令时忽略的参数（每次运行都不同）
+IGNORED_PARAMS = ('sessionId',)
+
+
+class CassetteMismatchError(WebDriverException):
+    """回放时遇到磁带中没有录制过的命令"""
+
+
+def _dumps(value: Any) -> str:
+    """规范化JSON序列化"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def interaction_key(command: str, params: Optional[Dict[str, Any]]) -> str:
+    """命令匹配key：命令名 + 去掉会话ID后的参数"""
+    params = {k: v for k, v in (params or {}).items() if k not in IGNORED_PARAMS}
+    return f"{command} {_dumps(params)}"
+
+
+class Cassette:
+    """磁带：按顺序保存的命令交互，大响应按内容哈希去重"""
+
+    VERSION = 1
+
+    def __init__(self):
+        # [{'key', 'response' | 'response_ref', 'elapsed_us'}]
+        self.interactions: List[Dict[str, Any]] = []
+        self.blobs: Dict[str, str] = {}
+
+    def add(self, command: str, params: Dict[str, Any], response: Any, elapsed_us: float):
+        """追加一条交互（响应以JSON快照保存，后续对响应对象的修改不影响磁带）"""
+        response_json = _dumps(response)
+        interaction = {'key': interaction_key(command, params), 'elapsed_us': int(elapsed_us)}
+        if len(response_json) >= BLOB_MIN_SIZE:
+            digest = hashlib.sha1(response_json.encode('utf-8')).hexdigest()
+            self.blobs.setdefault(digest, response_json)
+            interaction['response_ref'] = digest
+        else:
+            interaction['response'] = response_json
+        self.interactions.append(interaction)
+
+    def response_json(self, interaction: Dict[str, Any]) -> str:
+        """获取交互的响应JSON"""
+        ref = interaction.get('response_ref')
+        return self.blobs[ref] if ref else interaction['response']
+
+    def save(self, path: Path):
+        """保存为gzip压缩的JSON"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {'version': self.VERSION, 'interactions': self.interactions, 'blobs': self.blobs}
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    def extend(self, other: 'Cassette'):
+        """合并另一盘磁带"""
+        self.interactions.extend(other.interactions)
+        self.blobs.update(other.blobs)
+
+    @classmethod
+    def load(cls, path: Path) -> 'Cassette':
+        """读取磁带文件"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        cassette = cls()
+        cassette.interactions = data.get('interactions', [])
+        cassette.blobs = data.get('blobs', {})
+        return cassette
+
+
+class CassetteRecorder:
+    """录制中间件：透传命令并记录请求、响应和设备端耗时"""
+
+    def __init__(self):
+        self.cassette = Cassette()
+        self._lock = threading.Lock()
+
+    def __call__(self, command: str, params: Dict[str, Any], call_next: Callable) -> Any:
+        start = time.perf_counter()
+        response = call_next(command, params)
+        elapsed_us = (time.perf_counter() - start) * 1_000_000
+        with self._lock:
+            self.cassette.add(command, params, response, elapsed_us)
+        return response
+
+    def save(self, path: Path) -> Path:
+        """保存磁带"""
+        with self._lock:
+            self.cassette.save(path)
+        logger.info(f"已录制 {len(self.cassette.interactions)} 条命令: {path}")
+        return path
+
+
+class CassetteReplayer:
+    """回放中间件：不发送请求，直接返回磁带中的响应
+
+    同一命令+参数按录制顺序依次返回；录制的次数用完后重复返回最后一次的响应
+    （例如显式等待多轮轮询），因此页面对象重构调整了调用顺序也能回放。
+    measure挂在命令执行器最外层，统计每条命令经过整个中间件链的耗时（框架开销）。
+    """
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self._queues: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+        for interaction in cassette.interactions:
+            self._queues[interaction['key']].append(interaction)
+        self._lock = threading.Lock()
+        self.commands = 0
+        self.repeated = 0
+        self.recorded_us = 0
+        self.chain_us = 0.0
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+
+    def __call__(self, command: str, params: Dict[str, Any], call_next: Callable) -> Any:
+        key = interaction_key(command, params)
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                interaction = queue.popleft()
+                self._last[key] = interaction
+            elif key in self._last:
+                interaction = self._last[key]
+                self.repeated += 1
+            else:
+                raise CassetteMismatchError(f"磁带中没有录制该命令: {key[:200]}")
+
+            now = time.perf_counter()
+            if self.first_at is None:
+                self.first_at = now
+            self.last_at = now
+            self.commands += 1
+            self.recorded_us += interaction.get('elapsed_us', 0)
+        # 每次返回新的对象，WebDriver会原地改写响应
+        return json.loads(self.cassette.response_json(interaction))
+
+    def measure(self, command: str, params: Dict[str, Any], call_next: Callable) -> Any:
+        """最外层计时中间件：累计命令在整个命令执行器中间件链中的耗时"""
+        start = time.perf_counter()
+        try:
+            return call_next(command, params)
+        finally:
+            elapsed_us = (time.perf_counter() - start) * 1_000_000
+            with self._lock:
+                self.chain_us += elapsed_us
+
+    def unused(self) -> int:
+        """录制了但回放时未使用的交互数"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def summary(self) -> Dict[str, Any]:
+        """回放统计
+
+        replay_seconds累计命令从执行器入口经过全部中间件到返回的耗时（由measure统计），
+        wall_seconds是首末两条命令之间的总运行时间，包含用例逻辑和等待，不能当作命令开销。
+        """
+        wall = (self.last_at - self.first_at) if self.first_at is not None else 0.0
+        replay = self.chain_us / 1e6
+        return {
+            'commands': self.commands,
+            'repeated': self.repeated,
+            'unused': self.unused(),
+            'recorded_device_seconds': self.recorded_us / 1e6,
+            'replay_seconds': replay,
+            'wall_seconds': wall,
+            'overhead_per_command_ms': replay / self.commands * 1000 if self.commands else 0.0,
+        }
+
+
+class CassetteSession:
+    """按配置管理本次运行的录制或回放"""
+
+    def __init__(self):
+        self._middleware = None
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        """录制回放模式（环境变量CASSETTE_MODE优先）"""
+        mode = (os.getenv('CASSETTE_MODE') or config.get('cassette.mode', 'off') or 'off').lower()
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"未知的录制回放模式: {mode}，可选: {', '.join(CASSETTE_MODES)}")
+        return mode
+
+    @property
+    def recording(self) -> bool:
+        """是否为录制模式"""
+        return self.mode == 'record'
+
+    @property
+    def replaying(self) -> bool:
+        """是否为回放模式"""
+        return self.mode == 'replay'
+
+    @property
+    def path(self) -> Path:
+        """磁带文件路径（环境变量CASSETTE_FILE优先）"""
+        return Path(os.getenv('CASSETTE_FILE') or config.get('cassette.file', './reports/cassettes/run.cassette.gz'))
+
+    def _worker_path(self) -> Path:
+        """xdist下每个worker单独录制一个文件"""
+        worker = os.getenv('PYTEST_XDIST_WORKER')
+        if not worker:
+            return self.path
+        name = self.path.name
+        stem, _, suffix = name.partition('.')
+        return self.path.with_name(f"{stem}-{worker}.{suffix}" if suffix else f"{stem}-{worker}")
+
+    def _load(self) -> Cassette:
+        """读取磁带（包括各worker录制的文件）"""
+        stem, _, suffix = self.path.name.partition('.')
+        paths = sorted(self.path.parent.glob(f"{stem}*.{suffix}" if suffix else f"{stem}*"))
+        if not paths:
+            raise FileNotFoundError(f"未找到磁带文件: {self.path}")
+        cassette = Cassette()
+        for path in paths:
+            cassette.extend(Cassette.load(path))
+        logger.info(f"已加载磁带 {len(paths)} 个文件，共 {len(cassette.interactions)} 条命令")
+        return cassette
+
+    def middleware(self) -> Optional[Callable]:
+        """当前模式对应的中间件（整个运行共享一个），未启用时返回None"""
+        if self.mode == 'off':
+            return None
+        with self._lock:
+            if self._middleware is None:
+                self._middleware = CassetteRecorder() if self.recording else CassetteReplayer(self._load())
+            return self._middleware
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        """运行结束：录制模式保存磁带，回放模式返回统计"""
+        middleware = self._middleware
+        if isinstance(middleware, CassetteRecorder):
+            middleware.save(self._worker_path())
+        elif isinstance(middleware, CassetteReplayer):
+            return middleware.summary()
+        return None
+
+
+def format_replay_summary(summary: Dict[str, Any]) -> List[str]:
+    """生成回放统计输出"""
+    return [
+        f"回放命令: {summary['commands']} 条（重复 {summary['repeated']}，未使用 {summary['unused']}）",
+        f"录制时设备耗时: {summary['recorded_device_seconds']:.2f}s",
+        f"回放命令耗时（执行器中间件链）: {summary['replay_seconds']:.3f}s，"
+        f"平均每条命令 {summary['overhead_per_command_ms']:.3f}ms",
+        f"回放总运行时间（含用例逻辑和等待）: {summary['wall_seconds']:.2f}s",
+    ]
+
+
+# 全局录制回放实例
+cassette_session = CassetteSession()
@@ -0,0 +1,233 @@
+"""
+命令重试模块
+幂等命令遇到连接重置、UiAutomator2服务崩溃等瞬时错误时按抖动退避重试；
+每个会话一个熔断器，连续失败达到阈值后快速替换一次会话，而不是让后续每条命令都等到超时
+"""
+import json
+import random
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.command import Command
+from appium.webdriver.webdriver import WebDriver
+from ..config import config, env_manager
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 使用POST但不改变应用状态的命令，可以安全重试
+IDEMPOTENT_POST_COMMANDS = {
+    Command.FIND_ELEMENT, Command.FIND_ELEMENTS,
+    Command.FIND_CHILD_ELEMENT, Command.FIND_CHILD_ELEMENTS,
+}
+# 不经过重试和熔断的命令（会话生命周期由创建/替换逻辑自己处理）
+PASSTHROUGH_COMMANDS = {Command.NEW_SESSION, Command.QUIT}
+# 默认的瞬时错误特征（错误信息中包含任一即视为瞬时错误，不区分大小写）
+DEFAULT_TRANSIENT_PATTERNS = [
+    'instrumentation process is not running',
+    'uiautomator2 server',
+    'socket hang up',
+    'econnreset',
+    'econnrefused',
+    'could not proxy command',
+]
+
+# 熔断器状态
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+
+
+class SessionCircuitOpenError(WebDriverException):
+    """会话熔断中，命令被直接拒绝"""
+
+
+class TransientCommandError(Exception):
+    """瞬时错误（内部使用，携带原始响应或异常）"""
+
+    def __init__(self, message: str, response: Any = None, error: BaseException = None):
+        super().__init__(message)
+        self.response = response
+        self.error = error
+
+
+class CircuitBreaker:
+    """会话熔断器
+
+    连续失败次数达到阈值时打开；打开后由CommandRetry尝试替换一次会话，替换成功则关闭，
+    失败则在冷却时间内直接拒绝命令，冷却结束后放行一条命令试探。
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """是否放行命令（打开状态下冷却结束后放行试探命令）"""
+        return self.state == STATE_CLOSED or time.time() - self.opened_at >= self.reset_timeout
+
+    def record_success(self):
+        self.state = STATE_CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> bool:
+        """记录一次失败，返回是否因此打开熔断"""
+        self.failures += 1
+        if self.state == STATE_OPEN:
+            # 试探命令失败，重新开始冷却
+            self.opened_at = time.time()
+            return False
+        if self.failures >= self.failure_threshold:
+            self.state = STATE_OPEN
+            self.opened_at = time.time()
+            self.trips += 1
+            return True
+        return False
+
+
+class CommandRetry:
+    """命令重试与熔断中间件（每个命令执行器一个实例，即每个会话一个熔断器）"""
+
+    def __init__(self, command_executor, retry_count: int = None, base_delay: float = None,
+                 max_delay: float = None, transient_patterns: List[str] = None):
+        retry_config = config.get('command_retry', {}) or {}
+        self.command_executor = command_executor
+        self.retry_count = retry_count if retry_count is not None else int(env_manager.get_config('retry_count') or 0)
+        self.base_delay = base_delay if base_delay is not None else float(retry_config.get('base_delay', 0.2))
+        self.max_delay = max_delay if max_delay is not None else float(retry_config.get('max_delay', 2.0))
+        patterns = transient_patterns or retry_config.get('transient_patterns') or DEFAULT_TRANSIENT_PATTERNS
+        self.transient_patterns = [pattern.lower() for pattern in patterns]
+        self.breaker = CircuitBreaker(int(retry_config.get('failure_threshold', 3)),
+                                      float(retry_config.get('reset_timeout', 30)))
+        self.max_replacements = int(retry_config.get('max_replacements', 1))
+        self.replacements = 0
+        self.retries = 0
+        self._driver_ref: Optional[Callable[[], Optional[WebDriver]]] = None
+        self._replace: Optional[Callable[[WebDriver], None]] = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def bind(self, driver: WebDriver, replace: Callable[[WebDriver], None]):
+        """绑定会话所属的驱动和会话替换函数（驱动创建后调用）"""
+        self._driver_ref = weakref.ref(driver)
+        self._replace = replace
+
+    def is_idempotent(self, command: str) -> bool:
+        """命令是否可以安全重试"""
+        if command in IDEMPOTENT_POST_COMMANDS:
+            return True
+        method = getattr(self.command_executor, '_commands', {}).get(command, (None,))[0]
+        return method == 'GET'
+
+    def is_transient_response(self, response: Any) -> bool:
+        """错误响应是否为瞬时错误"""
+        if not isinstance(response, dict) or not isinstance(response.get('status'), int) or response['status'] < 500:
+            return False
+        value = response.get('value')
+        text = value if isinstance(value, str) else json.dumps(value, default=str)
+        return any(pattern in text.lower() for pattern in self.transient_patterns)
+
+    def backoff(self, attempt: int) -> float:
+        """第attempt次重试前的等待时间（指数退避加全抖动）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _send(self, command: str, params: Dict[str, Any], call_next: Callable) -> Any:
+        """发送一次（传入参数副本，执行器会移除其中的sessionId），瞬时错误统一抛出TransientCommandError"""
+        try:
+            response = call_next(command, dict(params))
+        except (Urllib3HTTPError, ConnectionError) as e:
+            raise TransientCommandError(f"{type(e).__name__}: {e}", error=e) from e
+        if self.is_transient_response(response):
+            raise TransientCommandError(str(response.get('value'))[:200], response=response)
+        return response
+
+    def __call__(self, command: str, params: Dict[str, Any], call_next: Callable) -> Any:
+        """中间件入口"""
+        if command in PASSTHROUGH_COMMANDS or getattr(self._local, 'replacing', False):
+            return call_next(command, params)
+        if not self.breaker.allow():
+            raise SessionCircuitOpenError(
+                f"会话熔断中（连续失败 {self.breaker.failures} 次），命令被拒绝: {command}")
+
+        attempts = self.retry_count + 1 if self.is_idempotent(command) else 1
+        for attempt in range(attempts):
+            try:
+                response = self._send(command, params, call_next)
+            except TransientCommandError as e:
+                if attempt + 1 < attempts:
+                    delay = self.backoff(attempt)
+                    self.retries += 1
+                    logger.warning(f"命令 {command} 瞬时错误，{delay:.2f}s 后第 {attempt + 1} 次重试: {e}")
+                    time.sleep(delay)
+                    continue
+                return self._on_failure(command, params, call_next, e)
+            with self._lock:
+                self.breaker.record_success()
+            return response
+
+    def _on_failure(self, command: str, params: Dict[str, Any], call_next: Callable,
+                    failure: TransientCommandError) -> Any:
+        """重试用尽：计入熔断器，熔断打开时替换会话，幂等命令在新会话上重发一次"""
+        with self._lock:
+            tripped = self.breaker.record_failure()
+            if tripped and self._try_replace_session():
+                if not self.is_idempotent(command):
+                    # 非幂等命令可能已经执行过，元素ID也属于旧会话，不重发，由调用方处理原始错误
+                    self.breaker.record_success()
+                    logger.warning(f"会话已替换，非幂等命令 {command} 不重发")
+                    return self._raise_failure(failure)
+                params = dict(params, sessionId=self._driver_ref().session_id)
+                try:
+                    response = self._send(command, params, call_next)
+                    self.breaker.record_success()
+                    return response
+                except TransientCommandError as e:
+                    self.breaker.record_failure()
+                    failure = e
+        return self._raise_failure(failure)
+
+    @staticmethod
+    def _raise_failure(failure: TransientCommandError) -> Any:
+        """抛出原始异常，错误响应则原样返回（由WebDriver转换为异常）"""
+        if failure.error is not None:
+            raise failure.error
+        return failure.response
+
+    def _try_replace_session(self) -> bool:
+        """快速替换一次会话（每个会话最多替换max_replacements次）"""
+        driver = self._driver_ref() if self._driver_ref is not None else None
+        if driver is None or self._replace is None or self.replacements >= self.max_replacements:
+            return False
+        self.replacements += 1
+        old_session_id = driver.session_id
+        self._local.replacing = True
+        try:
+            self._replace(driver)
+        except Exception as e:
+            logger.error(f"熔断后替换会话失败: {old_session_id} ({e})")
+            return False
+        finally:
+            self._local.replacing = False
+        logger.warning(f"会话连续失败已熔断，替换会话: {old_session_id} -> {driver.session_id}")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """重试与熔断统计"""
+        return {'retries': self.retries, 'trips': self.breaker.trips,
+                'replacements': self.replacements, 'state': self.breaker.state}
+
+
+def bind_command_retry(driver: WebDriver, replace: Callable[[WebDriver], None]) -> Optional[CommandRetry]:
+    """为驱动命令执行器上的重试中间件绑定驱动和会话替换函数"""
+    for middleware in getattr(driver.command_executor, 'middlewares', []):
+        if isinstance(middleware, CommandRetry):
+            middleware.bind(driver, replace)
+            return middleware
+    return None
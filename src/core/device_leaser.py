@@ -0,0 +1,168 @@
+"""
+设备租借模块
+根据config.yaml中的设备清单，为每个pytest-xdist worker（或线程并行执行时的每个线程）分配独占设备和独立的Appium端口
+"""
+import atexit
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import config
+from .resource_lock import ResourceLock
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 设备清单中不属于capabilities的字段
+INVENTORY_RESERVED_KEYS = ('appium_port',)
+
+# 线程并行执行时当前线程的worker标识
+_thread_worker = threading.local()
+
+
+def set_thread_worker(worker_id: Optional[str]):
+    """设置当前线程的worker标识（如th0），None表示恢复为进程的worker标识"""
+    _thread_worker.worker_id = worker_id
+
+
+def get_worker_id() -> str:
+    """获取当前worker标识：线程worker优先，其次xdist worker，非并行运行时为master"""
+    return getattr(_thread_worker, 'worker_id', None) or os.getenv('PYTEST_XDIST_WORKER', 'master')
+
+
+def get_worker_index() -> int:
+    """获取当前worker序号（gw3 -> 3，th2 -> 2），非并行运行时为0"""
+    match = re.search(r'(\d+)$', get_worker_id())
+    return int(match.group(1)) if match else 0
+
+
+class DeviceLease:
+    """设备租约"""
+
+    def __init__(self, platform: str, device: Dict[str, Any], appium_port: int, lock: ResourceLock,
+                 worker_id: Optional[str] = None):
+        self.platform = platform
+        self.device = device
+        self.appium_port = appium_port
+        self.lock = lock
+        self.worker_id = worker_id or get_worker_id()
+
+    @property
+    def device_id(self) -> str:
+        """设备标识（优先udid）"""
+        return str(self.device.get('udid') or self.device.get('deviceName'))
+
+    @property
+    def server_url(self) -> str:
+        """该设备专属的Appium服务器地址"""
+        host = DeviceLeaser.get_appium_host()
+        return f"http://{host}:{self.appium_port}"
+
+    def capabilities(self) -> Dict[str, Any]:
+        """设备相关的capabilities"""
+        return {k: v for k, v in self.device.items() if k not in INVENTORY_RESERVED_KEYS}
+
+    def __repr__(self):
+        return f"DeviceLease(worker={self.worker_id}, device={self.device_id}, port={self.appium_port})"
+
+
+class DeviceLeaser:
+    """设备租借器，每个worker（xdist进程或执行线程）每个平台持有一个独占设备"""
+
+    def __init__(self):
+        # {(worker标识, 平台): 租约}
+        self._leases: Dict[Tuple[str, str], DeviceLease] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.release_all)
+
+    @staticmethod
+    def get_inventory(platform: str = 'android') -> List[Dict[str, Any]]:
+        """获取平台设备清单"""
+        return config.get(f'device_inventory.{platform}', []) or []
+
+    def has_inventory(self, platform: str = 'android') -> bool:
+        """是否配置了设备清单"""
+        return bool(self.get_inventory(platform))
+
+    @staticmethod
+    def get_appium_host() -> str:
+        """解析Appium服务器主机名"""
+        server_url = config.get_appium_config().get('server_url', 'http://localhost:4723')
+        return server_url.split('://')[-1].split('/')[0].split(':')[0]
+
+    @staticmethod
+    def get_base_port() -> int:
+        """解析Appium服务器基础端口"""
+        server_url = config.get_appium_config().get('server_url', 'http://localhost:4723')
+        host_port = server_url.split('://')[-1].split('/')[0]
+        return int(host_port.split(':')[1]) if ':' in host_port else 4723
+
+    @staticmethod
+    def get_pool_ports() -> List[int]:
+        """Appium服务器池的端口（appium.server_pool.port_range，含两端），未启用时为空"""
+        pool_config = config.get('appium.server_pool', {}) or {}
+        if not pool_config.get('enabled', False):
+            return []
+        low, high = pool_config.get('port_range') or (DeviceLeaser.get_base_port(), DeviceLeaser.get_base_port())
+        return list(range(int(low), int(high) + 1))
+
+    @classmethod
+    def get_server_port(cls, index: int) -> int:
+        """第index台设备（或第index个worker）使用的Appium端口：启用服务器池时按序号轮流映射到池中的实例"""
+        ports = cls.get_pool_ports()
+        return ports[index % len(ports)] if ports else cls.get_base_port() + index
+
+    def lease(self, platform: str = 'android', owner: Optional[str] = None) -> DeviceLease:
+        """租借设备：优先选择与worker序号对应的设备，被占用时顺延
+
+        owner为租约持有者标识，默认为当前worker；同一worker需要同时使用多台设备时（如create_drivers）
+        以不同的owner租借，每个owner持有各自的设备。
+        """
+        platform = platform.lower()
+        key = (owner or get_worker_id(), platform)
+        with self._lock:
+            if key in self._leases:
+                return self._leases[key]
+
+            inventory = self.get_inventory(platform)
+            if not inventory:
+                raise RuntimeError(f"未配置 {platform} 设备清单: device_inventory.{platform}")
+
+            worker_index = get_worker_index()
+            for offset in range(len(inventory)):
+                index = (worker_index + offset) % len(inventory)
+                device = inventory[index]
+                device_id = device.get('udid') or device.get('deviceName')
+                lock = ResourceLock(f"device-{platform}-{device_id}")
+                if not lock.acquire():
+                    continue
+
+                appium_port = device.get('appium_port') or self.get_server_port(index)
+                lease = DeviceLease(platform, dict(device), int(appium_port), lock, key[0])
+                self._leases[key] = lease
+                logger.info(f"worker {lease.worker_id} 租借设备: {lease.device_id}, Appium端口: {lease.appium_port}")
+                return lease
+
+            raise RuntimeError(f"没有空闲的 {platform} 设备，清单共 {len(inventory)} 台，均已被其他worker占用")
+
+    def get_lease(self, platform: str = 'android') -> Optional[DeviceLease]:
+        """获取当前worker已持有的租约"""
+        return self._leases.get((get_worker_id(), platform.lower()))
+
+    def release(self, platform: str = 'android', worker_id: Optional[str] = None):
+        """归还设备（默认归还当前worker的租约）"""
+        with self._lock:
+            lease = self._leases.pop((worker_id or get_worker_id(), platform.lower()), None)
+        if lease:
+            lease.lock.release()
+            logger.info(f"worker {lease.worker_id} 归还设备: {lease.device_id}")
+
+    def release_all(self):
+        """归还所有worker的设备"""
+        for worker_id, platform in list(self._leases.keys()):
+            self.release(platform, worker_id)
+
+
+# 全局设备租借器实例
+device_leaser = DeviceLeaser()
@@ -3,97 +3,597 @@ Appium驱动管理模块
 负责WebDriver的创建、管理和销毁
 """
 import atexit
-from typing import Optional, Dict, Any
+import threading
+import time
+import weakref
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from typing import Optional, Dict, Any, Iterable, List
 from appium import webdriver
 from appium.webdriver.webdriver import WebDriver
-from appium.options.android import UiAutomator2Options
-from appium.options.ios import XCUITestOptions
+from selenium import webdriver as selenium_webdriver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import WebDriverException
-from ..config import config, env_manager
+from ..config import config
+from .capability_profile import CapabilityProfile
+from .session_pool import SessionPool, PooledSession, RESET_STRATEGIES
+from .device_leaser import DeviceLease, device_leaser, get_worker_id
+from .http_client import create_command_executor
+from .session_reuse import session_store, AttachedWebDriver
+from .lazy_driver import LazyDriver
+from .session_teardown import TeardownResult, quit_drivers, force_delete_session
+from .session_heartbeat import get_executor_url
+from .command_cassette import CassetteReplayer, cassette_session
+from .appium_server import appium_server_manager
+from .fast_start import fast_start
+from .thread_registry import ThreadScopedRegistry
+from .command_retry import CommandRetry, bind_command_retry
+from .query_cache import QueryCache
+from .apk_installer import apk_installer
+from .port_allocator import port_allocator
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class MultiDriverCreationError(WebDriverException):
+    """并发创建多个驱动失败，errors记录每个驱动名对应的异常"""
+    
+    def __init__(self, errors: Dict[str, Exception]):
+        self.errors = errors
+        details = '; '.join(f"{name}: {error}" for name, error in errors.items())
+        super().__init__(f"并发创建驱动失败: {details}")
+
+
 class DriverManager:
     """驱动管理器，使用单例模式"""
     
     _instance = None
-    _drivers: Dict[str, WebDriver] = {}
+    # 驱动名到驱动/租借会话的注册表，按线程隔离（线程并行执行时每个线程有自己的default驱动）
+    _driver_registry: ThreadScopedRegistry[str, WebDriver] = ThreadScopedRegistry()
+    _lease_registry: ThreadScopedRegistry[str, PooledSession] = ThreadScopedRegistry()
+    # create_drivers为每个驱动单独租借的设备，按线程隔离
+    _device_lease_registry: ThreadScopedRegistry[str, DeviceLease] = ThreadScopedRegistry()
+    _pool: Optional[SessionPool] = None
+    # 当前线程的用例上下文（由conftest设置）：
+    # next_platform 下一个待执行用例所需的平台，用于预热；
+    # isolation / next_isolation 当前和下一个用例要求的隔离级别，None表示使用会话池默认重置策略
+    _test_context = threading.local()
+    # 驱动对应的能力配置
+    _profiles: 'weakref.WeakKeyDictionary[WebDriver, CapabilityProfile]' = weakref.WeakKeyDictionary()
+    # 最近一次quit_all_drivers的清理结果
+    teardown_results: List[TeardownResult] = []
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(DriverManager, cls).__new__(cls)
             # 注册退出处理函数
-            atexit.register(cls._instance.quit_all_drivers)
+            atexit.register(cls._instance.shutdown)
         return cls._instance
     
-    def create_driver(self, platform: str = 'android', driver_name: str = 'default') -> WebDriver:
-        """创建WebDriver实例"""
+    @property
+    def _drivers(self) -> Dict[str, WebDriver]:
+        """当前线程的驱动注册表"""
+        return self._driver_registry.current
+    
+    @property
+    def _leases(self) -> Dict[str, PooledSession]:
+        """当前线程的租借会话注册表"""
+        return self._lease_registry.current
+    
+    @property
+    def _device_leases(self) -> Dict[str, DeviceLease]:
+        """当前线程各驱动单独租借的设备"""
+        return self._device_lease_registry.current
+    
+    @property
+    def next_platform(self) -> Optional[str]:
+        """下一个用例所需的平台"""
+        return getattr(self._test_context, 'next_platform', None)
+    
+    @property
+    def isolation(self) -> Optional[str]:
+        """当前用例要求的隔离级别"""
+        return getattr(self._test_context, 'isolation', None)
+    
+    @property
+    def next_isolation(self) -> Optional[str]:
+        """下一个用例要求的隔离级别"""
+        return getattr(self._test_context, 'next_isolation', None)
+    
+    def shutdown(self):
+        """进程退出时调用：启用会话复用时保留会话供下次运行连接，否则退出所有驱动"""
+        if session_store.enabled:
+            self.detach_all_drivers()
+        else:
+            self.quit_all_drivers()
+    
+    def detach_all_drivers(self):
+        """保存所有线程的会话到状态文件并断开（不退出会话）"""
+        drivers = [driver for _, driver in self._driver_registry.all_items()]
+        if DriverManager._pool is not None:
+            drivers.extend(session.driver for session in DriverManager._pool.detach_all())
+        
+        sessions = [{'profile': self._profiles[driver], 'driver': driver, 'ports': port_allocator.ports_of(driver)}
+                    for driver in dict.fromkeys(drivers) if driver in self._profiles]
+        if sessions:
+            try:
+                session_store.save(sessions)
+            except TimeoutError as e:
+                # 无法保存的会话不能被下次运行复用，直接退出
+                logger.warning(f"{e}，退出 {len(sessions)} 个会话")
+                teardown_config = config.get('driver_teardown', {})
+                quit_drivers({str(session['driver'].session_id): session['driver'] for session in sessions},
+                             timeout=teardown_config.get('timeout', 20),
+                             force_delete=teardown_config.get('force_delete', True),
+                             force_timeout=teardown_config.get('force_timeout', 5))
+        # 端口随会话记录到状态文件，下次运行重新连接时重新占用，新建会话不会分配这些端口
+        for session in sessions:
+            port_allocator.release(session['driver'])
+        self._driver_registry.clear_all()
+        self._lease_registry.clear_all()
+    
+    def create_driver(self, platform: str = 'android', driver_name: str = 'default',
+                      profile: CapabilityProfile = None) -> WebDriver:
+        """创建WebDriver实例，未指定profile时使用平台的默认能力配置"""
+        profile = profile or self.get_profile(platform)
+        driver = self._new_driver(profile)
+        
+        # 存储驱动实例
+        self._drivers[driver_name] = driver
+        
+        logger.info(f"成功创建 {profile.platform} 驱动: {driver_name}")
+        return driver
+    
+    def create_drivers(self, specs: List[Dict[str, Any]], max_workers: int = 4) -> Dict[str, WebDriver]:
+        """使用线程池并发创建多个WebDriver实例
+        
+        specs中每项为 {'name': 驱动名, 'platform': 平台, 'capabilities': 覆盖的能力,
+        'profile': 能力配置, 'server_url': 服务器地址}，除name外均可省略。任一驱动创建失败时立即抛出MultiDriverCreationError，已创建的驱动会被退出。
+        配置了设备清单时，未指定profile和server_url的驱动各自租借一台设备，可租借的设备不足时抛出ValueError。
+        """
+        names = [spec['name'] for spec in specs]
+        duplicated = {name for name in names if names.count(name) > 1 or name in self._drivers}
+        if duplicated:
+            raise ValueError(f"驱动名重复或已存在: {sorted(duplicated)}")
+        
+        leases = self._lease_spec_devices(specs)
+        targets = {}
         try:
-            # 获取配置
-            appium_config = config.get_appium_config()
-            device_config = config.get_device_config(platform)
-            
-            # 创建对应平台的options对象
-            if platform.lower() == 'android':
-                options = UiAutomator2Options()
-            elif platform.lower() == 'ios':
-                options = XCUITestOptions()
-            else:
-                raise ValueError(f"不支持的平台: {platform}")
-            
-            # 设置capabilities
-            for key, value in device_config.items():
-                if value is not None:  # 跳过None值
-                    options.set_capability(key, value)
-            
-            # 环境相关配置调整
-            if env_manager.is_development():
-                options.set_capability('newCommandTimeout', 300)
+            for spec in specs:
+                lease = leases.get(spec['name'])
+                server_url = spec.get('server_url') or (self.get_server_url(lease.platform, lease) if lease else None)
+                targets[spec['name']] = (self._spec_profile(spec, lease), server_url)
+        except Exception:
+            self._release_spec_devices(leases.values())
+            raise
+        
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(specs))),
+                                      thread_name_prefix='create-driver')
+        futures = {executor.submit(self._new_driver, profile, server_url): name
+                   for name, (profile, server_url) in targets.items()}
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        
+        errors = {futures[f]: f.exception() for f in done if f.exception() is not None}
+        if errors:
+            # 快速失败：取消未开始的任务，已创建及仍在创建中的会话全部退出；
+            # 每个驱动的任务结束并退出后才归还其设备，避免其他worker租借到仍在创建会话的设备
+            for future in pending:
+                future.cancel()
+            for future, name in futures.items():
+                future.add_done_callback(partial(self._quit_future_driver, lease=leases.get(name)))
+            executor.shutdown(wait=False)
+            raise MultiDriverCreationError(errors)
+        
+        executor.shutdown(wait=False)
+        drivers = {name: future.result() for future, name in futures.items()}
+        self._drivers.update(drivers)
+        self._device_leases.update(leases)
+        logger.info(f"并发创建 {len(drivers)} 个驱动: {', '.join(drivers)}")
+        return drivers
+    
+    @staticmethod
+    def _lease_spec_devices(specs: List[Dict[str, Any]]) -> Dict[str, DeviceLease]:
+        """配置了设备清单时为每个未指定profile和server_url的spec租借各自的设备 {驱动名: 租约}"""
+        needed: Dict[str, List[str]] = {}
+        for spec in specs:
+            platform = spec.get('platform', 'android').lower()
+            if not spec.get('profile') and not spec.get('server_url') and device_leaser.has_inventory(platform):
+                needed.setdefault(platform, []).append(spec['name'])
+        for platform, names in needed.items():
+            inventory = device_leaser.get_inventory(platform)
+            if len(names) > len(inventory):
+                raise ValueError(f"{platform} 设备清单共 {len(inventory)} 台，不足以创建 {len(names)} 个驱动: {names}")
+        
+        leases: Dict[str, DeviceLease] = {}
+        try:
+            for platform, names in needed.items():
+                for name in names:
+                    leases[name] = device_leaser.lease(platform, owner=f"{get_worker_id()}/{name}")
+        except RuntimeError as e:
+            DriverManager._release_spec_devices(leases.values())
+            raise ValueError(f"可租借的设备不足以创建 {sum(map(len, needed.values()))} 个驱动: {e}")
+        return leases
+    
+    @staticmethod
+    def _release_spec_devices(leases: Iterable[DeviceLease]):
+        """归还create_drivers单独租借的设备"""
+        for lease in leases:
+            device_leaser.release(lease.platform, lease.worker_id)
+    
+    def _spec_profile(self, spec: Dict[str, Any], lease: Optional[DeviceLease] = None) -> CapabilityProfile:
+        """由create_drivers的spec生成能力配置，lease为该驱动单独租借的设备"""
+        profile = spec.get('profile') or self.get_profile(spec.get('platform', 'android'), lease=lease)
+        return profile.with_overrides(**spec['capabilities']) if spec.get('capabilities') else profile
+    
+    @staticmethod
+    def _quit_future_driver(future, lease: Optional[DeviceLease] = None):
+        """退出并发任务中已创建的驱动，之后归还该驱动单独租借的设备"""
+        try:
+            if future.cancelled() or future.exception() is not None:
+                return
+            driver = future.result()
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.warning(f"退出驱动时出错: {e}")
+            finally:
+                port_allocator.release(driver)
+        finally:
+            if lease is not None:
+                DriverManager._release_spec_devices([lease])
+    
+    def _new_driver(self, profile: CapabilityProfile, server_url: str = None) -> WebDriver:
+        """按能力配置新建WebDriver会话（不注册到驱动表）"""
+        try:
+            # 优先重新连接上次运行保存的会话（录制回放时总是新建会话）
+            reattach = session_store.enabled and cassette_session.mode == 'off'
+            driver = self._reattach_driver(profile) if reattach else None
             
-            # 创建WebDriver - Appium 3.0+ 不再使用 /wd/hub 路径
-            server_url = appium_config.get('server_url', 'http://localhost:4723')
-            # 移除旧的 /wd/hub 路径（如果存在）
-            if '/wd/hub' in server_url:
-                server_url = server_url.replace('/wd/hub', '')
-            driver = webdriver.Remote(server_url, options=options)
+            if driver is None:
+                driver = self._start_session(profile, server_url or self.get_server_url(profile.platform))
+            self._profiles[driver] = profile
+            bind_command_retry(driver, self._replace_session)
             
             # 设置隐式等待
             timeout = config.get_test_config().get('implicit_wait', 5)
             driver.implicitly_wait(timeout)
             
-            # 存储驱动实例
-            self._drivers[driver_name] = driver
-            
-            logger.info(f"成功创建 {platform} 驱动: {driver_name}")
             return driver
             
         except Exception as e:
             logger.error(f"创建驱动失败: {e}")
             raise WebDriverException(f"无法创建WebDriver: {e}")
     
+    def _start_session(self, profile: CapabilityProfile, server_url: str) -> WebDriver:
+        """新建会话；启用快速启动时跳过设备上已完成的初始化步骤，失败则回退到完整初始化"""
+        # 录制回放依赖请求内容不变，不调整capabilities
+        adjust = cassette_session.mode == 'off'
+        ports = None
+        if adjust:
+            # 设备上已安装相同APK时不再由Appium推送安装；并行会话使用各自的端口
+            profile = apk_installer.prepare(profile)
+            exclude = session_store.saved_ports() if session_store.enabled else ()
+            profile, ports = port_allocator.allocate(profile, exclude)
+        learn = fast_start.enabled and adjust
+        key = fast_start.device_key(profile, server_url) if learn else None
+        start_profile = fast_start.apply(profile, key)
+        fast = start_profile is not profile
+        
+        start = time.time()
+        try:
+            try:
+                driver = self._remote(start_profile, server_url)
+            except Exception as e:
+                if not fast:
+                    raise
+                logger.warning(f"快速启动会话失败: {e}")
+                fast_start.record_failure(key)
+                fast = False
+                start = time.time()
+                driver = self._remote(profile, server_url)
+        except Exception:
+            if ports is not None:
+                ports.release()
+            raise
+        port_allocator.bind(driver, ports)
+        fast_start.record_success(key, fast, time.time() - start)
+        return driver
+    
+    def _remote(self, profile: CapabilityProfile, server_url: str) -> WebDriver:
+        """向服务器发起新建会话请求"""
+        # 使用按配置调优的HTTP连接（连接池、keep-alive、按命令超时、重试）
+        command_executor = create_command_executor(server_url)
+        self._install_middlewares(command_executor)
+        # 同一能力配置的options只编译一次
+        if profile.platform == 'web':
+            return selenium_webdriver.Remote(command_executor, options=profile.build_options())
+        return webdriver.Remote(command_executor, options=profile.build_options())
+    
+    def _replace_session(self, driver: WebDriver):
+        """熔断后在原驱动对象上替换会话：删除失效会话，按快速启动配置新建会话"""
+        profile = self._profiles[driver]
+        server_url = get_executor_url(driver)
+        force_delete_session(driver, config.get('driver_teardown.force_timeout', 5))
+        
+        profile = port_allocator.apply_bound(driver, apk_installer.prepare(profile))
+        key = fast_start.device_key(profile, server_url) if fast_start.enabled else None
+        start_profile = fast_start.apply(profile, key)
+        start = time.time()
+        options = start_profile.build_options()
+        # Selenium驱动的start_session只接受capabilities字典
+        driver.start_session(options if isinstance(driver, WebDriver) else options.to_capabilities())
+        fast_start.record_success(key, start_profile is not profile, time.time() - start)
+        driver.implicitly_wait(config.get_test_config().get('implicit_wait', 5))
+    
+    def _reattach_driver(self, profile: CapabilityProfile) -> Optional[WebDriver]:
+        """连接上次运行保存的同配置会话，并按会话池的重置策略重置应用"""
+        entry = session_store.claim(profile)
+        if entry is None:
+            return None
+        
+        # 重新占用会话保存时的端口
+        ports = port_allocator.reserve(entry.get('ports') or {})
+        if ports is None:
+            logger.warning(f"保存的会话端口已被其他会话占用，改为新建会话: {entry['session_id']}")
+            return None
+        
+        command_executor = create_command_executor(entry['server_url'])
+        self._install_middlewares(command_executor)
+        driver = AttachedWebDriver(command_executor, entry['session_id'], entry['capabilities'])
+        try:
+            SessionPool.reset_app(driver, config.get('session_pool.reset_strategy', 'restart'))
+        except Exception as e:
+            logger.warning(f"重新连接的会话重置应用失败，改为新建会话: {e}")
+            ports.release()
+            return None
+        
+        port_allocator.bind(driver, ports)
+        
+        logger.info(f"重新连接已有会话: {entry['session_id']}")
+        return driver
+    
+    @staticmethod
+    def _install_middlewares(command_executor):
+        """按配置为命令执行器挂载中间件"""
+        from ..utils.command_metrics import command_metrics
+        # 回放时在最外层计时，统计每条命令经过整个中间件链的框架开销
+        cassette_middleware = cassette_session.middleware()
+        if isinstance(cassette_middleware, CassetteReplayer):
+            command_executor.add_middleware(cassette_middleware.measure)
+        
+        if command_metrics.enabled:
+            command_executor.add_middleware(command_metrics)
+        
+        # 缓存命中的查询不再经过重试和网络；录制回放要求磁带与是否缓存无关，不缓存
+        if config.get('query_cache.enabled', False) and cassette_session.mode == 'off':
+            command_executor.add_middleware(QueryCache(command_executor))
+        
+        # 录制回放要求请求与响应一一对应，不重试
+        if config.get('command_retry.enabled', False) and cassette_session.mode == 'off':
+            command_executor.add_middleware(CommandRetry(command_executor))
+        
+        # 录制回放挂在最内层，直接面对实际请求
+        if cassette_middleware is not None:
+            command_executor.add_middleware(cassette_middleware)
+    
+    def get_device_capabilities(self, platform: str = 'android', lease: Optional[DeviceLease] = None) -> Dict[str, Any]:
+        """获取设备capabilities，配置了设备清单时合并租借的设备（默认为当前worker的租约）"""
+        device_config = dict(config.get_device_config(platform))
+        if device_leaser.has_inventory(platform):
+            device_config.update((lease or device_leaser.lease(platform)).capabilities())
+        return device_config
+    
+    def get_profile(self, platform: str = 'android', lease: Optional[DeviceLease] = None,
+                    **overrides) -> CapabilityProfile:
+        """获取平台能力配置（设备配置 + 租借设备 + 覆盖项）"""
+        if session_store.enabled:
+            # 复用会话需要在两次运行之间保持存活
+            overrides.setdefault('newCommandTimeout', session_store.idle_timeout)
+        return CapabilityProfile.from_config(platform, self.get_device_capabilities(platform, lease), **overrides)
+    
+    def get_server_url(self, platform: str = 'android', lease: Optional[DeviceLease] = None) -> str:
+        """获取Appium服务器地址（web平台为WebDriver服务地址），配置了设备清单时使用设备专属端口"""
+        if appium_server_manager.fake_enabled:
+            # 模拟服务器自动分配端口，启动后地址才确定
+            fake_server = appium_server_manager.get_server(platform)
+            fake_server.start()
+            return fake_server.server_url
+        
+        if platform == 'web':
+            return config.get('web.server_url', 'http://localhost:4444').rstrip('/')
+        
+        if device_leaser.has_inventory(platform):
+            return (lease or device_leaser.lease(platform)).server_url
+        
+        if appium_server_manager.pool is not None:
+            # 服务器池中worker按序号使用实例
+            return appium_server_manager.get_server(platform).server_url
+        
+        # Appium 3.0+ 不再使用 /wd/hub 路径
+        server_url = config.get_appium_config().get('server_url', 'http://localhost:4723')
+        # 移除旧的 /wd/hub 路径（如果存在）
+        if '/wd/hub' in server_url:
+            server_url = server_url.replace('/wd/hub', '')
+        return server_url
+    
+    @property
+    def pool_enabled(self) -> bool:
+        """是否启用会话池"""
+        return bool(config.get('session_pool.enabled', False))
+    
+    @property
+    def pool(self) -> SessionPool:
+        """会话池（按需创建）"""
+        if DriverManager._pool is None:
+            pool_config = config.get('session_pool', {}) or {}
+            DriverManager._pool = SessionPool(
+                factory=self._new_driver,
+                max_size=pool_config.get('max_size', 2),
+                max_idle=pool_config.get('max_idle', 300),
+                reset_strategy=pool_config.get('reset_strategy', 'restart'),
+                prewarm=self.prewarm_enabled,
+                heartbeat=self._heartbeat_config(pool_config)
+            )
+        return DriverManager._pool
+    
+    @staticmethod
+    def _heartbeat_config(pool_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """会话心跳配置，未启用时返回None"""
+        heartbeat_config = pool_config.get('heartbeat', {}) or {}
+        # 回放时没有真实会话可以探测
+        if not heartbeat_config.get('enabled', False) or cassette_session.replaying:
+            return None
+        return heartbeat_config
+    
+    @property
+    def prewarm_enabled(self) -> bool:
+        """是否启用会话预热"""
+        return self.pool_enabled and bool(config.get('session_pool.prewarm', False))
+    
+    def set_next_platform(self, platform: Optional[str]):
+        """设置下一个用例所需的平台，None表示下一个用例不需要驱动"""
+        self._test_context.next_platform = platform
+    
+    def set_isolation(self, isolation: Optional[str], next_isolation: Optional[str] = None):
+        """设置当前用例和下一个用例的隔离级别"""
+        for level in (isolation, next_isolation):
+            if level is not None and level not in RESET_STRATEGIES:
+                raise ValueError(f"不支持的隔离级别: {level}，可选: {', '.join(RESET_STRATEGIES)}")
+        self._test_context.isolation = isolation
+        self._test_context.next_isolation = next_isolation
+    
+    def prewarm_next(self) -> bool:
+        """为下一个用例预热会话
+        
+        下一个用例与当前租借的会话使用同一设备时，由归还时的后台重置完成预热；
+        使用其他空闲设备时，在当前用例执行期间后台新建会话。
+        """
+        platform = self.next_platform
+        if not self.prewarm_enabled or platform is None:
+            return False
+        
+        profile = self.get_profile(platform)
+        busy_devices = {session.key.device_name for _, session in self._lease_registry.all_items()}
+        if profile.device_name in busy_devices:
+            return False
+        return self.pool.prewarm(profile)
+    
+    def lease_driver(self, platform: str = 'android', driver_name: str = 'default',
+                     profile: CapabilityProfile = None) -> WebDriver:
+        """从会话池租借WebDriver实例，会话池以能力配置为key，并保证满足当前用例的隔离级别"""
+        if driver_name in self._leases:
+            raise RuntimeError(f"驱动名已被租借: {driver_name}")
+        
+        profile = profile or self.get_profile(platform)
+        session = self.pool.lease(profile, strategy=self.isolation)
+        self._leases[driver_name] = session
+        self._drivers[driver_name] = session.driver
+        
+        logger.info(f"租借 {profile} 驱动: {driver_name} (第{session.lease_count}次使用)")
+        return session.driver
+    
+    def get_lazy_driver(self, platform: str = 'android', driver_name: str = 'default') -> LazyDriver:
+        """获取延迟驱动：首次使用时才租借（会话池启用时）或创建会话"""
+        def factory() -> WebDriver:
+            if self.pool_enabled:
+                return self.lease_driver(platform, driver_name)
+            return self.create_driver(platform, driver_name)
+        
+        driver = LazyDriver(factory, platform)
+        # 会话创建前先登记代理，创建后由租借/创建流程替换为真实驱动
+        self._drivers[driver_name] = driver
+        return driver
+    
+    def release_driver(self, driver_name: str = 'default', reset: bool = True):
+        """归还驱动到会话池；非池化的驱动直接退出"""
+        session = self._leases.pop(driver_name, None)
+        if session is None:
+            self.quit_driver(driver_name)
+            return
+        
+        self._drivers.pop(driver_name, None)
+        
+        # 按下一个用例的隔离级别选择最便宜的重置方式；下一个用例复用同一会话时，应用重置放到后台执行
+        background = (self.prewarm_enabled and self.next_platform is not None
+                      and self.get_profile(self.next_platform) == session.key)
+        self.pool.release(session, reset=reset, strategy=self.next_isolation, background=background)
+        logger.info(f"已归还驱动: {driver_name}")
+    
+    def release_all_drivers(self):
+        """归还所有租借的驱动，并退出非池化驱动"""
+        for driver_name in list(self._drivers.keys()):
+            self.release_driver(driver_name)
+    
+    def evict_driver(self, driver_name: str = 'default'):
+        """将租借的驱动从会话池中回收（不再复用）"""
+        session = self._leases.pop(driver_name, None)
+        self._drivers.pop(driver_name, None)
+        if session is not None:
+            self.pool.evict(session)
+    
     def get_driver(self, driver_name: str = 'default') -> Optional[WebDriver]:
         """获取WebDriver实例"""
         return self._drivers.get(driver_name)
     
     def quit_driver(self, driver_name: str = 'default'):
         """退出指定驱动"""
+        if driver_name in self._leases:
+            self.evict_driver(driver_name)
+            return
+        
         if driver_name in self._drivers:
+            driver = self._drivers[driver_name]
             try:
-                self._drivers[driver_name].quit()
+                driver.quit()
                 logger.info(f"已退出驱动: {driver_name}")
             except Exception as e:
                 logger.warning(f"退出驱动时出错: {e}")
             finally:
                 del self._drivers[driver_name]
+                port_allocator.release(driver.wrapped_driver if isinstance(driver, LazyDriver) else driver)
+                lease = self._device_leases.pop(driver_name, None)
+                if lease is not None:
+                    self._release_spec_devices([lease])
     
-    def quit_all_drivers(self):
-        """退出所有驱动"""
-        driver_names = list(self._drivers.keys())
-        for driver_name in driver_names:
-            self.quit_driver(driver_name)
+    def quit_all_drivers(self, timeout: float = None) -> List[TeardownResult]:
+        """并行退出所有线程的驱动（含会话池中的会话），每个驱动限时，超时的会话通过服务器强制删除"""
+        teardown_config = config.get('driver_teardown', {})
+        timeout = timeout if timeout is not None else teardown_config.get('timeout', 20)
+        
+        # 收集待退出的驱动（同一驱动可能同时被租借和登记在池中，不同线程的驱动名可能相同）
+        candidates = []
+        for driver_name, driver in self._driver_registry.all_items():
+            if isinstance(driver, LazyDriver):
+                driver = driver.wrapped_driver
+            if driver is not None:
+                candidates.append((driver_name, driver))
+        if DriverManager._pool is not None:
+            candidates.extend((f"pool-{session.session_id}", session.driver)
+                              for session in DriverManager._pool.detach_all())
+        targets: Dict[str, WebDriver] = {}
+        seen = set()
+        for driver_name, driver in candidates:
+            if id(driver) in seen:
+                continue
+            seen.add(id(driver))
+            name = driver_name if driver_name not in targets else f"{driver_name}-{len(targets)}"
+            targets[name] = driver
+        
+        self._driver_registry.clear_all()
+        self._lease_registry.clear_all()
+        
+        results = quit_drivers(targets, timeout=timeout,
+                               force_delete=teardown_config.get('force_delete', True),
+                               force_timeout=teardown_config.get('force_timeout', 5))
+        for result in results:
+            logger.info(f"已退出驱动: {result.name} ({result.status}, {result.seconds:.2f}s)")
+        for driver in targets.values():
+            port_allocator.release(driver)
+        self._release_spec_devices(lease for _, lease in self._device_lease_registry.all_items())
+        self._device_lease_registry.clear_all()
+        DriverManager.teardown_results = results
+        return results
     
     def restart_driver(self, driver_name: str = 'default', platform: str = 'android') -> WebDriver:
         """重启驱动"""
@@ -101,9 +601,14 @@ class DriverManager:
         return self.create_driver(platform, driver_name)
     
     def is_driver_alive(self, driver_name: str = 'default') -> bool:
-        """检查驱动是否存活"""
+        """检查驱动是否存活（池化会话启用心跳时直接读取心跳状态，不发起请求）"""
+        session = self._leases.get(driver_name)
+        if session is not None and session.heartbeat is not None:
+            return session.heartbeat.alive and not session.dead
+        
         driver = self.get_driver(driver_name)
-        if driver is None:
+        if not driver:
+            # 未登记或尚未创建会话的延迟驱动
             return False
         
         try:
@@ -117,39 +622,52 @@ class DriverManager:
 class DriverFactory:
     """驱动工厂类"""
     
+    @staticmethod
+    def _overrides(**capabilities) -> Dict[str, Any]:
+        """过滤未指定的覆盖项"""
+        return {key: value for key, value in capabilities.items() if value}
+    
+    @staticmethod
+    def android_profile(device_name: str = None, app_path: str = None,
+                        package_name: str = None, activity: str = None) -> CapabilityProfile:
+        """生成Android能力配置（不修改全局配置）"""
+        return DriverManager().get_profile('android', **DriverFactory._overrides(
+            deviceName=device_name, app=app_path, appPackage=package_name, appActivity=activity))
+    
+    @staticmethod
+    def ios_profile(device_name: str = None, app_path: str = None,
+                    bundle_id: str = None) -> CapabilityProfile:
+        """生成iOS能力配置（不修改全局配置）"""
+        return DriverManager().get_profile('ios', **DriverFactory._overrides(
+            deviceName=device_name, app=app_path, bundleId=bundle_id))
+    
+    @staticmethod
+    def web_profile(browser_name: str = None, headless: bool = None) -> CapabilityProfile:
+        """生成web能力配置（不修改全局配置）"""
+        overrides = DriverFactory._overrides(browserName=browser_name)
+        if headless is not None:
+            overrides['headless'] = headless
+        return DriverManager().get_profile('web', **overrides)
+    
     @staticmethod
     def create_android_driver(device_name: str = None, app_path: str = None, 
                             package_name: str = None, activity: str = None) -> WebDriver:
         """创建Android驱动"""
-        manager = DriverManager()
-        
-        # 动态更新配置
-        if device_name:
-            config.update_config('devices.android.deviceName', device_name)
-        if app_path:
-            config.update_config('devices.android.app', app_path)
-        if package_name:
-            config.update_config('devices.android.appPackage', package_name)
-        if activity:
-            config.update_config('devices.android.appActivity', activity)
-        
-        return manager.create_driver('android')
+        profile = DriverFactory.android_profile(device_name, app_path, package_name, activity)
+        return DriverManager().create_driver('android', profile=profile)
     
     @staticmethod
     def create_ios_driver(device_name: str = None, app_path: str = None, 
                          bundle_id: str = None) -> WebDriver:
         """创建iOS驱动"""
-        manager = DriverManager()
-        
-        # 动态更新配置
-        if device_name:
-            config.update_config('devices.ios.deviceName', device_name)
-        if app_path:
-            config.update_config('devices.ios.app', app_path)
-        if bundle_id:
-            config.update_config('devices.ios.bundleId', bundle_id)
-        
-        return manager.create_driver('ios')
+        profile = DriverFactory.ios_profile(device_name, app_path, bundle_id)
+        return DriverManager().create_driver('ios', profile=profile)
+    
+    @staticmethod
+    def create_web_driver(browser_name: str = None, headless: bool = None) -> WebDriver:
+        """创建web（Selenium浏览器）驱动"""
+        profile = DriverFactory.web_profile(browser_name, headless)
+        return DriverManager().create_driver('web', profile=profile)
 
 
 # 全局驱动管理器实例
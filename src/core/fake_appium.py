@@ -0,0 +1,367 @@
+"""
+模拟Appium服务器模块
+进程内的轻量W3C/Appium HTTP服务器，基于静态页面层级XML响应命令，可注入固定延迟，用于无设备的框架性能测试
+"""
+import json
+import re
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+try:
+    # lxml支持完整的XPath 1.0（contains()、..、and等），未安装时退回ElementTree的XPath子集
+    from lxml import etree as ElementTree
+    HAS_LXML = True
+    XPATH_ERRORS = (ElementTree.XPathError, ValueError)
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+    HAS_LXML = False
+    XPATH_ERRORS = (SyntaxError, KeyError, ValueError)
+
+logger = logging.getLogger(__name__)
+
+
+# W3C元素引用key
+ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+# 1x1透明PNG
+BLANK_PNG_BASE64 = ('iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR4nGNgYAAAAAMAAWgmWQ0AAAAASUVORK5CYII=')
+# UiSelector方法对应的节点属性及匹配方式
+UI_SELECTOR_METHODS: Dict[str, Tuple[str, Callable[[str, str], bool]]] = {
+    'text': ('text', lambda actual, expected: actual == expected),
+    'textContains': ('text', lambda actual, expected: expected in actual),
+    'textStartsWith': ('text', lambda actual, expected: actual.startswith(expected)),
+    'resourceId': ('resource-id', lambda actual, expected: actual == expected),
+    'className': ('class', lambda actual, expected: actual == expected),
+    'description': ('content-desc', lambda actual, expected: actual == expected),
+    'descriptionContains': ('content-desc', lambda actual, expected: expected in actual),
+    'clickable': ('clickable', lambda actual, expected: actual == expected),
+    'enabled': ('enabled', lambda actual, expected: actual == expected),
+}
+UI_SELECTOR_PATTERN = re.compile(r'\.(\w+)\(\s*(?:"((?:[^"\\]|\\.)*)"|(true|false))\s*\)')
+
+
+class W3CError(Exception):
+    """W3C协议错误响应"""
+
+    def __init__(self, status: int, error: str, message: str = ''):
+        super().__init__(message or error)
+        self.status = status
+        self.error = error
+        self.message = message or error
+
+
+def parse_bounds(bounds: Optional[str]) -> Dict[str, int]:
+    """解析Android bounds属性 "[x1,y1][x2,y2]" 为rect"""
+    numbers = [int(n) for n in re.findall(r'-?\d+', bounds or '')]
+    if len(numbers) != 4:
+        return {'x': 0, 'y': 0, 'width': 0, 'height': 0}
+    x1, y1, x2, y2 = numbers
+    return {'x': x1, 'y': y1, 'width': x2 - x1, 'height': y2 - y1}
+
+
+class FakeAppiumServer:
+    """模拟Appium服务器
+
+    与AppiumServer接口一致（start/stop/is_running/server_url），可以直接由AppiumServerManager管理。
+    页面层级来自get_elements.py保存的page_source.xml；send_keys会修改节点的text属性，
+    隐式等待不生效（找不到元素时立即返回错误）。
+    """
+
+    def __init__(self, hierarchy: str = None, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.hierarchy_path = hierarchy
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.request_count = 0
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+        self._root = None
+        self._element_ids: Dict[Any, str] = {}
+        self._elements: Dict[str, Any] = {}
+        self._source: Optional[str] = None
+        self._routes = self._build_routes()
+        if hierarchy:
+            self.load_hierarchy(hierarchy)
+        else:
+            self.load_hierarchy_xml('<hierarchy index="0" class="hierarchy" width="1080" height="1920"/>')
+
+    @property
+    def server_url(self) -> str:
+        """服务器地址（port为0时在启动后确定）"""
+        return f"http://{self.host}:{self.port}"
+
+    # 服务器生命周期
+    def start(self, **kwargs) -> bool:
+        """在后台线程启动服务器（port为0时自动分配端口），多个执行线程同时调用时只启动一次"""
+        with self._lock:
+            if self.is_running():
+                return True
+
+            server = self
+
+            class Handler(_FakeAppiumHandler):
+                fake_server = server
+
+            self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+            self._httpd.daemon_threads = True
+            self.port = self._httpd.server_address[1]
+            self._thread = threading.Thread(target=self._httpd.serve_forever, name=f"fake-appium-{self.port}",
+                                            daemon=True)
+            self._thread.start()
+        logger.info(f"模拟Appium服务器已启动: {self.server_url} (延迟 {self.latency * 1000:.0f}ms)")
+        return True
+
+    def stop(self):
+        """停止服务器"""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+            self._thread = None
+            logger.info("模拟Appium服务器已停止")
+
+    def restart(self, **kwargs) -> bool:
+        """重启服务器"""
+        self.stop()
+        return self.start(**kwargs)
+
+    def is_running(self) -> bool:
+        """服务器是否运行"""
+        return self._httpd is not None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # 页面层级
+    def load_hierarchy(self, path: str):
+        """加载页面层级XML文件"""
+        self.load_hierarchy_xml(Path(path).read_text(encoding='utf-8'))
+        self.hierarchy_path = path
+
+    def load_hierarchy_xml(self, xml: str):
+        """加载页面层级XML文本（替换当前页面，已查找的元素失效）"""
+        data = xml.encode('utf-8')
+        root = ElementTree.fromstring(data)
+        with self._lock:
+            self._root = root
+            self._element_ids.clear()
+            self._elements.clear()
+            self._source = None
+
+    def find(self, strategy: str, value: str, context=None) -> List[Any]:
+        """按定位策略查找节点"""
+        context = self._root if context is None else context
+        nodes = [node for node in context.iter() if node is not context]
+        if strategy == 'id':
+            return [n for n in nodes if n.get('resource-id') == value
+                    or (n.get('resource-id') or '').endswith(f":id/{value}")]
+        if strategy == 'accessibility id':
+            return [n for n in nodes if n.get('content-desc') == value or n.get('name') == value]
+        if strategy == 'class name':
+            return [n for n in nodes if n.tag == value or n.get('class') == value]
+        if strategy == 'xpath':
+            return self._find_xpath(value, context)
+        if strategy == '-android uiautomator':
+            return self._find_ui_selector(value, nodes)
+        raise W3CError(400, 'invalid selector', f"模拟服务器不支持的定位策略: {strategy}")
+
+    def _find_xpath(self, xpath: str, context) -> List[Any]:
+        """XPath查找"""
+        try:
+            if HAS_LXML:
+                return [n for n in context.xpath(xpath) if not isinstance(n, str)]
+            # ElementTree只支持相对路径
+            return context.findall(f".{xpath}" if xpath.startswith('/') else xpath)
+        except XPATH_ERRORS as e:
+            raise W3CError(400, 'invalid selector', f"无效的XPath: {xpath} ({e})")
+
+    @staticmethod
+    def _find_ui_selector(selector: str, nodes: List[Any]) -> List[Any]:
+        """UiSelector查找（支持text/resourceId/className/description等链式条件）"""
+        conditions = []
+        for method, quoted, boolean in UI_SELECTOR_PATTERN.findall(selector):
+            if method not in UI_SELECTOR_METHODS:
+                raise W3CError(400, 'invalid selector', f"模拟服务器不支持的UiSelector方法: {method}")
+            attribute, match = UI_SELECTOR_METHODS[method]
+            expected = boolean or quoted.replace('\\"', '"')
+            conditions.append((attribute, match, expected))
+        if not conditions:
+            raise W3CError(400, 'invalid selector', f"无法解析UiSelector: {selector}")
+        return [n for n in nodes
+                if all(match(n.get(attribute) or '', expected) for attribute, match, expected in conditions)]
+
+    def _element_ref(self, node) -> Dict[str, str]:
+        """节点对应的W3C元素引用"""
+        element_id = self._element_ids.get(node)
+        if element_id is None:
+            element_id = uuid.uuid4().hex
+            self._element_ids[node] = element_id
+            self._elements[element_id] = node
+        return {ELEMENT_KEY: element_id}
+
+    def _node(self, element_id: str):
+        """由元素ID获取节点"""
+        node = self._elements.get(element_id)
+        if node is None:
+            raise W3CError(404, 'stale element reference', f"元素已失效: {element_id}")
+        return node
+
+    # 请求处理
+    def _build_routes(self) -> List[Tuple[str, 're.Pattern', Callable]]:
+        """路由表: (方法, 路径正则, 处理函数)，处理函数参数为 (body, session_id, node, name)"""
+        session = r'/session/(?P<session_id>[^/]+)'
+        element = session + r'/element/(?P<element_id>[^/]+)'
+        routes = [
+            ('GET', r'/status', self._status),
+            ('POST', r'/session', self._new_session),
+            ('DELETE', session, self._delete_session),
+            ('POST', session + r'/element', self._find_element),
+            ('POST', session + r'/elements', self._find_elements),
+            ('POST', element + r'/element', self._find_element),
+            ('POST', element + r'/elements', self._find_elements),
+            ('POST', element + r'/click', lambda body, **kw: None),
+            ('POST', element + r'/value', self._send_keys),
+            ('POST', element + r'/clear', self._clear),
+            ('GET', element + r'/text', lambda body, node, **kw: node.get('text') or ''),
+            ('GET', element + r'/name', lambda body, node, **kw: node.get('class') or node.tag),
+            ('GET', element + r'/attribute/(?P<name>[^/]+)', lambda body, node, name, **kw: node.get(name)),
+            ('GET', element + r'/displayed', lambda body, node, **kw: node.get('displayed', 'true') == 'true'),
+            ('GET', element + r'/enabled', lambda body, node, **kw: node.get('enabled', 'true') == 'true'),
+            ('GET', element + r'/selected', lambda body, node, **kw: node.get('selected') == 'true'),
+            ('GET', element + r'/rect', lambda body, node, **kw: parse_bounds(node.get('bounds'))),
+            ('GET', session + r'/source', lambda body, **kw: self._page_source()),
+            ('GET', session + r'/screenshot', lambda body, **kw: BLANK_PNG_BASE64),
+            ('GET', session + r'/window/rect', lambda body, **kw: self._window_rect()),
+            ('GET', session + r'/window/(?:current/)?size', lambda body, **kw: self._window_rect()),
+            ('GET', session + r'/window', lambda body, **kw: 'NATIVE_APP'),
+            ('GET', session + r'/context', lambda body, **kw: 'NATIVE_APP'),
+            ('GET', session + r'/contexts', lambda body, **kw: ['NATIVE_APP']),
+        ]
+        return [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in routes]
+
+    def handle(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """处理一条请求，返回 (HTTP状态码, value)"""
+        self.request_count += 1
+        path = path.split('?', 1)[0].rstrip('/')
+        try:
+            with self._lock:
+                for route_method, pattern, handler in self._routes:
+                    match = pattern.match(path)
+                    if route_method != method or match is None:
+                        continue
+                    params = match.groupdict()
+                    session_id = params.get('session_id')
+                    if session_id is not None and session_id not in self.sessions:
+                        raise W3CError(404, 'invalid session id', f"会话不存在: {session_id}")
+                    element_id = params.pop('element_id', None)
+                    if element_id is not None:
+                        params['node'] = self._node(element_id)
+                    return 200, handler(body, **params)
+
+                # 未实现的会话命令（mobile:、appium/device/*等）统一返回成功
+                match = re.match(r'/session/([^/]+)/', path)
+                if match and match.group(1) in self.sessions:
+                    return 200, None
+                raise W3CError(404, 'unknown command', f"模拟服务器未实现: {method} {path}")
+        except W3CError as e:
+            return e.status, {'error': e.error, 'message': e.message, 'stacktrace': ''}
+
+    def _status(self, body, **kw):
+        return {'ready': True, 'message': '模拟Appium服务器', 'build': {'version': 'fake'}}
+
+    def _new_session(self, body, **kw):
+        capabilities = dict(body.get('capabilities', {}).get('alwaysMatch', {}))
+        first_match = body.get('capabilities', {}).get('firstMatch') or [{}]
+        capabilities.update(first_match[0])
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = capabilities
+        return {'sessionId': session_id, 'capabilities': capabilities}
+
+    def _delete_session(self, body, session_id, **kw):
+        self.sessions.pop(session_id, None)
+        return None
+
+    def _find_element(self, body, node=None, **kw):
+        nodes = self.find(body.get('using'), body.get('value'), node)
+        if not nodes:
+            raise W3CError(404, 'no such element', f"未找到元素: {body.get('using')}={body.get('value')}")
+        return self._element_ref(nodes[0])
+
+    def _find_elements(self, body, node=None, **kw):
+        return [self._element_ref(n) for n in self.find(body.get('using'), body.get('value'), node)]
+
+    def _send_keys(self, body, node, **kw):
+        text = body.get('text') or ''.join(body.get('value', []))
+        node.set('text', (node.get('text') or '') + text)
+        self._source = None
+        return None
+
+    def _clear(self, body, node, **kw):
+        node.set('text', '')
+        self._source = None
+        return None
+
+    def _page_source(self) -> str:
+        if self._source is None:
+            self._source = ElementTree.tostring(self._root, encoding='unicode')
+        return self._source
+
+    def _window_rect(self) -> Dict[str, int]:
+        return {'x': 0, 'y': 0, 'width': int(self._root.get('width') or 1080),
+                'height': int(self._root.get('height') or 1920)}
+
+
+class _FakeAppiumHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理器（keep-alive，关闭Nagle算法）"""
+
+    protocol_version = 'HTTP/1.1'
+    fake_server: FakeAppiumServer = None
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _respond(self, method: str):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}
+        if not isinstance(body, dict):
+            body = {}
+
+        # /status用于存活检查，不注入延迟
+        if self.fake_server.latency and not self.path.startswith('/status'):
+            time.sleep(self.fake_server.latency)
+
+        status, value = self.fake_server.handle(method, self.path, body)
+        payload = json.dumps({'value': value}, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        self._respond('POST')
+
+    def do_DELETE(self):
+        self._respond('DELETE')
+
+    def log_message(self, format, *args):
+        logger.debug(f"模拟Appium服务器: {format % args}")
@@ -0,0 +1,282 @@
+"""
+模拟WebDriver服务器模块
+进程内的轻量W3C WebDriver服务器，每个会话独立维护页面文档、浏览历史和Cookie，用于无浏览器的web平台测试
+"""
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import urljoin
+from .fake_appium import FakeAppiumServer, W3CError, ElementTree, HAS_LXML
+import logging
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+
+# 空白页
+BLANK_URL = 'about:blank'
+BLANK_HTML = '<html><head><title></title></head><body></body></html>'
+# 默认窗口尺寸
+DEFAULT_WINDOW_RECT = {'x': 0, 'y': 0, 'width': 1280, 'height': 800}
+# CSS复合选择器中的简单选择器: #id、.class、[attr]、[attr="value"]
+CSS_SIMPLE_PATTERN = re.compile(r'#(?P<id>[\w-]+)|\.(?P<cls>[\w-]+)'
+                                r'|\[\s*(?P<attr>[\w-]+)\s*(?:=\s*(?:"(?P<dq>(?:[^"\\]|\\.)*)"'
+                                r'|\'(?P<sq>[^\']*)\'|(?P<bare>[\w-]+))\s*)?\]')
+CSS_TAG_PATTERN = re.compile(r'[a-zA-Z][\w-]*|\*')
+
+
+def css_to_xpath(selector: str) -> str:
+    """将CSS选择器转换为XPath（支持标签、#id、.class、[属性]、后代和子元素组合，以及逗号分组）"""
+    return ' | '.join(_css_group_to_xpath(group.strip()) for group in selector.split(','))
+
+
+def _css_group_to_xpath(selector: str) -> str:
+    if not selector:
+        raise W3CError(400, 'invalid selector', "空的CSS选择器")
+    xpath = ''
+    axis = '//'
+    position = 0
+    while position < len(selector):
+        combinator = re.match(r'\s*>\s*|\s+', selector[position:])
+        if combinator:
+            axis = '/' if '>' in combinator.group() else '//'
+            position += combinator.end()
+            continue
+        tag = CSS_TAG_PATTERN.match(selector, position)
+        step = tag.group() if tag else '*'
+        position = tag.end() if tag else position
+        predicates = []
+        while position < len(selector):
+            simple = CSS_SIMPLE_PATTERN.match(selector, position)
+            if simple is None:
+                break
+            predicates.append(_css_predicate(simple))
+            position = simple.end()
+        if not tag and not predicates:
+            raise W3CError(400, 'invalid selector', f"模拟服务器无法解析CSS选择器: {selector}")
+        xpath += axis + step + ''.join(predicates)
+        axis = '//'
+    return xpath
+
+
+def _css_predicate(simple: 're.Match') -> str:
+    if simple.group('id'):
+        return f'[@id="{simple.group("id")}"]'
+    if simple.group('cls'):
+        return f'[contains(concat(" ", normalize-space(@class), " "), " {simple.group("cls")} ")]'
+    value = next((v for v in (simple.group('dq'), simple.group('sq'), simple.group('bare')) if v is not None), None)
+    if value is None:
+        return f'[@{simple.group("attr")}]'
+    # Selenium将By.ID/By.NAME转换为CSS时会转义特殊字符
+    value = re.sub(r'\\(.)', r'\1', value)
+    quote = "'" if '"' in value else '"'
+    return f'[@{simple.group("attr")}={quote}{value}{quote}]'
+
+
+def node_text(node) -> str:
+    """元素的可见文本（合并空白）"""
+    return ' '.join(''.join(node.itertext()).split())
+
+
+class FakeWebDriverServer(FakeAppiumServer):
+    """模拟WebDriver服务器
+
+    在模拟Appium服务器的基础上按会话隔离页面：每个会话有自己的当前文档、浏览历史和Cookie，
+    处理请求时切换到该会话的文档。页面内容由pages提供（URL -> HTML），未配置的URL显示空白页；
+    点击带href的链接会跳转，send_keys修改value属性，脚本不执行（返回None）。
+    """
+
+    def __init__(self, pages: Dict[str, str] = None, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0):
+        super().__init__(host=host, port=port, latency=latency)
+        self.pages: Dict[str, str] = dict(pages or {})
+        # {会话ID: 浏览器状态}
+        self._browsers: Dict[str, Dict[str, Any]] = {}
+
+    def add_page(self, url: str, html: str):
+        """添加页面"""
+        self.pages[url] = html
+
+    def load_pages(self, pages: Dict[str, str]):
+        """从文件加载页面 {URL: HTML文件路径}"""
+        for url, path in pages.items():
+            self.add_page(url, Path(path).read_text(encoding='utf-8'))
+
+    @staticmethod
+    def parse_html(html: str):
+        """解析HTML文档（未安装lxml时要求HTML是良构的XML）"""
+        if lxml is not None:
+            return lxml.html.document_fromstring(html)
+        return ElementTree.fromstring(html.encode('utf-8'))
+
+    # 浏览器状态
+    def _browser(self, session_id: str) -> Dict[str, Any]:
+        return self._browsers[session_id]
+
+    def _open(self, browser: Dict[str, Any], url: str):
+        """在会话中打开页面（不改变浏览历史），上一页面的元素失效"""
+        old_root = browser.get('root')
+        browser['url'] = url
+        browser['root'] = self.parse_html(self.pages.get(url, BLANK_HTML))
+        if old_root is not None:
+            for node in list(old_root.iter()):
+                element_id = self._element_ids.pop(node, None)
+                if element_id is not None:
+                    self._elements.pop(element_id, None)
+        self._root = browser['root']
+        self._source = None
+
+    def _navigate(self, browser: Dict[str, Any], url: str):
+        """跳转到新页面（丢弃当前位置之后的历史）"""
+        url = urljoin(browser['url'], url) if browser.get('url') not in (None, BLANK_URL) else url
+        del browser['history'][browser['index'] + 1:]
+        browser['history'].append(url)
+        browser['index'] = len(browser['history']) - 1
+        self._open(browser, url)
+
+    def _go(self, browser: Dict[str, Any], offset: int):
+        index = browser['index'] + offset
+        if 0 <= index < len(browser['history']):
+            browser['index'] = index
+            self._open(browser, browser['history'][index])
+        return None
+
+    # 元素查找
+    def find(self, strategy: str, value: str, context=None) -> List[Any]:
+        """按定位策略查找节点（增加CSS选择器、标签名和链接文本）"""
+        context = self._root if context is None else context
+        if strategy == 'css selector':
+            if not HAS_LXML:
+                raise W3CError(400, 'invalid selector', "模拟服务器的CSS选择器需要lxml")
+            xpath = css_to_xpath(value)
+            if context is not self._root:
+                xpath = '.' + xpath.replace(' | ', ' | .')
+            return self._find_xpath(xpath, context)
+        if strategy == 'tag name':
+            return [n for n in context.iter(value) if n is not context]
+        if strategy in ('link text', 'partial link text'):
+            links = [n for n in context.iter('a') if n is not context]
+            if strategy == 'link text':
+                return [n for n in links if node_text(n) == value]
+            return [n for n in links if value in node_text(n)]
+        return super().find(strategy, value, context)
+
+    # 请求处理
+    def _build_routes(self) -> List[Tuple[str, 're.Pattern', Callable]]:
+        """在模拟Appium路由之前加入浏览器命令（同一路径优先匹配浏览器实现）"""
+        session = r'/session/(?P<session_id>[^/]+)'
+        element = session + r'/element/(?P<element_id>[^/]+)'
+        routes = [
+            ('POST', session + r'/url', lambda body, session_id, **kw: self._navigate(self._browser(session_id),
+                                                                                        body.get('url', BLANK_URL))),
+            ('GET', session + r'/url', lambda body, session_id, **kw: self._browser(session_id)['url']),
+            ('GET', session + r'/title', lambda body, **kw: self._title()),
+            ('POST', session + r'/back', lambda body, session_id, **kw: self._go(self._browser(session_id), -1)),
+            ('POST', session + r'/forward', lambda body, session_id, **kw: self._go(self._browser(session_id), 1)),
+            ('POST', session + r'/refresh', lambda body, session_id, **kw: self._go(self._browser(session_id), 0)),
+            ('GET', session + r'/cookie', lambda body, session_id, **kw: list(self._browser(session_id)['cookies'].values())),
+            ('GET', session + r'/cookie/(?P<name>[^/]+)', self._get_cookie),
+            ('POST', session + r'/cookie', self._add_cookie),
+            ('DELETE', session + r'/cookie', lambda body, session_id, **kw: self._browser(session_id)['cookies'].clear()),
+            ('DELETE', session + r'/cookie/(?P<name>[^/]+)', self._delete_cookie),
+            ('POST', session + r'/execute/(?:sync|async)', self._execute_script),
+            ('GET', session + r'/window', lambda body, session_id, **kw: self._browser(session_id)['handle']),
+            ('GET', session + r'/window/handles', lambda body, session_id, **kw: [self._browser(session_id)['handle']]),
+            ('GET', session + r'/window/rect', lambda body, session_id, **kw: dict(self._browser(session_id)['rect'])),
+            ('POST', session + r'/window/rect', self._set_window_rect),
+            ('POST', element + r'/click', self._click),
+            ('POST', element + r'/value', self._send_keys),
+            ('POST', element + r'/clear', self._clear),
+            ('GET', element + r'/text', lambda body, node, **kw: node_text(node)),
+            ('GET', element + r'/name', lambda body, node, **kw: node.tag),
+            ('GET', element + r'/property/(?P<name>[^/]+)', lambda body, node, name, **kw: node.get(name)),
+            ('GET', element + r'/css/(?P<name>[^/]+)', lambda body, **kw: ''),
+        ]
+        return [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in routes] + super()._build_routes()
+
+    def handle(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """处理一条请求（先切换到请求所属会话的页面文档）"""
+        match = re.match(r'/session/([^/?]+)', path)
+        with self._lock:
+            browser = self._browsers.get(match.group(1)) if match else None
+            if browser is not None and self._root is not browser['root']:
+                self._root = browser['root']
+                self._source = None
+            return super().handle(method, path, body)
+
+    def _new_session(self, body, **kw):
+        response = super()._new_session(body, **kw)
+        browser = {'history': [BLANK_URL], 'index': 0, 'cookies': {}, 'rect': dict(DEFAULT_WINDOW_RECT),
+                   'handle': f"CDwindow-{response['sessionId'][:8]}"}
+        self._open(browser, BLANK_URL)
+        self._browsers[response['sessionId']] = browser
+        return response
+
+    def _delete_session(self, body, session_id, **kw):
+        browser = self._browsers.pop(session_id, None)
+        if browser is not None:
+            self._open(browser, BLANK_URL)
+        return super()._delete_session(body, session_id=session_id, **kw)
+
+    def _title(self) -> str:
+        titles = [n for n in self._root.iter('title')]
+        return node_text(titles[0]) if titles else ''
+
+    def _get_cookie(self, body, session_id, name, **kw):
+        cookie = self._browser(session_id)['cookies'].get(name)
+        if cookie is None:
+            raise W3CError(404, 'no such cookie', f"Cookie不存在: {name}")
+        return cookie
+
+    def _add_cookie(self, body, session_id, **kw):
+        cookie = dict(body.get('cookie') or {})
+        if not cookie.get('name'):
+            raise W3CError(400, 'invalid argument', "Cookie缺少name")
+        self._browser(session_id)['cookies'][cookie['name']] = cookie
+        return None
+
+    def _delete_cookie(self, body, session_id, name, **kw):
+        self._browser(session_id)['cookies'].pop(name, None)
+        return None
+
+    def _execute_script(self, body, **kw):
+        """脚本不执行；页面加载状态和标题查询返回模拟值"""
+        script = body.get('script') or ''
+        if 'document.readyState' in script:
+            return 'complete'
+        if 'document.title' in script:
+            return self._title()
+        return None
+
+    def _set_window_rect(self, body, session_id, **kw):
+        rect = self._browser(session_id)['rect']
+        rect.update({key: int(body[key]) for key in DEFAULT_WINDOW_RECT if body.get(key) is not None})
+        return dict(rect)
+
+    def _click(self, body, session_id, node, **kw):
+        if node.tag == 'a' and node.get('href'):
+            self._navigate(self._browser(session_id), node.get('href'))
+        return None
+
+    def _send_keys(self, body, node, **kw):
+        text = body.get('text') or ''.join(body.get('value', []))
+        node.set('value', (node.get('value') or '') + text)
+        self._source = None
+        return None
+
+    def _clear(self, body, node, **kw):
+        node.set('value', '')
+        self._source = None
+        return None
+
+    def _page_source(self) -> str:
+        if self._source is None:
+            if lxml is not None:
+                self._source = lxml.html.tostring(self._root, encoding='unicode')
+            else:
+                self._source = ElementTree.tostring(self._root, encoding='unicode')
+        return self._source
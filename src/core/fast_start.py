@@ -0,0 +1,147 @@
+"""
+快速启动模块
+按设备序列号和Appium服务器版本记录设备初始化是否已完成，后续会话自动跳过重复的初始化步骤，失败时回退到完整初始化
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import requests
+from ..config import config
+from .capability_profile import CapabilityProfile
+from .resource_lock import ResourceLock
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 完整初始化成功后可以跳过的步骤对应的capabilities（UiAutomator2）
+FAST_START_CAPABILITIES = {
+    'skipServerInstallation': True,        # 不再检查/安装UiAutomator2服务端APK
+    'skipDeviceInitialization': True,      # 不再检查Settings应用和权限
+    'ignoreHiddenApiPolicyError': True,    # 不再修改hidden API策略
+}
+# 每台设备保留的启动耗时样本数
+MAX_SAMPLES = 20
+
+
+class FastStartLearner:
+    """快速启动学习器
+
+    状态文件按 "设备序列号|服务器版本" 记录：完整初始化成功后标记为可快速启动，
+    快速启动失败则清除标记，下次重新完整初始化。同时记录两种方式的会话启动耗时。
+    """
+
+    def __init__(self):
+        self._server_versions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用快速启动"""
+        return bool(config.get('fast_start.enabled', False))
+
+    @property
+    def state_file(self) -> Path:
+        """状态文件路径"""
+        return Path(config.get('fast_start.state_file', './reports/.fast_start.json'))
+
+    def get_server_version(self, server_url: str) -> str:
+        """获取Appium服务器版本（按地址缓存）"""
+        if server_url not in self._server_versions:
+            version = 'unknown'
+            try:
+                response = requests.get(f"{server_url.rstrip('/')}/status", timeout=5)
+                version = response.json().get('value', {}).get('build', {}).get('version') or version
+            except (requests.RequestException, ValueError, AttributeError):
+                pass
+            self._server_versions[server_url] = version
+        return self._server_versions[server_url]
+
+    def device_key(self, profile: CapabilityProfile, server_url: str) -> Optional[str]:
+        """状态key，不适用快速启动的配置返回None"""
+        if profile.platform != 'android' or str(profile.get('automationName', '')).lower() != 'uiautomator2':
+            return None
+        if not profile.device_name:
+            return None
+        return f"{profile.device_name}|{self.get_server_version(server_url)}"
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """读取状态文件"""
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _update(self, key: str, update):
+        """在跨进程锁内读取-修改-写入状态（并行worker共享同一状态文件）"""
+        lock = ResourceLock(f"fast-start-{self.state_file.name}")
+        deadline = time.time() + 5
+        while not lock.acquire():
+            if time.time() > deadline:
+                logger.debug("获取快速启动状态锁超时，跳过本次记录")
+                return
+            time.sleep(0.05)
+        try:
+            with self._lock:
+                state = self.load()
+                update(state.setdefault(key, {'fast_start': False, 'full': [], 'fast': [], 'fallbacks': 0}))
+                self.state_file.parent.mkdir(parents=True, exist_ok=True)
+                temp_file = self.state_file.with_suffix('.tmp')
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(state, f, ensure_ascii=False, indent=2)
+                os.replace(temp_file, self.state_file)
+        finally:
+            lock.release()
+
+    def apply(self, profile: CapabilityProfile, key: Optional[str]) -> CapabilityProfile:
+        """已完成过完整初始化的设备加上快速启动capabilities（配置中显式设置的值优先）"""
+        if key is None or not self.load().get(key, {}).get('fast_start'):
+            return profile
+        overrides = {name: value for name, value in FAST_START_CAPABILITIES.items() if profile.get(name) is None}
+        return profile.with_overrides(**overrides) if overrides else profile
+
+    def record_success(self, key: Optional[str], fast: bool, seconds: float):
+        """会话创建成功：记录耗时，完整初始化成功后标记为可快速启动"""
+        if key is None:
+            return
+
+        def update(entry):
+            samples = entry['fast' if fast else 'full']
+            samples.append(round(seconds, 3))
+            del samples[:-MAX_SAMPLES]
+            entry['fast_start'] = True
+
+        self._update(key, update)
+        logger.info(f"会话启动耗时 {seconds:.2f}s ({'快速启动' if fast else '完整初始化'}): {key}")
+
+    def record_failure(self, key: Optional[str]):
+        """快速启动失败：清除标记，回退到完整初始化"""
+        if key is None:
+            return
+
+        def update(entry):
+            entry['fast_start'] = False
+            entry['fallbacks'] = entry.get('fallbacks', 0) + 1
+
+        self._update(key, update)
+        logger.warning(f"快速启动失败，回退到完整初始化: {key}")
+
+
+def format_start_times(state: Dict[str, Dict[str, Any]]) -> List[str]:
+    """生成每台设备完整初始化与快速启动的平均会话启动耗时"""
+    if not state:
+        return []
+    lines = [f"{'设备|服务器版本':<40}{'完整初始化(s)':>14}{'快速启动(s)':>12}{'回退次数':>10}"]
+    for key, entry in sorted(state.items()):
+        full = f"{sum(entry['full']) / len(entry['full']):.2f}" if entry.get('full') else '-'
+        fast = f"{sum(entry['fast']) / len(entry['fast']):.2f}" if entry.get('fast') else '-'
+        lines.append(f"{key:<40}{full:>14}{fast:>12}{entry.get('fallbacks', 0):>10}")
+    return lines
+
+
+# 全局快速启动学习器实例
+fast_start = FastStartLearner()
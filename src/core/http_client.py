@@ -0,0 +1,136 @@
+"""
+Appium HTTP客户端配置模块
+为DriverManager创建的每个驱动提供可调的连接池、keep-alive、按命令超时和连接重置重试
+"""
+import socket
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+from appium.webdriver.appium_connection import AppiumConnection
+from appium.webdriver.client_config import AppiumClientConfig
+from ..config import config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 默认客户端配置，可在 config.yaml 的 appium.client 中覆盖
+DEFAULT_CLIENT_CONFIG = {
+    'keep_alive': True,
+    'pool_maxsize': 10,
+    'timeout': 120,
+    'command_timeouts': {},
+    'retries': 2,
+    'backoff_factor': 0.2,
+}
+
+
+class TunedClientConfig(AppiumClientConfig):
+    """支持按命令覆盖超时的客户端配置
+
+    Selenium在每次请求时读取client_config.timeout，这里用线程局部变量
+    返回当前命令的超时，不影响其他线程上的并发请求。
+    """
+
+    _local = threading.local()
+
+    def _get_timeout(self):
+        override = getattr(self._local, 'timeout', None)
+        return override if override is not None else self._timeout
+
+    def _set_timeout(self, value):
+        self._timeout = value
+
+    timeout = property(_get_timeout, _set_timeout)
+
+    def command_timeout(self, timeout: Optional[float]):
+        """设置当前线程下一条命令的超时，None表示使用默认值"""
+        self._local.timeout = timeout
+
+
+# 命令中间件: middleware(command, params, call_next) -> response
+# call_next(command, params) 执行后续中间件及实际请求，中间件可以记录、改写或直接返回响应
+CommandMiddleware = Callable[[str, Dict[str, Any], Callable[[str, Dict[str, Any]], Any]], Any]
+
+
+class TunedAppiumConnection(AppiumConnection):
+    """连接池可调的Appium命令执行器，支持挂载命令中间件"""
+
+    def __init__(self, client_config: TunedClientConfig, pool_maxsize: int = 10, retries: int = 2,
+                 backoff_factor: float = 0.2, command_timeouts: Dict[str, float] = None):
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.command_timeouts = command_timeouts or {}
+        self.middlewares: List[CommandMiddleware] = []
+        super().__init__(client_config=client_config)
+
+    def add_middleware(self, middleware: CommandMiddleware):
+        """挂载命令中间件，先挂载的在外层"""
+        self.middlewares.append(middleware)
+
+    def _get_connection_manager(self):
+        """在默认连接池参数上增加池大小、重试策略和TCP选项"""
+        manager = super()._get_connection_manager()
+        manager.connection_pool_kw.update({
+            'maxsize': self.pool_maxsize,
+            'block': False,
+            # 连接被重置时重试；read重试只作用于GET等幂等请求
+            'retries': Retry(total=self.retries, connect=self.retries, read=self.retries,
+                             status=0, redirect=False, backoff_factor=self.backoff_factor),
+            # 禁用Nagle算法，避免小包请求被延迟；开启TCP keep-alive
+            'socket_options': HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+            ],
+        })
+        return manager
+
+    def execute(self, command, params):
+        """执行命令，依次经过已挂载的中间件"""
+        return self._dispatch(0, command, params)
+
+    def _dispatch(self, index: int, command, params):
+        """调用第index个中间件，全部调用完后发送请求"""
+        if index < len(self.middlewares):
+            return self.middlewares[index](
+                command, params, lambda next_command, next_params: self._dispatch(index + 1, next_command, next_params))
+        return self._send(command, params)
+
+    def _send(self, command, params):
+        """发送请求，按命令名应用单独的超时"""
+        timeout = self.command_timeouts.get(command)
+        if timeout is None:
+            return super().execute(command, params)
+
+        self._client_config.command_timeout(timeout)
+        try:
+            return super().execute(command, params)
+        finally:
+            self._client_config.command_timeout(None)
+
+
+def get_client_config() -> Dict[str, Any]:
+    """获取合并默认值后的客户端配置"""
+    client_config = dict(DEFAULT_CLIENT_CONFIG)
+    client_config.update(config.get('appium.client', {}) or {})
+    return client_config
+
+
+def create_command_executor(server_url: str, **overrides) -> TunedAppiumConnection:
+    """按配置创建命令执行器"""
+    client_config = get_client_config()
+    client_config.update(overrides)
+
+    tuned_config = TunedClientConfig(
+        server_url,
+        keep_alive=client_config['keep_alive'],
+        timeout=client_config['timeout'],
+    )
+    return TunedAppiumConnection(
+        tuned_config,
+        pool_maxsize=client_config['pool_maxsize'],
+        retries=client_config['retries'],
+        backoff_factor=client_config['backoff_factor'],
+        command_timeouts=client_config['command_timeouts'],
+    )
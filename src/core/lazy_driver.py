@@ -0,0 +1,74 @@
+"""
+延迟驱动模块
+驱动代理对象在第一次真正调用驱动命令时才创建Appium会话，跳过或提前失败的用例不会创建会话
+"""
+import threading
+from typing import Callable, List, Optional
+from appium.webdriver.webdriver import WebDriver
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LazyDriver:
+    """WebDriver延迟代理
+
+    页面对象和fixture可以在会话创建前直接持有该代理；访问任意驱动属性或方法时
+    通过factory创建真实驱动并转发。会话未创建时代理的布尔值为False，quit()不做任何事。
+    """
+
+    def __init__(self, factory: Callable[[], WebDriver], platform: str = 'android'):
+        # 使用object.__setattr__避免与__getattr__转发冲突
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_platform', platform)
+        object.__setattr__(self, '_driver', None)
+        object.__setattr__(self, '_start_hooks', [])
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    @property
+    def started(self) -> bool:
+        """会话是否已创建"""
+        return self._driver is not None
+
+    @property
+    def wrapped_driver(self) -> Optional[WebDriver]:
+        """真实驱动，未创建时为None"""
+        return self._driver
+
+    def get_driver(self) -> WebDriver:
+        """获取真实驱动，必要时创建会话"""
+        if self._driver is None:
+            with self._lock:
+                if self._driver is None:
+                    logger.info(f"首次使用驱动，创建 {self._platform} 会话")
+                    driver = self._factory()
+                    object.__setattr__(self, '_driver', driver)
+                    hooks: List[Callable[[WebDriver], None]] = self._start_hooks
+                    for hook in hooks:
+                        hook(driver)
+        return self._driver
+
+    def on_start(self, hook: Callable[[WebDriver], None]):
+        """注册会话创建后的回调，会话已创建时立即执行"""
+        if self._driver is not None:
+            hook(self._driver)
+        else:
+            self._start_hooks.append(hook)
+
+    def quit(self):
+        """退出会话，未创建时不做任何事"""
+        if self._driver is not None:
+            self._driver.quit()
+
+    def __getattr__(self, name):
+        return getattr(self.get_driver(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get_driver(), name, value)
+
+    def __bool__(self):
+        return self.started
+
+    def __repr__(self):
+        state = self._driver.session_id if self._driver is not None else '未创建'
+        return f"LazyDriver(platform={self._platform}, session={state})"
@@ -0,0 +1,187 @@
+"""
+端口分配模块
+同一主机上并行运行多个UiAutomator2会话时，为每个会话分配不冲突的systemPort、chromedriverPort和mjpegServerPort，
+端口用跨进程资源锁占用，xdist worker之间不会重复分配
+"""
+import socket
+import threading
+import weakref
+from typing import Collection, Dict, List, Optional, Tuple
+from appium.webdriver.webdriver import WebDriver
+from ..config import config
+from .capability_profile import CapabilityProfile
+from .resource_lock import ResourceLock, DEFAULT_LOCK_DIR
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 默认端口范围（含两端）
+DEFAULT_PORT_RANGES = {
+    'systemPort': (8200, 8299),
+    'chromedriverPort': (9515, 9614),
+    'mjpegServerPort': (7810, 7909),
+}
+# 端口锁名前缀（所有能力共用一个命名空间，范围重叠也不会冲突）
+PORT_LOCK_PREFIX = 'port-'
+
+
+class PortAllocation:
+    """一个会话占用的端口"""
+
+    def __init__(self):
+        self.ports: Dict[str, int] = {}
+        self._locks: List[ResourceLock] = []
+
+    def add(self, capability: str, port: int, lock: ResourceLock):
+        self.ports[capability] = port
+        self._locks.append(lock)
+
+    def release(self):
+        """释放全部端口（可重复调用）"""
+        for lock in self._locks:
+            lock.release()
+        self._locks.clear()
+
+    def __repr__(self):
+        return f"PortAllocation({self.ports})"
+
+
+class PortAllocator:
+    """会话端口分配器
+
+    按配置的范围依次尝试获取端口锁并确认本机端口未被其他程序占用；分配结果绑定到驱动，
+    退出驱动时释放，驱动被回收时兜底释放。锁文件记录持有者进程，进程异常退出后泄漏的端口在下次启动时回收。
+    """
+
+    def __init__(self):
+        # {驱动: 端口分配}
+        self._allocations: 'weakref.WeakKeyDictionary[WebDriver, PortAllocation]' = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._reclaimed = False
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用端口分配"""
+        return bool(config.get('port_allocator.enabled', False))
+
+    @staticmethod
+    def get_ranges() -> Dict[str, Tuple[int, int]]:
+        """各能力的端口范围"""
+        ranges = dict(DEFAULT_PORT_RANGES)
+        for capability, bounds in (config.get('port_allocator.ranges', {}) or {}).items():
+            ranges[capability] = (int(bounds[0]), int(bounds[1]))
+        return ranges
+
+    @staticmethod
+    def applies_to(profile: CapabilityProfile) -> bool:
+        """只有Android UiAutomator2会话需要分配端口"""
+        return profile.platform == 'android' and str(profile.get('automationName', '')).lower() == 'uiautomator2'
+
+    @staticmethod
+    def is_port_free(port: int) -> bool:
+        """本机端口是否未被占用"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind(('127.0.0.1', port))
+            except OSError:
+                return False
+        return True
+
+    def reclaim(self) -> int:
+        """回收已退出进程泄漏的端口锁，返回回收数量"""
+        count = 0
+        for lock_file in DEFAULT_LOCK_DIR.glob(f'{PORT_LOCK_PREFIX}*.lock'):
+            if ResourceLock(lock_file.stem)._reclaim_if_stale():
+                count += 1
+        if count:
+            logger.info(f"回收泄漏的会话端口: {count} 个")
+        return count
+
+    def _acquire_port(self, capability: str, low: int, high: int,
+                      exclude: Collection[int] = ()) -> Tuple[int, ResourceLock]:
+        for port in range(low, high + 1):
+            if port in exclude:
+                continue
+            lock = ResourceLock(f"{PORT_LOCK_PREFIX}{port}")
+            if not lock.acquire():
+                continue
+            if self.is_port_free(port):
+                return port, lock
+            lock.release()
+        raise RuntimeError(f"{capability} 端口范围 {low}-{high} 已用尽")
+
+    def allocate(self, profile: CapabilityProfile,
+                 exclude: Collection[int] = ()) -> Tuple[CapabilityProfile, Optional[PortAllocation]]:
+        """为能力配置分配端口（配置中已显式指定的端口保持不变），返回带端口的配置和分配结果
+
+        exclude中的端口不分配（例如保存待下次重新连接的会话仍在使用的端口）
+        """
+        if not self.enabled or not self.applies_to(profile):
+            return profile, None
+        with self._lock:
+            if not self._reclaimed:
+                self._reclaimed = True
+                self.reclaim()
+
+        allocation = PortAllocation()
+        try:
+            for capability, (low, high) in self.get_ranges().items():
+                if profile.get(capability) is None:
+                    allocation.add(capability, *self._acquire_port(capability, low, high, exclude))
+        except Exception:
+            allocation.release()
+            raise
+        if not allocation.ports:
+            return profile, None
+        logger.debug(f"分配会话端口: {allocation.ports} ({profile})")
+        return profile.with_overrides(**allocation.ports), allocation
+
+    def reserve(self, ports: Dict[str, int]) -> Optional[PortAllocation]:
+        """重新占用已知端口（重新连接的会话沿用保存时的端口），任一端口已被其他会话占用时返回None"""
+        allocation = PortAllocation()
+        for capability, port in ports.items():
+            lock = ResourceLock(f"{PORT_LOCK_PREFIX}{port}")
+            if not lock.acquire():
+                allocation.release()
+                return None
+            allocation.add(capability, int(port), lock)
+        return allocation
+
+    def bind(self, driver: WebDriver, allocation: Optional[PortAllocation]):
+        """将端口分配绑定到驱动（驱动被回收时兜底释放）"""
+        if allocation is None:
+            return
+        with self._lock:
+            self._allocations[driver] = allocation
+        weakref.finalize(driver, allocation.release)
+
+    def apply_bound(self, driver: WebDriver, profile: CapabilityProfile) -> CapabilityProfile:
+        """在驱动上替换会话时沿用已分配的端口"""
+        allocation = self._allocations.get(driver)
+        return profile.with_overrides(**allocation.ports) if allocation is not None else profile
+
+    def ports_of(self, driver: WebDriver) -> Dict[str, int]:
+        """驱动占用的端口 {能力: 端口}"""
+        with self._lock:
+            allocation = self._allocations.get(driver)
+        return dict(allocation.ports) if allocation is not None else {}
+
+    def release(self, driver: WebDriver):
+        """释放驱动占用的端口"""
+        if driver is None:
+            return
+        with self._lock:
+            allocation = self._allocations.pop(driver, None)
+        if allocation is not None:
+            allocation.release()
+            logger.debug(f"释放会话端口: {allocation.ports}")
+
+    def allocated(self) -> Dict[str, Dict[str, int]]:
+        """当前进程已分配的端口 {会话ID: {能力: 端口}}"""
+        with self._lock:
+            return {str(driver.session_id): dict(allocation.ports) for driver, allocation in self._allocations.items()}
+
+
+# 全局端口分配器实例
+port_allocator = PortAllocator()
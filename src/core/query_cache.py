@@ -0,0 +1,162 @@
+"""
+查询缓存模块
+以命令执行器中间件的方式缓存会话内结果稳定的查询（屏幕尺寸、上下文、能力、当前Activity），
+按显式规则失效：旋转屏幕时失效屏幕尺寸，页面跳转时失效当前Activity，切换上下文时失效上下文
+"""
+import copy
+import json
+import threading
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+from selenium.webdriver.remote.command import Command
+from appium.webdriver.mobilecommand import MobileCommand
+from appium.webdriver.webdriver import WebDriver
+from ..config import config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 缓存类别
+KIND_WINDOW = 'window'
+KIND_ACTIVITY = 'activity'
+KIND_CONTEXTS = 'contexts'
+KIND_CAPABILITIES = 'capabilities'
+QUERY_KINDS = (KIND_WINDOW, KIND_ACTIVITY, KIND_CONTEXTS, KIND_CAPABILITIES)
+
+# 可缓存的命令及其类别
+CACHEABLE_COMMANDS = {
+    Command.GET_WINDOW_RECT: KIND_WINDOW,
+    MobileCommand.GET_SCREEN_ORIENTATION: KIND_WINDOW,
+    MobileCommand.GET_CURRENT_ACTIVITY: KIND_ACTIVITY,
+    MobileCommand.CONTEXTS: KIND_CONTEXTS,
+    MobileCommand.GET_CURRENT_CONTEXT: KIND_CONTEXTS,
+    MobileCommand.GET_SESSION: KIND_CAPABILITIES,
+    MobileCommand.GET_CAPABILITIES: KIND_CAPABILITIES,
+}
+# 可缓存的只读脚本（current_package等通过mobile:脚本实现）
+CACHEABLE_SCRIPTS = {
+    'mobile: getCurrentActivity': KIND_ACTIVITY,
+    'mobile: getCurrentPackage': KIND_ACTIVITY,
+    'mobile: getContexts': KIND_CONTEXTS,
+}
+EXECUTE_SCRIPT_COMMANDS = {Command.W3C_EXECUTE_SCRIPT, Command.W3C_EXECUTE_SCRIPT_ASYNC}
+
+# 失效规则：命令 -> 失效的类别（页面跳转规则见QueryCache.invalidations）
+ROTATION_COMMANDS = {MobileCommand.SET_SCREEN_ORIENTATION, Command.SET_WINDOW_RECT}
+CONTEXT_COMMANDS = {MobileCommand.SWITCH_TO_CONTEXT}
+# 不改变页面的命令（查找元素使用POST，但不会引起跳转）
+READ_ONLY_POST_COMMANDS = {
+    Command.FIND_ELEMENT, Command.FIND_ELEMENTS,
+    Command.FIND_CHILD_ELEMENT, Command.FIND_CHILD_ELEMENTS,
+}
+# 会话生命周期命令，清空全部缓存
+SESSION_COMMANDS = {Command.NEW_SESSION, Command.QUIT}
+
+
+class QueryCache:
+    """会话查询缓存中间件（每个命令执行器一个实例）
+
+    缓存按会话ID隔离，会话替换后自动清空；响应以副本返回，调用方修改响应不影响缓存。
+    """
+
+    def __init__(self, command_executor, kinds=None):
+        self.command_executor = command_executor
+        self.kinds: Set[str] = set(kinds if kinds is not None else
+                                   config.get('query_cache.kinds', list(QUERY_KINDS)))
+        self.hits = 0
+        self.misses = 0
+        self._session_id: Optional[str] = None
+        self._entries: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def query_kind(self, command: str, params: Dict[str, Any]) -> Optional[str]:
+        """命令对应的缓存类别，不可缓存时返回None"""
+        if command in EXECUTE_SCRIPT_COMMANDS:
+            kind = CACHEABLE_SCRIPTS.get(params.get('script'))
+        else:
+            kind = CACHEABLE_COMMANDS.get(command)
+        return kind if kind in self.kinds else None
+
+    def invalidations(self, command: str, params: Dict[str, Any]) -> Set[str]:
+        """命令执行后需要失效的类别"""
+        if command in ROTATION_COMMANDS:
+            return {KIND_WINDOW}
+        if command in CONTEXT_COMMANDS:
+            return {KIND_CONTEXTS}
+        if command in READ_ONLY_POST_COMMANDS:
+            return set()
+        method = getattr(self.command_executor, '_commands', {}).get(command, (None,))[0]
+        if method == 'GET':
+            return set()
+        if command in EXECUTE_SCRIPT_COMMANDS:
+            # mobile:脚本可能旋转屏幕或切换页面
+            return {KIND_WINDOW, KIND_ACTIVITY, KIND_CONTEXTS}
+        # 其余会改变状态的命令（点击、返回、手势、启动应用等）视为页面跳转，网页上下文也可能随之出现或消失
+        return {KIND_ACTIVITY, KIND_CONTEXTS}
+
+    def invalidate(self, kinds=None):
+        """失效指定类别的缓存，不指定时清空全部"""
+        with self._lock:
+            if kinds is None:
+                self._entries.clear()
+                return
+            kinds = {kinds} if isinstance(kinds, str) else set(kinds)
+            for key in [key for key in self._entries if key[0] in kinds]:
+                del self._entries[key]
+
+    def __call__(self, command: str, params: Dict[str, Any], call_next: Callable) -> Any:
+        """中间件入口"""
+        if command in SESSION_COMMANDS:
+            self.invalidate()
+            return call_next(command, params)
+
+        with self._lock:
+            session_id = params.get('sessionId')
+            if session_id != self._session_id:
+                self._entries.clear()
+                self._session_id = session_id
+
+        kind = self.query_kind(command, params)
+        if kind is None:
+            response = call_next(command, params)
+            stale = self.invalidations(command, params)
+            if stale:
+                self.invalidate(stale)
+            return response
+
+        key = (kind, f"{command} {json.dumps(params, sort_keys=True, default=str)}")
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                # WebDriver.execute会原地修改响应
+                return copy.deepcopy(self._entries[key])
+        response = call_next(command, params)
+        with self._lock:
+            self.misses += 1
+            if self._is_success(response):
+                self._entries[key] = copy.deepcopy(response)
+        return response
+
+    @staticmethod
+    def _is_success(response: Any) -> bool:
+        """成功的响应才缓存（错误响应带有非0的status）"""
+        return isinstance(response, dict) and response.get('status', 0) in (0, 200)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+def get_query_cache(driver: WebDriver) -> Optional[QueryCache]:
+    """获取驱动命令执行器上的查询缓存，未启用时返回None"""
+    for middleware in getattr(driver.command_executor, 'middlewares', []):
+        if isinstance(middleware, QueryCache):
+            return middleware
+    return None
+
+
+def invalidate_query_cache(driver: WebDriver, kinds=None):
+    """失效驱动的查询缓存（通过缓存规则之外的方式改变了设备状态时调用，例如adb旋转屏幕）"""
+    cache = get_query_cache(driver)
+    if cache is not None:
+        cache.invalidate(kinds)
@@ -0,0 +1,166 @@
+"""
+跨进程资源锁模块
+基于锁文件上的操作系统咨询锁（Linux/macOS为flock，Windows为msvcrt.locking）实现设备、端口等资源的进程间互斥；
+持有者进程退出时系统自动释放锁，不依赖锁文件中记录的进程ID判断是否失效
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+import logging
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+# 默认锁目录，同一台主机上的所有进程共享
+DEFAULT_LOCK_DIR = Path(tempfile.gettempdir()) / 'ui-autotest-locks'
+
+
+def _try_lock(fd: int) -> bool:
+    """非阻塞地对文件加排他锁"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd: int):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    except OSError:
+        pass
+
+
+class ResourceLock:
+    """资源锁
+
+    锁文件中记录持有者进程ID（仅供查看）。是否被持有只由系统锁决定：持有者退出后锁自动释放，
+    锁文件残留也可以直接获取。释放时在持有锁的状态下删除锁文件，获取后确认打开的仍是目录中的锁文件，
+    避免锁住已被删除的旧文件。
+    """
+
+    def __init__(self, name: str, lock_dir: Optional[Path] = None):
+        self.name = name
+        self.lock_dir = Path(lock_dir or DEFAULT_LOCK_DIR)
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() or c in ('-', '_', '.') else '_' for c in name)
+        self.path = self.lock_dir / f"{safe_name}.lock"
+        self.acquired = False
+        self._fd: Optional[int] = None
+
+    def _open_locked(self) -> Optional[int]:
+        """打开锁文件并加锁，锁已被其他持有者占用时返回None"""
+        for _ in range(5):
+            fd = os.open(str(self.path), os.O_CREAT | os.O_RDWR)
+            if not _try_lock(fd):
+                os.close(fd)
+                return None
+            try:
+                current = os.fstat(fd).st_ino == os.stat(str(self.path)).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                return fd
+            # 加锁前文件被上一个持有者释放删除，重新打开
+            _unlock(fd)
+            os.close(fd)
+        return None
+
+    def acquire(self) -> bool:
+        """尝试获取锁（非阻塞）"""
+        if self.acquired:
+            return True
+
+        fd = self._open_locked()
+        if fd is None:
+            return False
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        self.acquired = True
+        logger.debug(f"获取资源锁: {self.name}")
+        return True
+
+    def release(self):
+        """释放锁"""
+        if not self.acquired:
+            return
+        fd, self._fd = self._fd, None
+        self.acquired = False
+        if fcntl is not None:
+            # 持有锁时删除，等待中的进程获取后会发现文件已被替换
+            self._unlink()
+            _unlock(fd)
+            os.close(fd)
+        else:
+            # Windows不能删除已打开的文件
+            _unlock(fd)
+            os.close(fd)
+            self._unlink()
+        logger.debug(f"释放资源锁: {self.name}")
+
+    def _unlink(self):
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+    def owner_pid(self) -> Optional[int]:
+        """获取锁文件中记录的持有者进程ID（锁可能已随持有者退出而释放）"""
+        try:
+            return int(self.path.read_text().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _reclaim_if_stale(self) -> bool:
+        """锁文件存在但没有被持有（持有者已退出）时删除锁文件，返回是否回收"""
+        if self.acquired or not self.path.exists():
+            return False
+        fd = self._open_locked()
+        if fd is None:
+            return False
+        pid = self.owner_pid()
+        self._fd = fd
+        self.acquired = True
+        self.release()
+        logger.info(f"回收失效的资源锁: {self.name} (pid={pid})")
+        return True
+
+    @staticmethod
+    def reclaim_stale_locks(lock_dir: Optional[Path] = None) -> int:
+        """回收目录下所有失效的锁，返回回收数量"""
+        lock_dir = Path(lock_dir or DEFAULT_LOCK_DIR)
+        if not lock_dir.exists():
+            return 0
+
+        count = 0
+        for lock_file in lock_dir.glob('*.lock'):
+            lock = ResourceLock(lock_file.stem, lock_dir)
+            if lock._reclaim_if_stale():
+                count += 1
+        return count
+
+    def __enter__(self):
+        if not self.acquire():
+            raise RuntimeError(f"资源已被占用: {self.name}")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -0,0 +1,121 @@
+"""
+会话心跳模块
+每个会话一个后台心跳线程，定期探测会话存活和往返延迟，主动发现失效的UiAutomator2服务
+"""
+import threading
+import time
+from typing import Callable, Optional
+import requests
+from appium.webdriver.webdriver import WebDriver
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_executor_url(driver: WebDriver) -> Optional[str]:
+    """获取驱动所连接的服务器地址（兼容新旧版本Selenium）"""
+    executor = getattr(driver, 'command_executor', None)
+    client_config = getattr(executor, '_client_config', None)
+    url = getattr(client_config, 'remote_server_addr', None) or getattr(executor, '_url', None)
+    return url.rstrip('/') if url else None
+
+
+def probe_session(server_url: str, session_id: str, probe: str = 'window/rect', timeout: float = 5) -> bool:
+    """单次探测会话是否存活（不经过驱动的命令通道）"""
+    try:
+        response = requests.get(f"{server_url.rstrip('/')}/session/{session_id}/{probe}", timeout=timeout)
+        return response.status_code != 404 and response.status_code < 500
+    except requests.RequestException:
+        return False
+
+
+class SessionHeartbeat:
+    """会话心跳
+
+    使用独立的HTTP连接探测会话，不占用驱动自身的命令通道；
+    连续失败max_failures次后判定会话失效，并回调on_dead。
+    """
+
+    def __init__(self, driver: WebDriver, interval: float = 10, timeout: float = 5,
+                 max_failures: int = 2, probe: str = 'window/rect',
+                 on_dead: Callable[['SessionHeartbeat'], None] = None):
+        self.driver = driver
+        self.interval = interval
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.probe = probe
+        self.on_dead = on_dead
+        self.alive = True
+        self.latency: Optional[float] = None
+        self.last_beat: Optional[float] = None
+        self.failures = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._http = requests.Session()
+
+    @property
+    def probe_url(self) -> Optional[str]:
+        """探测地址"""
+        server_url = get_executor_url(self.driver)
+        session_id = getattr(self.driver, 'session_id', None)
+        if not server_url or not session_id:
+            return None
+        return f"{server_url}/session/{session_id}/{self.probe}"
+
+    def start(self):
+        """启动心跳线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{self.driver.session_id}",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止心跳线程"""
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.timeout + 1)
+        self._http.close()
+
+    def beat(self) -> bool:
+        """执行一次探测，返回会话是否存活"""
+        url = self.probe_url
+        if url is None:
+            return self._mark_failure("缺少会话ID或服务器地址")
+
+        start = time.time()
+        try:
+            response = self._http.get(url, timeout=self.timeout)
+            # 404表示会话已不存在，5xx通常是设备端服务崩溃
+            if response.status_code == 404 or response.status_code >= 500:
+                return self._mark_failure(f"HTTP {response.status_code}")
+        except requests.RequestException as e:
+            return self._mark_failure(str(e))
+
+        self.latency = time.time() - start
+        self.last_beat = time.time()
+        self.failures = 0
+        self.alive = True
+        return True
+
+    def _mark_failure(self, reason: str) -> bool:
+        """记录一次探测失败"""
+        self.failures += 1
+        logger.debug(f"会话心跳失败({self.failures}/{self.max_failures}): {reason}")
+        if self.failures >= self.max_failures and self.alive:
+            self.alive = False
+            logger.warning(f"会话心跳判定失效: {getattr(self.driver, 'session_id', None)} ({reason})")
+            if self.on_dead:
+                try:
+                    self.on_dead(self)
+                except Exception as e:
+                    logger.error(f"处理失效会话出错: {e}")
+        return False
+
+    def _run(self):
+        """心跳循环"""
+        while not self._stop_event.wait(self.interval):
+            self.beat()
+            if not self.alive:
+                break
@@ -0,0 +1,428 @@
+"""
+Appium会话池模块
+按能力配置缓存存活的WebDriver会话，以租借/归还的方式复用，避免每个用例重新创建会话
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from appium.webdriver.webdriver import WebDriver
+from .session_heartbeat import SessionHeartbeat
+from .apk_installer import apk_installer
+from .port_allocator import port_allocator
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 应用重置策略，按开销从低到高排列
+RESET_STRATEGIES = ('none', 'restart', 'clear_data', 'reinstall')
+
+
+class PooledSession:
+    """池化会话"""
+
+    def __init__(self, key: Hashable, driver: WebDriver):
+        self.key = key
+        self.driver = driver
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.in_use = False
+        self.lease_count = 0
+        # 后台预热任务（重置应用或新建会话），租借时等待其完成
+        self.warming: Optional[Future] = None
+        # 是否为预热得到、尚未被租借的会话
+        self.prewarmed = False
+        self.heartbeat: Optional[SessionHeartbeat] = None
+        # 心跳判定失效但仍被租借中的会话，归还时回收
+        self.dead = False
+        # 上次使用后已执行的重置级别（新会话刚启动应用，相当于restart）
+        self.reset_level = 'restart'
+
+    @property
+    def session_id(self) -> Optional[str]:
+        """会话ID"""
+        return getattr(self.driver, 'session_id', None)
+
+    def idle_seconds(self) -> float:
+        """空闲时长（秒）"""
+        return time.time() - self.last_used
+
+    def __repr__(self):
+        return f"PooledSession(key={self.key}, session_id={self.session_id}, in_use={self.in_use})"
+
+
+class SessionPool:
+    """会话池，支持租借、归还、回收三种操作"""
+
+    def __init__(self, factory: Callable[[Hashable], WebDriver], max_size: int = 2,
+                 max_idle: float = 300, reset_strategy: str = 'restart', prewarm: bool = False,
+                 heartbeat: Optional[Dict[str, Any]] = None):
+        if reset_strategy not in RESET_STRATEGIES:
+            raise ValueError(f"不支持的重置策略: {reset_strategy}")
+        self.factory = factory
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.reset_strategy = reset_strategy
+        self.prewarm_enabled = prewarm
+        # 心跳配置: interval / timeout / max_failures / probe，为None时不启用心跳
+        self.heartbeat_config = heartbeat
+        # prewarm_partial: 预热会话被租借时预热尚未完成，租借方等待了剩余部分
+        self.stats = {'prewarm_hits': 0, 'prewarm_partial': 0, 'prewarm_misses': 0, 'prewarm_wasted': 0,
+                      'prewarm_wait': 0.0}
+        self._sessions: Dict[Hashable, List[PooledSession]] = {}
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def lease(self, key: Hashable, strategy: str = None) -> PooledSession:
+        """租借会话：优先复用健康的空闲会话，否则新建
+
+        strategy为本次用例要求的隔离级别（未指定时为会话池默认重置策略），会话上次重置的级别不够时在租借时补做重置。
+        """
+        strategy = strategy or self.reset_strategy
+        self.evict_idle()
+
+        while True:
+            with self._lock:
+                session = next((s for s in self._sessions.get(key, []) if not s.in_use), None)
+                if session is None:
+                    break
+                session.in_use = True
+
+            # 等待后台预热完成，预热失败的会话直接回收
+            warmed = session.warming is None or session.warming.done()
+            if not self._wait_warming(session):
+                self.evict(session)
+                continue
+
+            # 租借前做健康检查，失效的会话直接回收
+            if not self.is_healthy(session):
+                logger.warning(f"池中会话已失效，回收: {session.session_id}")
+                self.evict(session)
+                continue
+
+            try:
+                self._ensure_reset(session, strategy)
+            except Exception as e:
+                logger.warning(f"重置应用失败，回收会话 {session.session_id}: {e}")
+                self.evict(session)
+                continue
+
+            self._record_lease(session, warmed)
+            logger.info(f"复用池中会话: {session.session_id}")
+            return session
+
+        # 新建会话不持锁，避免阻塞其他key的租借
+        driver = self.factory(key)
+        session = PooledSession(key, driver)
+        session.in_use = True
+        with self._lock:
+            self._sessions.setdefault(key, []).append(session)
+        self._start_heartbeat(session)
+        try:
+            self._ensure_reset(session, strategy)
+        except Exception as e:
+            logger.warning(f"重置应用失败，回收新建的会话 {session.session_id}: {e}")
+            self.evict(session)
+            raise
+        self._record_lease(session)
+        logger.info(f"会话池新建会话: {session.session_id}")
+        return session
+
+    def _ensure_reset(self, session: PooledSession, strategy: Optional[str]):
+        """会话上次重置的级别低于要求时同步重置"""
+        if strategy is None or RESET_STRATEGIES.index(strategy) <= RESET_STRATEGIES.index(session.reset_level):
+            return
+        self.reset_app(session.driver, strategy)
+        session.reset_level = strategy
+
+    def _wait_warming(self, session: PooledSession) -> bool:
+        """等待会话的后台预热任务，返回预热是否成功"""
+        if session.warming is None:
+            return True
+
+        start = time.time()
+        try:
+            session.warming.result()
+            return True
+        except Exception as e:
+            logger.warning(f"会话预热失败: {e}")
+            return False
+        finally:
+            self.stats['prewarm_wait'] += time.time() - start
+            session.warming = None
+
+    def _record_lease(self, session: PooledSession, warmed: bool = True):
+        """记录租借及预热命中情况（warmed为租借时预热是否已经完成，未完成只算部分命中）"""
+        session.lease_count += 1
+        session.last_used = time.time()
+        # 用例执行后应用状态不再干净
+        session.reset_level = 'none'
+        if session.prewarmed:
+            self.stats['prewarm_hits' if warmed else 'prewarm_partial'] += 1
+            session.prewarmed = False
+        elif self.prewarm_enabled:
+            self.stats['prewarm_misses'] += 1
+
+    def prewarm(self, key: Hashable) -> bool:
+        """预热：key没有空闲会话时在后台新建一个，返回是否发起了预热"""
+        with self._lock:
+            if any(not s.in_use for s in self._sessions.get(key, [])):
+                return False
+            self._spawn(key, prewarmed=True)
+        logger.info(f"后台预热新会话: {key}")
+        return True
+
+    def _spawn(self, key: Hashable, prewarmed: bool = False) -> PooledSession:
+        """在后台新建会话并加入池中"""
+        with self._lock:
+            session = PooledSession(key, None)
+            session.prewarmed = prewarmed
+            session.warming = self._get_executor().submit(self._create_into, session)
+            self._sessions.setdefault(key, []).append(session)
+        return session
+
+    def _create_into(self, session: PooledSession):
+        """后台新建会话"""
+        session.driver = self.factory(session.key)
+        session.last_used = time.time()
+        self._start_heartbeat(session)
+
+    def _start_heartbeat(self, session: PooledSession):
+        """为会话启动心跳线程"""
+        if self.heartbeat_config is None:
+            return
+        session.heartbeat = SessionHeartbeat(
+            session.driver,
+            interval=self.heartbeat_config.get('interval', 10),
+            timeout=self.heartbeat_config.get('timeout', 5),
+            max_failures=self.heartbeat_config.get('max_failures', 2),
+            probe=self.heartbeat_config.get('probe', 'window/rect'),
+            on_dead=lambda heartbeat: self._on_session_dead(session)
+        )
+        session.heartbeat.start()
+
+    def _on_session_dead(self, session: PooledSession):
+        """心跳判定会话失效：空闲会话立即回收并在后台补充新会话，租借中的会话在归还时回收"""
+        with self._lock:
+            if session.in_use:
+                session.dead = True
+                logger.warning(f"租借中的会话已失效，将在归还时回收: {session.session_id}")
+                return
+            replace = session in self._sessions.get(session.key, [])
+
+        if replace:
+            logger.warning(f"空闲会话已失效，回收并替换: {session.session_id}")
+            self.evict(session)
+            self._spawn(session.key)
+
+    def heartbeat_stats(self) -> List[Dict[str, Any]]:
+        """各会话的心跳状态"""
+        return [{
+            'session_id': session.session_id,
+            'in_use': session.in_use,
+            'alive': session.heartbeat.alive,
+            'latency': session.heartbeat.latency,
+            'last_beat': session.heartbeat.last_beat,
+        } for session in self.sessions() if session.heartbeat]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """后台预热线程池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='session-prewarm')
+        return self._executor
+
+    def release(self, session: PooledSession, reset: bool = True, strategy: str = None,
+                background: bool = False):
+        """归还会话，按重置策略恢复应用状态
+        
+        background为True时应用重置在后台线程执行（预热），下一次租借时等待其完成。
+        """
+        if session.dead:
+            logger.warning(f"归还的会话已失效，回收: {session.session_id}")
+            self.evict(session)
+            self._spawn(session.key)
+            return
+
+        # 空闲会话已达上限时直接回收，不再重置
+        with self._lock:
+            idle = [s for s in self._sessions.get(session.key, []) if not s.in_use and s is not session]
+            overflow = len(idle) >= self.max_size
+        if overflow:
+            logger.info(f"空闲会话超过上限 {self.max_size}，回收: {session.session_id}")
+            self.evict(session)
+            self.evict_idle()
+            return
+
+        strategy = strategy or self.reset_strategy
+        if reset and background:
+            with self._lock:
+                session.prewarmed = True
+                session.last_used = time.time()
+                # 后台重置失败时会话在下次租借时被回收
+                session.reset_level = strategy
+                session.warming = self._get_executor().submit(self.reset_app, session.driver, strategy)
+                session.in_use = False
+            logger.info(f"会话已归还，后台预热中: {session.session_id}")
+            self.evict_idle()
+            return
+
+        if reset:
+            try:
+                self.reset_app(session.driver, strategy)
+                session.reset_level = strategy
+            except Exception as e:
+                logger.warning(f"重置应用失败，回收会话 {session.session_id}: {e}")
+                self.evict(session)
+                return
+
+        with self._lock:
+            session.in_use = False
+            session.last_used = time.time()
+        logger.info(f"会话已归还到池: {session.session_id}")
+
+        self.evict_idle()
+
+    def evict(self, session: PooledSession):
+        """回收会话：从池中移除并退出"""
+        with self._lock:
+            sessions = self._sessions.get(session.key, [])
+            if session in sessions:
+                sessions.remove(session)
+            if not sessions:
+                self._sessions.pop(session.key, None)
+
+        # 预热中的会话等待任务结束后再退出
+        self._wait_warming(session)
+        if session.heartbeat:
+            session.heartbeat.stop()
+        if session.prewarmed:
+            self.stats['prewarm_wasted'] += 1
+            session.prewarmed = False
+        if session.driver is None:
+            return
+
+        try:
+            session.driver.quit()
+            logger.info(f"已回收会话: {session.session_id}")
+        except Exception as e:
+            logger.warning(f"回收会话时出错: {e}")
+        finally:
+            port_allocator.release(session.driver)
+
+    def evict_idle(self):
+        """回收空闲时间超过max_idle的会话"""
+        with self._lock:
+            expired = [s for sessions in self._sessions.values() for s in sessions
+                       if not s.in_use and s.warming is None and s.idle_seconds() > self.max_idle]
+        for session in expired:
+            logger.info(f"会话空闲超过 {self.max_idle}s，回收: {session.session_id}")
+            self.evict(session)
+
+    def close_all(self):
+        """回收池中所有会话"""
+        with self._lock:
+            sessions = [s for group in self._sessions.values() for s in group]
+        for session in sessions:
+            self.evict(session)
+
+    def detach_all(self) -> List[PooledSession]:
+        """移出池中所有会话但不退出（用于保留会话供下次运行复用）"""
+        with self._lock:
+            sessions = [s for group in self._sessions.values() for s in group]
+            self._sessions.clear()
+        for session in sessions:
+            self._wait_warming(session)
+            if session.heartbeat:
+                session.heartbeat.stop()
+        return [session for session in sessions if session.driver is not None]
+
+    def sessions(self) -> List[PooledSession]:
+        """获取池中所有会话"""
+        with self._lock:
+            return [s for group in self._sessions.values() for s in group]
+
+    @staticmethod
+    def is_healthy(session: PooledSession) -> bool:
+        """健康检查：心跳结果足够新时直接使用，否则同步探测"""
+        heartbeat = session.heartbeat
+        if heartbeat and heartbeat.last_beat and time.time() - heartbeat.last_beat < heartbeat.interval * 2:
+            return heartbeat.alive
+        if heartbeat and not heartbeat.alive:
+            return False
+        try:
+            session.driver.current_window_handle
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def get_app_id(driver: WebDriver) -> Optional[str]:
+        """获取被测应用标识（Android包名或iOS bundleId）"""
+        caps = getattr(driver, 'capabilities', None) or {}
+        for key in ('appPackage', 'appium:appPackage', 'bundleId', 'appium:bundleId'):
+            if caps.get(key):
+                return caps[key]
+        return None
+
+    @staticmethod
+    def is_browser_session(driver: WebDriver) -> bool:
+        """是否为web平台的浏览器会话（Appium会话的能力中带有automationName）"""
+        caps = getattr(driver, 'capabilities', None) or {}
+        return not (caps.get('automationName') or caps.get('appium:automationName'))
+
+    @staticmethod
+    def get_app_path(driver: WebDriver) -> Optional[str]:
+        """获取被测应用安装包路径"""
+        caps = getattr(driver, 'capabilities', None) or {}
+        app_path = caps.get('app') or caps.get('appium:app')
+        if not app_path:
+            # APK安装缓存生效时会话能力中没有app，按包名找回安装包
+            app_id = SessionPool.get_app_id(driver)
+            app_path = apk_installer.apk_for_package(app_id) if app_id else None
+        return app_path
+
+    @classmethod
+    def reset_app(cls, driver: WebDriver, strategy: str):
+        """重置应用状态"""
+        if strategy == 'none':
+            return
+        if cls.is_browser_session(driver):
+            cls.reset_browser(driver)
+            return
+
+        app_id = cls.get_app_id(driver)
+        if not app_id:
+            logger.debug("未配置应用标识，跳过应用重置")
+            return
+
+        if strategy == 'restart':
+            driver.terminate_app(app_id)
+        elif strategy == 'clear_data':
+            # 等价于 adb shell pm clear
+            driver.execute_script('mobile: clearApp', {'appId': app_id})
+        elif strategy == 'reinstall':
+            app_path = cls.get_app_path(driver)
+            if app_path:
+                driver.remove_app(app_id)
+                driver.install_app(app_path)
+            else:
+                logger.warning(f"未配置安装包路径，无法重装应用，改为清除数据: {app_id}")
+                driver.execute_script('mobile: clearApp', {'appId': app_id})
+        else:
+            raise ValueError(f"不支持的重置策略: {strategy}")
+
+        driver.activate_app(app_id)
+        logger.debug(f"应用已重置({strategy}): {app_id}")
+
+    @staticmethod
+    def reset_browser(driver):
+        """重置浏览器会话（web平台各重置策略相同）：清除Cookie和本地存储，回到空白页"""
+        driver.delete_all_cookies()
+        try:
+            driver.execute_script('window.localStorage.clear(); window.sessionStorage.clear();')
+        except Exception as e:
+            # about:blank等页面没有存储
+            logger.debug(f"清除浏览器存储失败: {e}")
+        driver.get('about:blank')
+        logger.debug("浏览器会话已重置")
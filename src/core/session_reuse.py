@@ -0,0 +1,142 @@
+"""
+会话复用模块
+本地调试时退出前保存会话ID和服务器地址，下次运行直接重新连接仍然存活的会话，省去冷启动
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+from appium.options.common.base import AppiumOptions
+from appium.webdriver.webdriver import WebDriver
+from ..config import config
+from .capability_profile import CapabilityProfile
+from .resource_lock import ResourceLock
+from .session_heartbeat import get_executor_url, probe_session
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AttachedWebDriver(WebDriver):
+    """连接到已有会话的WebDriver，不发起新建会话请求"""
+
+    def __init__(self, command_executor, session_id: str, capabilities: Dict[str, Any], **kwargs):
+        self._attach_session_id = session_id
+        self._attach_capabilities = capabilities
+        kwargs.setdefault('options', AppiumOptions())
+        super().__init__(command_executor, **kwargs)
+
+    def start_session(self, capabilities, browser_profile=None) -> None:
+        """直接使用已有会话"""
+        self.session_id = self._attach_session_id
+        self.caps = self._attach_capabilities
+
+
+# 等待状态文件锁的最长时间（秒）
+STATE_LOCK_TIMEOUT = 10
+
+
+class SessionStateStore:
+    """会话状态文件，记录每个能力配置对应的存活会话
+
+    并行worker和同时进行的多次运行共享同一状态文件，读取-修改-写入在跨进程锁内进行，
+    写入先写临时文件再替换，读取方不会读到写了一半的文件。
+    """
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用会话复用（配置项或环境变量REUSE_SESSION）"""
+        return bool(config.get('session_reuse.enabled', False)) or os.getenv('REUSE_SESSION') == '1'
+
+    @property
+    def idle_timeout(self) -> int:
+        """复用会话的newCommandTimeout，保证两次运行之间会话不被Appium回收"""
+        return config.get('session_reuse.idle_timeout', 900)
+
+    @property
+    def state_file(self) -> Path:
+        """状态文件路径"""
+        return Path(config.get('session_reuse.state_file', './reports/.session_state.json'))
+
+    def load(self) -> List[Dict[str, Any]]:
+        """读取状态文件"""
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _write(self, entries: List[Dict[str, Any]]):
+        """写入状态文件（先写临时文件再替换）"""
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.state_file.with_suffix('.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.state_file)
+
+    def _update(self, update: Callable[[List[Dict[str, Any]]], Any]) -> Any:
+        """在跨进程锁内读取-修改-写入状态文件，返回update的返回值；获取锁超时抛出TimeoutError"""
+        lock = ResourceLock(f"session-state-{self.state_file.name}")
+        deadline = time.time() + STATE_LOCK_TIMEOUT
+        while not lock.acquire():
+            if time.time() > deadline:
+                raise TimeoutError(f"获取会话状态文件锁超时: {self.state_file}")
+            time.sleep(0.05)
+        try:
+            entries = self.load()
+            result = update(entries)
+            self._write(entries)
+            return result
+        finally:
+            lock.release()
+
+    def save(self, sessions: List[Dict[str, Any]]):
+        """追加保存会话 [{'profile', 'driver', 'ports'}]，ports为会话占用的端口，重新连接时重新占用"""
+        new_entries = []
+        for session in sessions:
+            profile: CapabilityProfile = session['profile']
+            driver: WebDriver = session['driver']
+            new_entries.append({
+                'platform': profile.platform,
+                'profile': profile.capabilities_json,
+                'server_url': get_executor_url(driver),
+                'session_id': driver.session_id,
+                'capabilities': driver.caps,
+                'ports': session.get('ports') or {},
+                'saved_at': time.time(),
+            })
+        self._update(lambda entries: entries.extend(new_entries))
+        logger.info(f"已保存 {len(sessions)} 个会话到 {self.state_file}，下次运行将重新连接")
+
+    def saved_ports(self) -> Set[int]:
+        """已保存会话占用的端口，新建会话时不再分配"""
+        return {int(port) for entry in self.load() for port in (entry.get('ports') or {}).values()}
+
+    def claim(self, profile: CapabilityProfile) -> Optional[Dict[str, Any]]:
+        """取出一个与能力配置匹配且仍然存活的会话记录，失效的记录一并清理
+
+        记录在锁内从状态文件中移除后再探测（探测不持锁），同一会话不会被两个worker同时取出。
+        """
+        def pop_matching(entries: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            for index, entry in enumerate(entries):
+                if entry.get('profile') == profile.capabilities_json:
+                    return entries.pop(index)
+            return None
+
+        while self.load():
+            try:
+                entry = self._update(pop_matching)
+            except TimeoutError as e:
+                logger.warning(f"{e}，不重新连接已保存的会话")
+                return None
+            if entry is None:
+                return None
+            if probe_session(entry['server_url'], entry['session_id']):
+                return entry
+            logger.info(f"保存的会话已失效: {entry['session_id']}")
+        return None
+
+
+# 全局会话状态实例
+session_store = SessionStateStore()
@@ -0,0 +1,114 @@
+"""
+会话清理模块
+并行退出多个驱动，每个驱动限时；超时未退出的会话通过服务器DELETE接口强制删除，并记录耗时
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import requests
+from appium.webdriver.webdriver import WebDriver
+from .session_heartbeat import get_executor_url
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 清理结果状态
+STATUS_QUIT = 'quit'        # 正常退出
+STATUS_ERROR = 'error'      # quit()在时限内返回但抛出异常
+STATUS_FORCED = 'forced'    # 超时，已通过DELETE强制删除
+STATUS_FAILED = 'failed'    # 超时且强制删除失败
+
+
+@dataclass
+class TeardownResult:
+    """单个驱动的清理结果"""
+
+    name: str
+    session_id: Optional[str]
+    seconds: float
+    status: str
+    error: Optional[str] = None
+
+    def is_slow(self, slow_threshold: float) -> bool:
+        """是否属于释放缓慢的会话"""
+        return self.status in (STATUS_FORCED, STATUS_FAILED) or self.seconds >= slow_threshold
+
+
+def force_delete_session(driver: WebDriver, timeout: float = 5) -> bool:
+    """绕过驱动命令通道，直接请求服务器删除会话"""
+    server_url = get_executor_url(driver)
+    session_id = getattr(driver, 'session_id', None)
+    if not server_url or not session_id:
+        return False
+    try:
+        response = requests.delete(f"{server_url}/session/{session_id}", timeout=timeout)
+        # 404表示会话已不存在，同样视为删除成功
+        return response.status_code < 500
+    except requests.RequestException as e:
+        logger.warning(f"强制删除会话失败: {session_id} ({e})")
+        return False
+
+
+def quit_drivers(drivers: Dict[str, WebDriver], timeout: float = 20, force_delete: bool = True,
+                 force_timeout: float = 5) -> List[TeardownResult]:
+    """并行退出驱动，整体耗时不超过 timeout + force_timeout
+
+    每个驱动在独立的守护线程中quit()，卡住的线程不会阻塞进程退出。
+    """
+    if not drivers:
+        return []
+
+    start = time.time()
+    finished: Dict[str, TeardownResult] = {}
+    lock = threading.Lock()
+
+    def _quit(name: str, driver: WebDriver, session_id: Optional[str]):
+        error = None
+        try:
+            driver.quit()
+        except Exception as e:
+            error = str(e)
+        with lock:
+            finished[name] = TeardownResult(name, session_id, time.time() - start,
+                                            STATUS_ERROR if error else STATUS_QUIT, error)
+
+    threads = {}
+    for name, driver in drivers.items():
+        session_id = getattr(driver, 'session_id', None)
+        thread = threading.Thread(target=_quit, args=(name, driver, session_id),
+                                  name=f"quit-{name}", daemon=True)
+        thread.start()
+        threads[name] = (thread, session_id)
+
+    deadline = start + timeout
+    for thread, _ in threads.values():
+        thread.join(max(0.0, deadline - time.time()))
+
+    results = []
+    for name, (thread, session_id) in threads.items():
+        with lock:
+            result = finished.get(name)
+        if result is None:
+            # 超时：强制删除会话，不再等待quit线程
+            logger.warning(f"驱动 {name} 超过 {timeout}s 未退出，强制删除会话: {session_id}")
+            deleted = force_delete and force_delete_session(drivers[name], force_timeout)
+            result = TeardownResult(name, session_id, time.time() - start,
+                                    STATUS_FORCED if deleted else STATUS_FAILED,
+                                    f"quit超时({timeout}s)")
+        elif result.error:
+            logger.warning(f"退出驱动时出错: {name} ({result.error})")
+        results.append(result)
+    return results
+
+
+def format_teardown_report(results: List[TeardownResult], slow_threshold: float = 5) -> List[str]:
+    """生成释放缓慢会话列表"""
+    slow = sorted((r for r in results if r.is_slow(slow_threshold)), key=lambda r: r.seconds, reverse=True)
+    if not slow:
+        return []
+    lines = [f"{'驱动':<24}{'会话ID':<40}{'耗时(s)':>10}  状态"]
+    for result in slow:
+        lines.append(f"{result.name:<24}{str(result.session_id):<40}{result.seconds:>10.2f}  {result.status}")
+    return lines
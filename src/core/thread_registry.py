@@ -0,0 +1,40 @@
+"""
+线程作用域注册表模块
+线程并行执行用例时，驱动、页面实例等注册表按线程隔离，同时保留所有线程的数据以便统一清理
+"""
+import threading
+from typing import Dict, Generic, List, Optional, Tuple, TypeVar
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+
+class ThreadScopedRegistry(Generic[K, V]):
+    """线程作用域注册表，current为当前线程的字典"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._registries: List[Dict[K, V]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> Dict[K, V]:
+        """当前线程的字典（首次访问时创建）"""
+        registry: Optional[Dict[K, V]] = getattr(self._local, 'registry', None)
+        if registry is None:
+            registry = {}
+            self._local.registry = registry
+            with self._lock:
+                self._registries.append(registry)
+        return registry
+
+    def all_items(self) -> List[Tuple[K, V]]:
+        """所有线程的条目"""
+        with self._lock:
+            return [item for registry in self._registries for item in list(registry.items())]
+
+    def clear_all(self):
+        """清空所有线程的字典"""
+        with self._lock:
+            for registry in self._registries:
+                registry.clear()
@@ -1,7 +1,9 @@
 from .base_page import BasePage, ElementLocators
 from .page_factory import PageFactory, PageNavigator, page_register
+from .async_page import AsyncPage
 
 __all__ = [
     'BasePage', 'ElementLocators',
-    'PageFactory', 'PageNavigator', 'page_register'
+    'PageFactory', 'PageNavigator', 'page_register',
+    'AsyncPage'
 ]
\ No newline at end of file
@@ -93,16 +93,19 @@ class LoginPage(BasePage):
                 self.click(self.PHONE_INPUT_PLACEHOLDER)
             
             # 输入手机号
-            if self.is_element_visible(self.PHONE_INPUT, timeout=3):
-                self.send_keys(self.PHONE_INPUT, phone_number, clear_first=True)
-            else:
-                self.send_keys(self.PHONE_INPUT_ALT, phone_number, clear_first=True)
-            
+            self._input(self.PHONE_INPUT, self.PHONE_INPUT_ALT, phone_number)
             logger.info(f"输入手机号: {phone_number}")
         except Exception as e:
             logger.error(f"输入手机号失败: {e}")
             raise
     
+    def _input(self, locator: Tuple[str, str], fallback: Tuple[str, str], text: str):
+        """向输入框输入文本，主定位器不可见时使用备用定位器"""
+        if self.is_element_visible(locator, timeout=3):
+            self.send_keys(locator, text, clear_first=True)
+        else:
+            self.send_keys(fallback, text, clear_first=True)
+    
     @log_step("点击获取验证码")
     def click_get_verification_code(self):
         """点击获取验证码按钮"""
@@ -125,11 +128,7 @@ class LoginPage(BasePage):
                 self.click(self.VERIFICATION_CODE_PLACEHOLDER)
             
             # 输入验证码
-            if self.is_element_visible(self.VERIFICATION_CODE_INPUT, timeout=3):
-                self.send_keys(self.VERIFICATION_CODE_INPUT, code, clear_first=True)
-            else:
-                self.send_keys(self.VERIFICATION_CODE_INPUT_ALT, code, clear_first=True)
-            
+            self._input(self.VERIFICATION_CODE_INPUT, self.VERIFICATION_CODE_INPUT_ALT, code)
             logger.info(f"输入验证码: ****")
         except Exception as e:
             logger.error(f"输入验证码失败: {e}")
@@ -176,20 +175,22 @@ class LoginPage(BasePage):
     
     @log_step("执行验证码登录")
     def login_with_verification_code(self, phone_number: str, verification_code: str, agree_terms: bool = True):
-        """执行完整的验证码登录流程"""
+        """执行完整的验证码登录流程，连续的点击合并为一次手势请求"""
         self.wait_for_page_load()
         
-        if agree_terms:
-            self.agree_to_terms()
-        
-        self.enter_phone_number(phone_number)
-        self.click_get_verification_code()
+        # 勾选协议并激活手机号输入框
+        batch = self.actions()
+        if agree_terms and self.is_element_present(self.AGREEMENT_CHECKBOX, timeout=1):
+            batch.tap(self.AGREEMENT_CHECKBOX).pause(100)
+        batch.tap(self.PHONE_INPUT_PLACEHOLDER).perform()
+        self._input(self.PHONE_INPUT, self.PHONE_INPUT_ALT, phone_number)
         
-        # 等待验证码发送成功
-        time.sleep(2)
+        # 获取验证码，在设备端停顿等待验证码发送成功后激活验证码输入框
+        (self.actions().tap(self.GET_VERIFICATION_CODE_BUTTON).pause(2000)
+         .tap(self.VERIFICATION_CODE_PLACEHOLDER).perform())
+        self._input(self.VERIFICATION_CODE_INPUT, self.VERIFICATION_CODE_INPUT_ALT, verification_code)
         
-        self.enter_verification_code(verification_code)
-        self.click_login_button()
+        self.actions().tap(self.LOGIN_BUTTON).perform()
         
         logger.info(f"执行验证码登录: {phone_number}")
     
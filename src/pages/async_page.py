@@ -0,0 +1,123 @@
+"""
+异步页面模块
+BasePage常用操作的异步版本，多台设备上的页面操作可以在同一个事件循环中并发执行
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+from ..config import config
+from ..core.async_driver import AsyncDriverClient, AsyncElement
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class AsyncPage:
+    """异步页面操作
+
+    与同步页面共用同一个会话，定位器沿用页面类上定义的定位器。等待通过轮询实现，
+    轮询间隔内让出事件循环，多台设备的等待相互重叠而不是累加。
+
+    示例:
+        async with sender_page.aio() as sender, receiver_page.aio() as receiver:
+            await sender.send_keys(ChatPage.INPUT, "你好")
+            await asyncio.gather(sender.click(ChatPage.SEND_BUTTON),
+                                 receiver.wait_for_element_visible(ChatPage.LAST_MESSAGE))
+    """
+
+    def __init__(self, client: AsyncDriverClient, timeout: float = None, poll_interval: float = None):
+        self.client = client
+        self.timeout = timeout or config.get_test_config().get('default_timeout', 10)
+        self.poll_interval = poll_interval if poll_interval is not None else 0.5
+
+    async def _poll(self, probe: Callable[[], Awaitable[Optional[T]]], timeout: float = None) -> Optional[T]:
+        """轮询直到probe返回非None或超时，超时返回None"""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while True:
+            try:
+                result = await probe()
+                if result is not None:
+                    return result
+            except (NoSuchElementException, StaleElementReferenceException):
+                pass
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    # 元素定位方法
+    async def find_element(self, locator: Tuple[str, str], timeout: float = None) -> AsyncElement:
+        """查找单个元素"""
+        element = await self._poll(lambda: self.client.find_element(*locator), timeout)
+        if element is None:
+            logger.error(f"查找元素超时: {locator}")
+            raise NoSuchElementException(f"元素定位超时: {locator}")
+        logger.debug(f"找到元素: {locator}")
+        return element
+
+    async def find_elements(self, locator: Tuple[str, str], timeout: float = None) -> List[AsyncElement]:
+        """查找多个元素"""
+        async def probe():
+            return await self.client.find_elements(*locator) or None
+
+        elements = await self._poll(probe, timeout)
+        if elements is None:
+            logger.warning(f"查找元素超时: {locator}")
+            return []
+        logger.debug(f"找到 {len(elements)} 个元素: {locator}")
+        return elements
+
+    async def wait_for_element_visible(self, locator: Tuple[str, str], timeout: float = None) -> AsyncElement:
+        """等待元素可见"""
+        async def probe():
+            element = await self.client.find_element(*locator)
+            return element if await element.is_displayed() else None
+
+        element = await self._poll(probe, timeout)
+        if element is None:
+            logger.error(f"等待元素可见超时: {locator}")
+            raise TimeoutException(f"元素可见超时: {locator}")
+        logger.debug(f"元素可见: {locator}")
+        return element
+
+    async def is_element_present(self, locator: Tuple[str, str], timeout: float = 3) -> bool:
+        """检查元素是否存在"""
+        return await self._poll(lambda: self.client.find_element(*locator), timeout) is not None
+
+    # 基础操作方法
+    async def click(self, locator: Tuple[str, str], timeout: float = None):
+        """点击元素"""
+        element = await self.wait_for_element_visible(locator, timeout)
+        await element.click()
+        logger.info(f"点击元素: {locator}")
+
+    async def send_keys(self, locator: Tuple[str, str], text: str, clear_first: bool = True, timeout: float = None):
+        """输入文本"""
+        element = await self.wait_for_element_visible(locator, timeout)
+        if clear_first:
+            await element.clear()
+        await element.send_keys(text)
+        logger.info(f"输入文本 '{text}' 到元素: {locator}")
+
+    async def get_text(self, locator: Tuple[str, str], timeout: float = None) -> str:
+        """获取元素文本"""
+        element = await self.wait_for_element_visible(locator, timeout)
+        text = await element.text()
+        logger.debug(f"获取元素文本 '{text}': {locator}")
+        return text
+
+    async def page_source(self) -> str:
+        """获取页面源码"""
+        return await self.client.page_source()
+
+    async def close(self):
+        """关闭HTTP连接（会话由同步驱动管理）"""
+        await self.client.quit()
+
+    async def __aenter__(self) -> 'AsyncPage':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
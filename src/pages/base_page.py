@@ -3,9 +3,10 @@
 提供页面对象模型的基础功能
 """
 import time
-from typing import List, Tuple, Optional, Union
+from typing import Any, Dict, List, Tuple, Optional, Union, TYPE_CHECKING
 from appium.webdriver.webdriver import WebDriver
 from appium.webdriver.common.appiumby import AppiumBy
+from selenium.webdriver.remote.command import Command
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.remote.webelement import WebElement
@@ -14,6 +15,10 @@ from ..config import config
 from ..core import driver_manager
 import logging
 
+if TYPE_CHECKING:
+    # async_page（async_driver需要aiohttp）只在类型检查时导入，运行时在aio()中导入
+    from .async_page import AsyncPage
+
 
 logger = logging.getLogger(__name__)
 
@@ -22,12 +27,15 @@ class BasePage:
     """基础页面类"""
     
     def __init__(self, driver: WebDriver = None):
-        self.driver = driver or driver_manager.get_driver()
-        if not self.driver:
+        # 延迟驱动未创建会话时为False，因此这里只判断是否为None
+        self.driver = driver if driver is not None else driver_manager.get_driver()
+        if self.driver is None:
             raise RuntimeError("未找到可用的WebDriver实例")
         
         self.wait = WebDriverWait(self.driver, config.get_test_config().get('default_timeout', 10))
         self.timeout = config.get_test_config().get('default_timeout', 10)
+        # 元素坐标缓存 {locator: rect}，点击、手势和返回后失效
+        self._bounds_cache: Dict[Tuple[str, str], Dict[str, int]] = {}
     
     # 元素定位方法
     def find_element(self, locator: Tuple[str, str], timeout: int = None) -> WebElement:
@@ -108,6 +116,8 @@ class BasePage:
         """点击元素"""
         element = self.wait_for_element_clickable(locator, timeout)
         element.click()
+        # 点击可能引起页面跳转，坐标缓存失效
+        self.clear_bounds_cache()
         logger.info(f"点击元素: {locator}")
     
     def send_keys(self, locator: Tuple[str, str], text: str, clear_first: bool = True, timeout: int = None):
@@ -139,40 +149,57 @@ class BasePage:
         logger.info(f"清空元素文本: {locator}")
     
     # 滑动和手势操作
+    def actions(self) -> 'ActionBatch':
+        """创建手势批处理，多个点击、长按、滑动合并为一次W3C actions请求"""
+        return ActionBatch(self)
+
+    def aio(self) -> 'AsyncPage':
+        """创建异步页面操作（与当前页面共用会话），用于在一个事件循环中并发操作多台设备"""
+        from .async_page import AsyncPage
+        from ..core.async_driver import AsyncDriverClient
+        return AsyncPage(AsyncDriverClient.from_driver(self.driver), self.timeout)
+
+    def get_element_bounds(self, locator: Tuple[str, str], timeout: int = None) -> Dict[str, int]:
+        """获取元素坐标（带缓存），返回 {'x', 'y', 'width', 'height'}"""
+        if locator not in self._bounds_cache:
+            element = self.find_element(locator, timeout)
+            self._bounds_cache[locator] = element.rect
+        return self._bounds_cache[locator]
+    
+    def get_element_center(self, locator: Tuple[str, str], timeout: int = None) -> Tuple[int, int]:
+        """获取元素中心点坐标（带缓存）"""
+        rect = self.get_element_bounds(locator, timeout)
+        return rect['x'] + rect['width'] // 2, rect['y'] + rect['height'] // 2
+    
+    def clear_bounds_cache(self):
+        """清空元素坐标缓存（点击、手势、返回后自动调用；通过其他方式改变页面时手动调用）"""
+        self._bounds_cache.clear()
+    
+    def _swipe(self, start_ratio: Tuple[float, float], end_ratio: Tuple[float, float], duration: int):
+        """按屏幕比例滑动"""
+        size = self.driver.get_window_size()
+        start = (int(size['width'] * start_ratio[0]), int(size['height'] * start_ratio[1]))
+        end = (int(size['width'] * end_ratio[0]), int(size['height'] * end_ratio[1]))
+        self.actions().swipe(start, end, duration).perform()
+    
     def swipe_up(self, duration: int = 1000):
         """向上滑动"""
-        size = self.driver.get_window_size()
-        start_x = size['width'] // 2
-        start_y = size['height'] * 0.8
-        end_y = size['height'] * 0.2
-        self.driver.swipe(start_x, start_y, start_x, end_y, duration)
+        self._swipe((0.5, 0.8), (0.5, 0.2), duration)
         logger.info("执行向上滑动")
     
     def swipe_down(self, duration: int = 1000):
         """向下滑动"""
-        size = self.driver.get_window_size()
-        start_x = size['width'] // 2
-        start_y = size['height'] * 0.2
-        end_y = size['height'] * 0.8
-        self.driver.swipe(start_x, start_y, start_x, end_y, duration)
+        self._swipe((0.5, 0.2), (0.5, 0.8), duration)
         logger.info("执行向下滑动")
     
     def swipe_left(self, duration: int = 1000):
         """向左滑动"""
-        size = self.driver.get_window_size()
-        start_x = size['width'] * 0.8
-        start_y = size['height'] // 2
-        end_x = size['width'] * 0.2
-        self.driver.swipe(start_x, start_y, end_x, start_y, duration)
+        self._swipe((0.8, 0.5), (0.2, 0.5), duration)
         logger.info("执行向左滑动")
     
     def swipe_right(self, duration: int = 1000):
         """向右滑动"""
-        size = self.driver.get_window_size()
-        start_x = size['width'] * 0.2
-        start_y = size['height'] // 2
-        end_x = size['width'] * 0.8
-        self.driver.swipe(start_x, start_y, end_x, start_y, duration)
+        self._swipe((0.2, 0.5), (0.8, 0.5), duration)
         logger.info("执行向右滑动")
     
     def scroll_to_element(self, locator: Tuple[str, str], max_scrolls: int = 10, direction: str = 'up') -> WebElement:
@@ -232,6 +259,7 @@ class BasePage:
     def go_back(self):
         """返回上一页"""
         self.driver.back()
+        self.clear_bounds_cache()
         logger.info("执行返回操作")
     
     def hide_keyboard(self):
@@ -266,6 +294,81 @@ class BasePage:
         return filepath
 
 
+class ActionBatch:
+    """手势批处理
+
+    将一系列点击、长按、滑动和停顿编译为一个W3C actions请求，
+    目标可以是坐标 (x, y) 或元素定位器，定位器坐标取自页面的元素坐标缓存；
+    执行后点击或滑动都可能改变页面，坐标缓存随之清空。
+
+    示例:
+        page.actions().tap(LoginPage.AGREEMENT_CHECKBOX).pause(200).tap((300, 500)).perform()
+    """
+    
+    POINTER_ID = 'finger'
+    
+    def __init__(self, page: BasePage):
+        self.page = page
+        self._steps: List[Dict[str, Any]] = []
+    
+    def _resolve(self, target: Union[Tuple[int, int], Tuple[str, str]]) -> Tuple[int, int]:
+        """解析目标坐标"""
+        if isinstance(target[0], str):
+            return self.page.get_element_center(target)
+        return int(target[0]), int(target[1])
+    
+    def _move(self, point: Tuple[int, int], duration: int = 0):
+        self._steps.append({'type': 'pointerMove', 'duration': duration, 'origin': 'viewport',
+                            'x': point[0], 'y': point[1]})
+    
+    def _press(self, hold: int):
+        self._steps.append({'type': 'pointerDown', 'button': 0})
+        if hold:
+            self._steps.append({'type': 'pause', 'duration': hold})
+        self._steps.append({'type': 'pointerUp', 'button': 0})
+    
+    def tap(self, target, duration: int = 50) -> 'ActionBatch':
+        """点击"""
+        self._move(self._resolve(target))
+        self._press(duration)
+        return self
+    
+    def long_press(self, target, duration: int = 1000) -> 'ActionBatch':
+        """长按"""
+        return self.tap(target, duration)
+    
+    def swipe(self, start, end, duration: int = 800) -> 'ActionBatch':
+        """从start滑动到end"""
+        self._move(self._resolve(start))
+        self._steps.append({'type': 'pointerDown', 'button': 0})
+        self._move(self._resolve(end), duration)
+        self._steps.append({'type': 'pointerUp', 'button': 0})
+        return self
+    
+    def pause(self, duration: int) -> 'ActionBatch':
+        """停顿（毫秒）"""
+        self._steps.append({'type': 'pause', 'duration': duration})
+        return self
+    
+    def to_payload(self) -> Dict[str, Any]:
+        """生成W3C actions请求体"""
+        return {'actions': [{
+            'type': 'pointer',
+            'id': self.POINTER_ID,
+            'parameters': {'pointerType': 'touch'},
+            'actions': self._steps,
+        }]}
+    
+    def perform(self):
+        """一次请求执行全部手势"""
+        if not self._steps:
+            return
+        self.page.driver.execute(Command.W3C_ACTIONS, self.to_payload())
+        logger.debug(f"执行手势批处理: {len(self._steps)} 步")
+        self._steps = []
+        # 滑动会移动页面，点击可能引起跳转，坐标缓存失效
+        self.page.clear_bounds_cache()
+
 
 class ElementLocators:
     """元素定位器集合"""
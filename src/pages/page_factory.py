@@ -6,6 +6,7 @@ from typing import Type, Dict, Any
 from appium.webdriver.webdriver import WebDriver
 from .base_page import BasePage
 from ..core import driver_manager
+from ..core.thread_registry import ThreadScopedRegistry
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,7 +16,8 @@ class PageFactory:
     """页面工厂类"""
     
     _page_registry: Dict[str, Type[BasePage]] = {}
-    _page_instances: Dict[str, BasePage] = {}
+    # 页面实例缓存按线程隔离，线程并行执行时各线程的页面绑定各自的驱动
+    _page_instances: ThreadScopedRegistry[str, BasePage] = ThreadScopedRegistry()
     
     @classmethod
     def register_page(cls, page_name: str, page_class: Type[BasePage]):
@@ -30,13 +32,13 @@ class PageFactory:
             raise ValueError(f"未注册的页面: {page_name}")
         
         page_class = cls._page_registry[page_name]
-        driver = driver or driver_manager.get_driver()
+        driver = driver if driver is not None else driver_manager.get_driver()
         
-        if not driver:
+        if driver is None:
             raise RuntimeError("未找到可用的WebDriver实例")
         
         page_instance = page_class(driver, **kwargs)
-        cls._page_instances[page_name] = page_instance
+        cls._page_instances.current[page_name] = page_instance
         
         logger.info(f"创建页面实例: {page_name}")
         return page_instance
@@ -44,16 +46,16 @@ class PageFactory:
     @classmethod
     def get_page(cls, page_name: str) -> BasePage:
         """获取页面实例"""
-        if page_name in cls._page_instances:
-            return cls._page_instances[page_name]
+        if page_name in cls._page_instances.current:
+            return cls._page_instances.current[page_name]
         
         # 如果实例不存在，尝试创建
         return cls.create_page(page_name)
     
     @classmethod
     def clear_page_instances(cls):
-        """清空页面实例缓存"""
-        cls._page_instances.clear()
+        """清空当前线程的页面实例缓存"""
+        cls._page_instances.current.clear()
         logger.info("已清空页面实例缓存")
     
     @classmethod
@@ -74,7 +76,7 @@ class PageNavigator:
     """页面导航器"""
     
     def __init__(self, driver: WebDriver = None):
-        self.driver = driver or driver_manager.get_driver()
+        self.driver = driver if driver is not None else driver_manager.get_driver()
         self.current_page: BasePage = None
         self.page_stack: list = []
     
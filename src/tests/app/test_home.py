@@ -12,6 +12,7 @@ from ...utils import log_step
 
 @allure.epic("主要功能")
 @allure.feature("主页功能")
+@pytest.mark.isolation("restart")
 class TestHomePage(AndroidTest):
     """主页功能测试类"""
     
@@ -13,6 +13,7 @@ logger = get_logger(__name__)
 
 @allure.epic("用户管理")
 @allure.feature("登录功能")
+@pytest.mark.isolation("restart")
 class TestLogin(AndroidTest):
     """登录功能测试类"""
     
@@ -4,8 +4,10 @@
 """
 import pytest
 import allure
+from typing import Callable
 from appium.webdriver.webdriver import WebDriver
 from src.core import driver_manager, appium_server_manager, DriverFactory
+from src.core.lazy_driver import LazyDriver
 from src.config import config, env_manager
 from src.utils import get_logger, take_failure_screenshot, ScreenshotDecorator
 from src.pages.page_factory import PageFactory, PageNavigator
@@ -16,6 +18,7 @@ logger = get_logger(__name__)
 class BaseTest:
     """测试基类"""
     
+    platform: str = 'android'
     driver: WebDriver = None
     page_navigator: PageNavigator = None
     
@@ -24,9 +27,9 @@ class BaseTest:
         """类级别设置"""
         logger.info(f"开始执行测试类: {cls.__name__}")
         
-        # 确保Appium服务器运行
-        if not appium_server_manager.ensure_server_running():
-            pytest.skip("Appium服务器启动失败")
+        # 确保Appium服务器（web平台为WebDriver服务）运行
+        if not appium_server_manager.ensure_server_running(cls.platform):
+            pytest.skip("Appium服务器启动失败" if cls.platform != 'web' else "WebDriver服务不可用")
     
     def setup_method(self, method):
         """方法级别设置"""
@@ -34,7 +37,7 @@ class BaseTest:
         
         # 创建WebDriver实例
         try:
-            self.driver = DriverFactory.create_android_driver()
+            self.driver = self._acquire_driver()
             self.page_navigator = PageNavigator(self.driver)
             
             # 设置全局截图管理器的驱动实例
@@ -46,6 +49,34 @@ class BaseTest:
             logger.error(f"WebDriver创建失败: {e}")
             pytest.fail(f"无法创建WebDriver: {e}")
     
+    def _acquire_driver(self) -> WebDriver:
+        """获取驱动：延迟创建 / 从会话池租借 / 直接创建"""
+        if config.get_test_config().get('lazy_driver', False):
+            driver = driver_manager.get_lazy_driver(self.platform)
+            # 会话真正创建后才为下一个用例预热，跳过的用例不会触发预热
+            if driver_manager.pool_enabled:
+                driver.on_start(lambda _: driver_manager.prewarm_next())
+            return driver
+        
+        if driver_manager.pool_enabled:
+            driver = driver_manager.lease_driver(self.platform)
+            # 当前用例执行期间为下一个用例预热会话
+            driver_manager.prewarm_next()
+            return driver
+        
+        if self.platform == 'ios':
+            return DriverFactory.create_ios_driver()
+        if self.platform == 'web':
+            return DriverFactory.create_web_driver()
+        return DriverFactory.create_android_driver()
+    
+    def on_driver_start(self, hook: Callable[[WebDriver], None]):
+        """会话创建后执行的初始化（延迟驱动在首次使用时执行，否则立即执行）"""
+        if isinstance(self.driver, LazyDriver):
+            self.driver.on_start(hook)
+        elif self.driver is not None:
+            hook(self.driver)
+    
     def teardown_method(self, method):
         """方法级别清理"""
         logger.info(f"结束执行测试方法: {method.__name__}")
@@ -53,21 +84,21 @@ class BaseTest:
         # 清理页面实例缓存
         PageFactory.clear_page_instances()
         
-        # 退出WebDriver
-        if self.driver:
+        # 归还WebDriver（非池化驱动直接退出，未创建会话的延迟驱动直接注销）
+        if self.driver is not None:
             try:
-                driver_manager.quit_driver()
-                logger.info("WebDriver已退出")
+                driver_manager.release_driver()
+                logger.info("WebDriver已释放")
             except Exception as e:
-                logger.warning(f"退出WebDriver时出错: {e}")
+                logger.warning(f"释放WebDriver时出错: {e}")
     
     @classmethod
     def teardown_class(cls):
         """类级别清理"""
         logger.info(f"结束执行测试类: {cls.__name__}")
         
-        # 清理所有驱动
-        driver_manager.quit_all_drivers()
+        # 清理所有驱动（池化会话归还到池中，由atexit统一回收）
+        driver_manager.release_all_drivers()
     
     def take_screenshot(self, description: str = None):
         """截图"""
@@ -110,30 +141,36 @@ class AndroidTest(BaseTest):
         """Android特定设置"""
         super().setup_method(method)
         
-        # Android特定配置
-        if self.driver:
-            # 设置隐式等待
-            self.driver.implicitly_wait(config.get_test_config().get('implicit_wait', 5))
-            
-            # 启用Unicode键盘（如果配置了）
-            device_config = config.get_device_config('android')
-            if device_config.get('unicodeKeyboard'):
-                try:
-                    self.driver.execute_script('mobile: shell', {
-                        'command': 'settings put secure default_input_method io.appium.settings/.UnicodeIME'
-                    })
-                except Exception as e:
-                    logger.debug(f"设置Unicode键盘失败: {e}")
+        # Android特定配置（延迟驱动在会话创建后执行）
+        self.on_driver_start(self._configure_android)
+    
+    @staticmethod
+    def _configure_android(driver: WebDriver):
+        """Android会话初始化"""
+        # 设置隐式等待
+        driver.implicitly_wait(config.get_test_config().get('implicit_wait', 5))
+        
+        # 启用Unicode键盘（如果配置了）
+        device_config = config.get_device_config('android')
+        if device_config.get('unicodeKeyboard'):
+            try:
+                driver.execute_script('mobile: shell', {
+                    'command': 'settings put secure default_input_method io.appium.settings/.UnicodeIME'
+                })
+            except Exception as e:
+                logger.debug(f"设置Unicode键盘失败: {e}")
 
 
 class IOSTest(BaseTest):
     """iOS测试基类"""
     
+    platform: str = 'ios'
+    
     def setup_method(self, method):
         """iOS特定设置"""
         # 创建iOS驱动
         try:
-            self.driver = DriverFactory.create_ios_driver()
+            self.driver = self._acquire_driver()
             self.page_navigator = PageNavigator(self.driver)
             logger.info("iOS WebDriver创建成功")
         except Exception as e:
@@ -141,6 +178,12 @@ class IOSTest(BaseTest):
             pytest.skip(f"无法创建iOS WebDriver: {e}")
 
 
+class WebTest(BaseTest):
+    """Web测试基类（Selenium无头浏览器，与移动端共用会话池、租借和命令统计）"""
+    
+    platform: str = 'web'
+
+
 # Pytest fixtures
 @pytest.fixture(scope="session")
 def appium_server():
@@ -171,6 +214,16 @@ def ios_driver():
         driver_manager.quit_driver()
 
 
+@pytest.fixture(scope="function")
+def web_driver():
+    """Web驱动fixture"""
+    if not appium_server_manager.ensure_server_running('web'):
+        pytest.skip("WebDriver服务不可用")
+    driver = DriverFactory.create_web_driver()
+    yield driver
+    driver_manager.quit_driver()
+
+
 @pytest.fixture(scope="function")
 def page_navigator_fixture(android_driver):
     """页面导航器fixture"""
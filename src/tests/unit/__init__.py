@@ -0,0 +1,2 @@
+# 单元测试模块
+# 不依赖设备和Appium服务器的纯逻辑测试
@@ -0,0 +1,84 @@
+"""
+手势批处理单元测试
+用记录请求的桩驱动验证手势合并为一次请求，以及执行后元素坐标缓存失效
+"""
+from selenium.webdriver.remote.command import Command
+from src.pages.base_page import BasePage
+
+
+class StubElement:
+    def __init__(self, driver, locator):
+        self.driver = driver
+        self.locator = locator
+
+    @property
+    def rect(self):
+        self.driver.rect_calls += 1
+        x = self.driver.offset
+        return {'x': x, 'y': 100, 'width': 20, 'height': 10}
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        self.driver.sent.append('click')
+
+
+class StubDriver:
+    """记录命令，元素位置由offset决定（模拟页面跳转后位置变化）"""
+
+    def __init__(self):
+        self.sent = []
+        self.offset = 0
+        self.rect_calls = 0
+
+    def find_element(self, by, value):
+        return StubElement(self, (by, value))
+
+    def execute(self, command, params=None):
+        self.sent.append((command, params))
+        return {'value': None}
+
+
+LOCATOR = ('id', 'login')
+
+
+def taps(payload):
+    return [(step['x'], step['y']) for step in payload['actions'][0]['actions'] if step['type'] == 'pointerMove']
+
+
+class TestActionBatch:
+    """手势批处理"""
+
+    def test_steps_sent_as_one_request(self):
+        driver = StubDriver()
+        page = BasePage(driver)
+        page.actions().tap(LOCATOR).pause(100).tap((5, 6)).perform()
+        assert len(driver.sent) == 1 and driver.sent[0][0] == Command.W3C_ACTIONS
+        assert taps(driver.sent[0][1]) == [(10, 105), (5, 6)]
+
+    def test_tap_invalidates_cached_bounds(self):
+        driver = StubDriver()
+        page = BasePage(driver)
+        page.actions().tap(LOCATOR).perform()
+        # 点击后页面跳转，同一定位器的元素位置变化
+        driver.offset = 200
+        page.actions().tap(LOCATOR).perform()
+        assert taps(driver.sent[1][1]) == [(210, 105)]
+
+    def test_bounds_cached_within_batch(self):
+        driver = StubDriver()
+        page = BasePage(driver)
+        page.actions().tap(LOCATOR).tap(LOCATOR).perform()
+        assert driver.rect_calls == 1
+
+    def test_click_invalidates_cached_bounds(self):
+        driver = StubDriver()
+        page = BasePage(driver)
+        page.get_element_center(LOCATOR)
+        page.click(LOCATOR)
+        driver.offset = 200
+        assert page.get_element_center(LOCATOR) == (210, 105)
@@ -0,0 +1,97 @@
+"""
+命令录制回放单元测试
+录制桩请求后保存、重新加载并回放，验证响应一致、大响应去重和统计口径
+"""
+import pytest
+from src.core.command_cassette import (BLOB_MIN_SIZE, Cassette, CassetteMismatchError, CassetteRecorder,
+                                       CassetteReplayer, format_replay_summary)
+
+
+class StubDevice:
+    """按命令返回固定响应的桩设备"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, command, params):
+        self.calls += 1
+        if command == 'getPageSource':
+            return {'status': 0, 'value': '<hierarchy>' + 'x' * BLOB_MIN_SIZE + '</hierarchy>'}
+        return {'status': 0, 'value': f"{command}-{self.calls}"}
+
+
+def record(path):
+    recorder = CassetteRecorder()
+    device = StubDevice()
+    responses = [
+        recorder('findElement', {'sessionId': 'a', 'using': 'id', 'value': 'login'}, device),
+        recorder('findElement', {'sessionId': 'a', 'using': 'id', 'value': 'login'}, device),
+        recorder('getPageSource', {'sessionId': 'a'}, device),
+        recorder('getPageSource', {'sessionId': 'a'}, device),
+    ]
+    recorder.save(path)
+    return responses
+
+
+def no_device(command, params):
+    raise AssertionError('回放时不应发送请求')
+
+
+class TestCassetteRoundTrip:
+    """录制、保存、加载、回放"""
+
+    def test_replay_returns_recorded_responses(self, tmp_path):
+        path = tmp_path / 'run.cassette.gz'
+        recorded = record(path)
+        cassette = Cassette.load(path)
+        # 两次相同的page_source只保存一份
+        assert len(cassette.interactions) == 4 and len(cassette.blobs) == 1
+
+        replayer = CassetteReplayer(cassette)
+        # 会话ID不同也能匹配
+        params = {'sessionId': 'b', 'using': 'id', 'value': 'login'}
+        assert replayer('findElement', params, no_device) == recorded[0]
+        assert replayer('findElement', params, no_device) == recorded[1]
+        assert replayer('getPageSource', {'sessionId': 'b'}, no_device) == recorded[2]
+        assert replayer.unused() == 1
+
+    def test_exhausted_key_repeats_last_response(self, tmp_path):
+        path = tmp_path / 'run.cassette.gz'
+        recorded = record(path)
+        replayer = CassetteReplayer(Cassette.load(path))
+        params = {'sessionId': 'b', 'using': 'id', 'value': 'login'}
+        for _ in range(3):
+            response = replayer('findElement', params, no_device)
+        assert response == recorded[1] and replayer.repeated == 1
+        # 返回的是新对象，调用方改写不影响后续回放
+        response['value'] = 'changed'
+        assert replayer('findElement', params, no_device) == recorded[1]
+
+    def test_unrecorded_command_raises(self, tmp_path):
+        path = tmp_path / 'run.cassette.gz'
+        record(path)
+        replayer = CassetteReplayer(Cassette.load(path))
+        with pytest.raises(CassetteMismatchError):
+            replayer('findElement', {'sessionId': 'b', 'using': 'id', 'value': 'logout'}, no_device)
+
+    def test_summary_times_whole_chain_not_gaps(self, tmp_path, monkeypatch):
+        path = tmp_path / 'run.cassette.gz'
+        record(path)
+        replayer = CassetteReplayer(Cassette.load(path))
+        clock = iter([0.0, 0.001, 0.004, 10.0, 10.001, 10.006])
+        monkeypatch.setattr('src.core.command_cassette.time.perf_counter', lambda: next(clock))
+
+        def chain(command, params):
+            # measure在最外层，中间件链的耗时（此处为回放本身）计入命令耗时
+            return replayer(command, params, no_device)
+
+        replayer.measure('getPageSource', {'sessionId': 'b'}, chain)
+        replayer.measure('getPageSource', {'sessionId': 'b'}, chain)
+
+        summary = replayer.summary()
+        assert summary['commands'] == 2
+        assert summary['wall_seconds'] == pytest.approx(10.0)
+        # 命令之间的10秒用例时间不计入回放命令耗时
+        assert summary['replay_seconds'] == pytest.approx(0.010)
+        assert summary['overhead_per_command_ms'] == pytest.approx(5.0)
+        assert len(format_replay_summary(summary)) == 4
@@ -0,0 +1,81 @@
+"""
+命令耗时统计单元测试
+验证直方图的分桶误差、百分位数、合并和导出读取，以及中间件按用例记录
+"""
+import random
+import pytest
+from src.utils.command_metrics import CommandMetrics, LatencyHistogram, load_command_stats
+
+
+class TestLatencyHistogram:
+    """对数-线性直方图"""
+
+    def test_bucket_relative_error_bounded(self):
+        for value in [0, 1, 15, 16, 17, 31, 1000, 123_456, 9_876_543]:
+            bucket = LatencyHistogram.bucket_of(value)
+            assert bucket <= value
+            assert value - bucket <= value / 2 ** LatencyHistogram.SUB_BUCKET_BITS
+
+    def test_small_values_are_exact(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 11):
+            histogram.record(value)
+        assert histogram.percentile(50) == 5
+        assert histogram.percentile(100) == 10
+        assert histogram.count == 10 and histogram.total == 55 and histogram.max == 10
+
+    def test_percentiles_within_bucket_error(self):
+        rng = random.Random(7)
+        samples = sorted(rng.randint(1_000, 2_000_000) for _ in range(5000))
+        histogram = LatencyHistogram()
+        for sample in samples:
+            histogram.record(sample)
+        for percent in (50, 90, 99):
+            exact = samples[int(round(len(samples) * percent / 100)) - 1]
+            assert histogram.percentile(percent) == pytest.approx(exact, rel=1 / 16)
+        assert histogram.percentile(100) == pytest.approx(samples[-1], rel=1 / 16)
+
+    def test_empty_histogram(self):
+        assert LatencyHistogram().percentile(99) == 0
+
+    def test_merge_and_round_trip(self):
+        first, second = LatencyHistogram(), LatencyHistogram()
+        for value in (100, 200, 300):
+            first.record(value)
+        for value in (5_000, 70_000):
+            second.record(value)
+        first.merge(second)
+        restored = LatencyHistogram.from_dict(first.to_dict())
+        assert restored.count == 5 and restored.total == 75_600 and restored.max == 70_000
+        assert restored.buckets == first.buckets
+        assert restored.percentile(100) == pytest.approx(70_000, rel=1 / 16)
+
+
+class TestCommandMetrics:
+    """中间件记录与导出"""
+
+    def test_middleware_records_per_test(self, tmp_path):
+        metrics = CommandMetrics()
+        metrics.set_current_test('test_login')
+        metrics('findElement', {'using': 'id', 'value': 'login'}, lambda command, params: {'value': 'x' * 100})
+        metrics.set_current_test(None)
+        metrics('getTitle', {}, lambda command, params: {'value': 'title'})
+
+        stats = metrics.stats['test_login']['findElement']
+        assert stats.latency.count == 1 and stats.response_bytes == 100 and stats.request_bytes > 0
+        assert 'getTitle' in metrics.stats[CommandMetrics.NO_TEST]
+
+        metrics.export(str(tmp_path))
+        merged = load_command_stats(str(tmp_path))
+        assert set(merged) == {'findElement', 'getTitle'}
+        assert merged['findElement'].response_bytes == 100
+
+    def test_failed_command_not_recorded(self):
+        metrics = CommandMetrics()
+
+        def failing(command, params):
+            raise ConnectionResetError()
+
+        with pytest.raises(ConnectionResetError):
+            metrics('click', {}, failing)
+        assert not metrics.stats
@@ -0,0 +1,120 @@
+"""
+命令重试与熔断单元测试
+用桩执行器模拟连接重置和瞬时错误响应，验证退避、熔断状态和会话替换后的重发规则
+"""
+import time
+import pytest
+from urllib3.exceptions import ProtocolError
+from selenium.webdriver.remote.command import Command
+from src.core.command_retry import (CircuitBreaker, CommandRetry, SessionCircuitOpenError,
+                                    STATE_CLOSED, STATE_OPEN)
+
+
+class StubExecutor:
+    """只提供命令方法表的桩执行器"""
+
+    _commands = {
+        Command.GET_TITLE: ('GET', '/session/$sessionId/title'),
+        Command.FIND_ELEMENT: ('POST', '/session/$sessionId/element'),
+        Command.CLICK_ELEMENT: ('POST', '/session/$sessionId/element/$id/click'),
+    }
+
+
+class StubDriver:
+    session_id = 'old'
+
+
+class FlakyCall:
+    """前failures次调用抛出连接重置，之后返回成功响应"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, command, params):
+        self.calls.append((command, params.get('sessionId')))
+        if len(self.calls) <= self.failures:
+            raise ProtocolError('Connection aborted.', ConnectionResetError(104, 'ECONNRESET'))
+        return {'status': 0, 'value': 'ok'}
+
+
+def make_retry(retry_count=2, threshold=1):
+    retry = CommandRetry(StubExecutor(), retry_count=retry_count, base_delay=0, max_delay=0)
+    retry.breaker = CircuitBreaker(threshold, reset_timeout=30)
+    driver = StubDriver()
+
+    def replace(target):
+        target.session_id = 'new'
+
+    retry.bind(driver, replace)
+    return retry, driver
+
+
+class TestCircuitBreaker:
+    """熔断器状态"""
+
+    def test_opens_at_threshold_and_closes_on_success(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        assert not breaker.record_failure()
+        assert breaker.record_failure()
+        assert breaker.state == STATE_OPEN and not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == STATE_CLOSED and breaker.allow() and breaker.failures == 0
+
+    def test_allows_probe_after_reset_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        assert not breaker.allow()
+        time.sleep(0.06)
+        assert breaker.allow()
+        # 试探失败重新开始冷却，不重复计入熔断次数
+        assert not breaker.record_failure()
+        assert not breaker.allow() and breaker.trips == 1
+
+
+class TestCommandRetry:
+    """重试与会话替换"""
+
+    def test_backoff_is_bounded(self):
+        retry = CommandRetry(StubExecutor(), retry_count=3, base_delay=0.1, max_delay=0.3)
+        for attempt in range(6):
+            delay = retry.backoff(attempt)
+            assert 0 <= delay <= min(0.3, 0.1 * 2 ** attempt)
+
+    def test_idempotent_command_retried(self):
+        retry, _ = make_retry(retry_count=2, threshold=5)
+        call = FlakyCall(failures=2)
+        assert retry(Command.GET_TITLE, {'sessionId': 'old'}, call)['value'] == 'ok'
+        assert len(call.calls) == 3 and retry.retries == 2
+
+    def test_non_idempotent_command_not_retried(self):
+        retry, _ = make_retry(retry_count=2, threshold=5)
+        call = FlakyCall(failures=1)
+        with pytest.raises(ProtocolError):
+            retry(Command.CLICK_ELEMENT, {'sessionId': 'old', 'id': 'e1'}, call)
+        assert len(call.calls) == 1
+
+    def test_idempotent_command_replayed_on_replaced_session(self):
+        retry, driver = make_retry(retry_count=0, threshold=1)
+        call = FlakyCall(failures=1)
+        assert retry(Command.FIND_ELEMENT, {'sessionId': 'old'}, call)['value'] == 'ok'
+        assert call.calls == [(Command.FIND_ELEMENT, 'old'), (Command.FIND_ELEMENT, 'new')]
+        assert driver.session_id == 'new' and retry.breaker.state == STATE_CLOSED
+
+    def test_non_idempotent_command_not_replayed_after_replacement(self):
+        retry, driver = make_retry(retry_count=0, threshold=1)
+        call = FlakyCall(failures=1)
+        with pytest.raises(ProtocolError):
+            retry(Command.CLICK_ELEMENT, {'sessionId': 'old', 'id': 'e1'}, call)
+        # 会话已替换，但点击不在新会话上重发
+        assert call.calls == [(Command.CLICK_ELEMENT, 'old')]
+        assert driver.session_id == 'new' and retry.replacements == 1
+        assert retry.breaker.state == STATE_CLOSED
+
+    def test_open_circuit_rejects_commands(self):
+        retry, _ = make_retry(retry_count=0, threshold=1)
+        retry.max_replacements = 0
+        with pytest.raises(ProtocolError):
+            retry(Command.GET_TITLE, {'sessionId': 'old'}, FlakyCall(failures=1))
+        with pytest.raises(SessionCircuitOpenError):
+            retry(Command.GET_TITLE, {'sessionId': 'old'}, FlakyCall(failures=0))
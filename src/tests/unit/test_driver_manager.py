@@ -0,0 +1,95 @@
+"""
+驱动管理单元测试
+替换会话创建，验证配置了设备清单时并发创建的每个驱动租借各自的设备
+"""
+import threading
+import time
+import pytest
+from src.config import config
+from src.core.device_leaser import device_leaser
+from src.core.driver_manager import DriverManager, MultiDriverCreationError
+
+
+INVENTORY = [
+    {'deviceName': 'unit-dev-a', 'udid': 'unit-dev-a', 'appium_port': 14723},
+    {'deviceName': 'unit-dev-b', 'udid': 'unit-dev-b', 'appium_port': 14724},
+]
+
+
+class StubDriver:
+    """记录创建参数的桩驱动"""
+
+    def __init__(self, profile, server_url):
+        self.profile = profile
+        self.server_url = server_url
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """配置两台设备清单、不实际创建会话的驱动管理器"""
+    monkeypatch.setitem(config._config_data, 'device_inventory', {'android': INVENTORY})
+    monkeypatch.setattr(DriverManager, '_new_driver', lambda self, profile, server_url=None: StubDriver(
+        profile, server_url))
+    manager = DriverManager()
+    yield manager
+    for name in ('alice', 'bob', 'carol'):
+        manager.quit_driver(name)
+    device_leaser.release_all()
+
+
+class TestCreateDriversWithInventory:
+    """设备清单下的并发创建"""
+
+    def test_each_spec_leases_a_distinct_device(self, manager):
+        drivers = manager.create_drivers([{'name': 'alice'}, {'name': 'bob'}])
+        udids = {driver.profile.get('udid') for driver in drivers.values()}
+        servers = {driver.server_url for driver in drivers.values()}
+        assert udids == {'unit-dev-a', 'unit-dev-b'}
+        assert servers == {'http://localhost:14723', 'http://localhost:14724'}
+
+    def test_rejects_more_specs_than_devices(self, manager):
+        with pytest.raises(ValueError):
+            manager.create_drivers([{'name': 'alice'}, {'name': 'bob'}, {'name': 'carol'}])
+        assert not manager._device_leases
+
+    def test_quit_driver_returns_device(self, manager):
+        manager.create_drivers([{'name': 'alice'}, {'name': 'bob'}])
+        manager.quit_driver('alice')
+        # 归还的设备可以再次租借
+        drivers = manager.create_drivers([{'name': 'carol'}])
+        assert drivers['carol'].profile.get('udid') in {'unit-dev-a', 'unit-dev-b'}
+        assert drivers['carol'].profile.get('udid') != manager._drivers['bob'].profile.get('udid')
+
+    def test_fail_fast_keeps_device_until_pending_driver_quit(self, manager, monkeypatch):
+        started, proceed = threading.Event(), threading.Event()
+        created = []
+
+        def new_driver(self, profile, server_url=None):
+            if profile.get('udid') == 'unit-dev-a':
+                started.set()
+                proceed.wait(5)
+                created.append(StubDriver(profile, server_url))
+                return created[-1]
+            started.wait(5)
+            raise RuntimeError('session not created')
+
+        monkeypatch.setattr(DriverManager, '_new_driver', new_driver)
+        with pytest.raises(MultiDriverCreationError):
+            manager.create_drivers([{'name': 'alice'}, {'name': 'bob'}])
+
+        # 仍在创建会话的设备不归还，失败的设备已归还
+        leased = {lease.device_id for lease in device_leaser._leases.values()}
+        assert 'unit-dev-a' in leased and 'unit-dev-b' not in leased
+
+        proceed.set()
+        for _ in range(50):
+            if created and created[0].quit_called and 'unit-dev-a' not in {
+                    lease.device_id for lease in device_leaser._leases.values()}:
+                break
+            time.sleep(0.05)
+        assert created[0].quit_called
+        assert 'unit-dev-a' not in {lease.device_id for lease in device_leaser._leases.values()}
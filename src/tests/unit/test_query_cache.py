@@ -0,0 +1,113 @@
+"""
+查询缓存单元测试
+用计数的桩请求验证缓存命中、响应副本和各失效规则
+"""
+from selenium.webdriver.remote.command import Command
+from appium.webdriver.mobilecommand import MobileCommand
+from src.core.query_cache import QueryCache, KIND_WINDOW, QUERY_KINDS
+
+
+class StubExecutor:
+    """只提供命令方法表的桩执行器"""
+
+    _commands = {
+        Command.GET_WINDOW_RECT: ('GET', '/session/$sessionId/window/rect'),
+        Command.CLICK_ELEMENT: ('POST', '/session/$sessionId/element/$id/click'),
+        Command.GET_TITLE: ('GET', '/session/$sessionId/title'),
+    }
+
+
+class CountingCall:
+    """记录实际发送的命令，每次返回不同的值"""
+
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, command, params):
+        self.sent.append(command)
+        return {'status': 0, 'value': {'count': len(self.sent)}}
+
+
+def make_cache():
+    return QueryCache(StubExecutor(), kinds=QUERY_KINDS), CountingCall()
+
+
+SESSION = {'sessionId': 's1'}
+
+
+class TestQueryCacheHits:
+    """缓存命中"""
+
+    def test_repeated_query_served_from_cache(self):
+        cache, call = make_cache()
+        first = cache(Command.GET_WINDOW_RECT, dict(SESSION), call)
+        second = cache(Command.GET_WINDOW_RECT, dict(SESSION), call)
+        assert first == second and call.sent == [Command.GET_WINDOW_RECT]
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 1}
+
+    def test_returned_response_is_a_copy(self):
+        cache, call = make_cache()
+        cache(Command.GET_WINDOW_RECT, dict(SESSION), call)['value']['count'] = 99
+        assert cache(Command.GET_WINDOW_RECT, dict(SESSION), call)['value']['count'] == 1
+
+    def test_error_response_not_cached(self):
+        cache, _ = make_cache()
+        sent = []
+
+        def failing(command, params):
+            sent.append(command)
+            return {'status': 13, 'value': {'error': 'unknown error'}}
+
+        cache(Command.GET_WINDOW_RECT, dict(SESSION), failing)
+        cache(Command.GET_WINDOW_RECT, dict(SESSION), failing)
+        assert len(sent) == 2
+
+
+class TestQueryCacheInvalidation:
+    """失效规则"""
+
+    def test_rotation_invalidates_window(self):
+        cache, call = make_cache()
+        cache(Command.GET_WINDOW_RECT, dict(SESSION), call)
+        cache(MobileCommand.SET_SCREEN_ORIENTATION, {'sessionId': 's1', 'orientation': 'LANDSCAPE'}, call)
+        assert cache(Command.GET_WINDOW_RECT, dict(SESSION), call)['value']['count'] == 3
+
+    def test_navigation_invalidates_activity_but_not_window(self):
+        cache, call = make_cache()
+        cache(MobileCommand.GET_CURRENT_ACTIVITY, dict(SESSION), call)
+        cache(Command.GET_WINDOW_RECT, dict(SESSION), call)
+        cache(Command.CLICK_ELEMENT, {'sessionId': 's1', 'id': 'e1'}, call)
+        cache(MobileCommand.GET_CURRENT_ACTIVITY, dict(SESSION), call)
+        cache(Command.GET_WINDOW_RECT, dict(SESSION), call)
+        assert call.sent.count(MobileCommand.GET_CURRENT_ACTIVITY) == 2
+        assert call.sent.count(Command.GET_WINDOW_RECT) == 1
+
+    def test_read_only_commands_keep_cache(self):
+        cache, call = make_cache()
+        cache(MobileCommand.GET_CURRENT_ACTIVITY, dict(SESSION), call)
+        cache(Command.FIND_ELEMENT, {'sessionId': 's1', 'using': 'id', 'value': 'login'}, call)
+        cache(Command.GET_TITLE, dict(SESSION), call)
+        cache(MobileCommand.GET_CURRENT_ACTIVITY, dict(SESSION), call)
+        assert call.sent.count(MobileCommand.GET_CURRENT_ACTIVITY) == 1
+
+    def test_context_switch_invalidates_contexts(self):
+        cache, call = make_cache()
+        cache(MobileCommand.GET_CURRENT_CONTEXT, dict(SESSION), call)
+        cache(MobileCommand.SWITCH_TO_CONTEXT, {'sessionId': 's1', 'name': 'WEBVIEW_1'}, call)
+        cache(MobileCommand.GET_CURRENT_CONTEXT, dict(SESSION), call)
+        assert call.sent.count(MobileCommand.GET_CURRENT_CONTEXT) == 2
+
+    def test_new_session_id_clears_cache(self):
+        cache, call = make_cache()
+        cache(Command.GET_WINDOW_RECT, dict(SESSION), call)
+        cache(Command.GET_WINDOW_RECT, {'sessionId': 's2'}, call)
+        assert call.sent.count(Command.GET_WINDOW_RECT) == 2
+
+    def test_explicit_invalidate_by_kind(self):
+        cache, call = make_cache()
+        cache(Command.GET_WINDOW_RECT, dict(SESSION), call)
+        cache(MobileCommand.GET_CURRENT_ACTIVITY, dict(SESSION), call)
+        cache.invalidate(KIND_WINDOW)
+        assert cache.stats()['entries'] == 1
+        cache(Command.GET_WINDOW_RECT, dict(SESSION), call)
+        assert call.sent.count(Command.GET_WINDOW_RECT) == 2
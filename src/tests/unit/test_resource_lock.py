@@ -0,0 +1,120 @@
+"""
+跨进程资源锁单元测试
+多进程争用同一把锁时任一时刻只有一个持有者，持有者退出后锁可被获取
+"""
+import multiprocessing
+import os
+import time
+import pytest
+from src.core.resource_lock import ResourceLock
+
+
+def _contend(lock_dir, name, holders, violations, rounds):
+    """反复获取同一把锁，记录同时持有的进程数"""
+    for _ in range(rounds):
+        lock = ResourceLock(name, lock_dir)
+        if not lock.acquire():
+            continue
+        with holders.get_lock():
+            holders.value += 1
+            if holders.value > 1:
+                violations.value += 1
+        time.sleep(0.001)
+        with holders.get_lock():
+            holders.value -= 1
+        lock.release()
+
+
+def _acquire_after_barrier(lock_dir, name, barrier, holders, violations):
+    """与其他进程同时获取同一把锁，持有一段时间后释放"""
+    lock = ResourceLock(name, lock_dir)
+    barrier.wait()
+    if lock.acquire():
+        with holders.get_lock():
+            holders.value += 1
+            if holders.value > 1:
+                violations.value += 1
+        time.sleep(0.05)
+        with holders.get_lock():
+            holders.value -= 1
+        lock.release()
+
+
+def _hold_and_exit(lock_dir, name, acquired):
+    """获取锁后不释放直接退出"""
+    acquired.value = ResourceLock(name, lock_dir).acquire()
+    os._exit(0)
+
+
+class TestResourceLock:
+    """资源锁测试"""
+
+    def test_exclusive_in_process(self, tmp_path):
+        first = ResourceLock('device-a', tmp_path)
+        second = ResourceLock('device-a', tmp_path)
+        assert first.acquire()
+        assert not second.acquire()
+        assert first.owner_pid() == os.getpid()
+        first.release()
+        assert second.acquire()
+        second.release()
+        assert not second.path.exists()
+
+    def test_exclusive_across_processes(self, tmp_path):
+        holders = multiprocessing.Value('i', 0)
+        violations = multiprocessing.Value('i', 0)
+        processes = [multiprocessing.Process(target=_contend, args=(tmp_path, 'port-8200', holders, violations, 200))
+                     for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+        assert all(process.exitcode == 0 for process in processes)
+        assert violations.value == 0
+
+    def test_exclusive_when_reclaiming_leaked_lock(self, tmp_path):
+        # 多个进程同时发现持有者已退出的锁文件，只能有一个获取成功
+        dead = multiprocessing.Process(target=os.getpid)
+        dead.start()
+        dead.join()
+        for trial in range(40):
+            name = f"device-{trial}"
+            (tmp_path / f"{name}.lock").write_text(str(dead.pid))
+            barrier = multiprocessing.Barrier(4)
+            holders = multiprocessing.Value('i', 0)
+            violations = multiprocessing.Value('i', 0)
+            processes = [multiprocessing.Process(target=_acquire_after_barrier,
+                                                 args=(tmp_path, name, barrier, holders, violations))
+                         for _ in range(4)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(30)
+            assert violations.value == 0, f"第 {trial} 次回收时出现多个进程同时持有锁"
+
+    def test_released_when_holder_exits(self, tmp_path):
+        acquired = multiprocessing.Value('b', False)
+        process = multiprocessing.Process(target=_hold_and_exit, args=(tmp_path, 'device-b', acquired))
+        process.start()
+        process.join(30)
+        assert acquired.value
+        lock = ResourceLock('device-b', tmp_path)
+        # 锁文件残留，但持有者已退出
+        assert lock.path.exists()
+        assert lock.acquire()
+        lock.release()
+
+    def test_reclaim_only_unheld_locks(self, tmp_path):
+        held = ResourceLock('held', tmp_path)
+        assert held.acquire()
+        (tmp_path / 'leaked.lock').write_text('')
+        assert ResourceLock.reclaim_stale_locks(tmp_path) == 1
+        assert held.path.exists() and not (tmp_path / 'leaked.lock').exists()
+        held.release()
+
+    def test_context_manager(self, tmp_path):
+        with ResourceLock('ctx', tmp_path):
+            with pytest.raises(RuntimeError):
+                with ResourceLock('ctx', tmp_path):
+                    pass
+        assert ResourceLock('ctx', tmp_path).acquire()
@@ -0,0 +1,127 @@
+"""
+会话池单元测试
+使用不连接服务器的桩驱动，验证租借时的隔离级别和预热统计
+"""
+import itertools
+import threading
+import time
+import pytest
+from src.core.session_pool import SessionPool
+
+
+class StubDriver:
+    """只提供会话池用到的属性的桩驱动"""
+
+    _ids = itertools.count()
+
+    def __init__(self):
+        self.session_id = f"stub-{next(self._ids)}"
+        self.current_window_handle = 'NATIVE_APP'
+        self.capabilities = {}
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def resets(monkeypatch):
+    """记录会话池执行的应用重置 [(会话ID, 策略)]"""
+    calls = []
+    monkeypatch.setattr(SessionPool, 'reset_app', classmethod(lambda cls, driver, strategy: calls.append(
+        (driver.session_id, strategy))))
+    return calls
+
+
+class TestSessionPoolIsolation:
+    """租借时的隔离级别"""
+
+    def test_unmarked_lease_uses_default_strategy(self, resets):
+        pool = SessionPool(lambda key: StubDriver(), reset_strategy='restart')
+        session = pool.lease('android')
+        # 上一个用例归还时预测下一个用例不需要重置
+        pool.release(session, strategy='none')
+        assert resets == [(session.session_id, 'none')]
+
+        # 未标记隔离级别的用例仍按默认策略拿到干净的应用
+        leased = pool.lease('android')
+        assert leased is session
+        assert resets[-1] == (session.session_id, 'restart')
+        pool.close_all()
+
+    def test_lease_skips_reset_already_done(self, resets):
+        pool = SessionPool(lambda key: StubDriver(), reset_strategy='restart')
+        session = pool.lease('android')
+        pool.release(session, strategy='clear_data')
+        pool.lease('android', strategy='restart')
+        assert resets == [(session.session_id, 'clear_data')]
+        pool.close_all()
+
+    def test_new_session_counts_as_restarted(self, resets):
+        pool = SessionPool(lambda key: StubDriver(), reset_strategy='restart')
+        pool.lease('android')
+        assert resets == []
+        pool.close_all()
+
+
+class TestSessionPoolCleanup:
+    """失败和超限时回收会话"""
+
+    def test_failed_reset_on_new_session_evicts(self, monkeypatch):
+        def fail(cls, driver, strategy):
+            raise RuntimeError('pm clear failed')
+
+        monkeypatch.setattr(SessionPool, 'reset_app', classmethod(fail))
+        drivers = []
+        pool = SessionPool(lambda key: drivers.append(StubDriver()) or drivers[-1])
+        with pytest.raises(RuntimeError):
+            pool.lease('android', strategy='clear_data')
+        assert pool.sessions() == [] and drivers[0].quit_called
+
+    def test_background_release_evicts_overflow(self, resets):
+        pool = SessionPool(lambda key: StubDriver(), max_size=1)
+        first, second = pool.lease('android'), pool.lease('android')
+        pool.release(first, background=True)
+        pool.release(second, background=True)
+        assert pool.sessions() == [first] and second.driver.quit_called
+        # 超限回收的会话不做重置
+        first.warming.result()
+        assert resets == [(first.session_id, 'restart')]
+        pool.close_all()
+
+    def test_background_release_evicts_idle(self, resets):
+        pool = SessionPool(lambda key: StubDriver(), max_idle=60)
+        first, second = pool.lease('android'), pool.lease('android')
+        pool.release(first)
+        pool.max_idle = 0
+        time.sleep(0.01)
+        pool.release(second, background=True)
+        assert first.driver.quit_called and pool.sessions() == [second]
+        pool.close_all()
+
+
+class TestSessionPoolPrewarmStats:
+    """预热命中统计"""
+
+    def test_finished_prewarm_counts_as_hit(self, resets):
+        pool = SessionPool(lambda key: StubDriver(), prewarm=True)
+        session = pool.lease('android')
+        pool.release(session, background=True)
+        session.warming.result()
+        pool.lease('android')
+        assert pool.stats['prewarm_hits'] == 1 and pool.stats['prewarm_partial'] == 0
+        pool.close_all()
+
+    def test_blocked_lease_counts_as_partial(self, monkeypatch):
+        gate = threading.Event()
+        monkeypatch.setattr(SessionPool, 'reset_app', classmethod(lambda cls, driver, strategy: gate.wait(5)))
+        pool = SessionPool(lambda key: StubDriver(), prewarm=True)
+        session = pool.lease('android')
+        pool.release(session, background=True)
+        threading.Timer(0.1, gate.set).start()
+        start = time.time()
+        pool.lease('android')
+        assert time.time() - start >= 0.05
+        assert pool.stats['prewarm_hits'] == 0 and pool.stats['prewarm_partial'] == 1
+        assert pool.stats['prewarm_wait'] > 0
+        pool.close_all()
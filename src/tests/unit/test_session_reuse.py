@@ -0,0 +1,115 @@
+"""
+会话复用单元测试
+验证断开时保存会话端口，新建会话不分配这些端口，重新连接时重新占用；并发保存和取出不丢失、不重复
+"""
+import threading
+import pytest
+from src.config import config
+from src.core.capability_profile import CapabilityProfile
+from src.core.port_allocator import PortAllocator
+from src.core.session_reuse import SessionStateStore
+
+
+class StubDriver:
+    """只提供状态文件用到的属性的桩驱动"""
+
+    def __init__(self, session_id: str = 'saved-1'):
+        self.session_id = session_id
+        self.caps = {'platformName': 'Android'}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """使用临时状态文件的会话状态"""
+    monkeypatch.setattr(SessionStateStore, 'state_file', property(lambda self: tmp_path / 'state.json'))
+    monkeypatch.setattr('src.core.session_reuse.get_executor_url', lambda driver: 'http://127.0.0.1:4723')
+    return SessionStateStore()
+
+
+@pytest.fixture
+def allocator(monkeypatch):
+    """只分配systemPort的端口分配器（使用不常用的端口范围）"""
+    monkeypatch.setitem(config._config_data, 'port_allocator', {'enabled': True})
+    monkeypatch.setattr(PortAllocator, 'get_ranges', staticmethod(lambda: {'systemPort': (48200, 48203)}))
+    return PortAllocator()
+
+
+def android_profile() -> CapabilityProfile:
+    return CapabilityProfile.from_dict('android', {'platformName': 'Android', 'automationName': 'UiAutomator2'})
+
+
+class TestSessionReusePorts:
+    """保存的会话端口"""
+
+    def test_saved_ports_are_not_allocated_again(self, store, allocator):
+        profile, allocation = allocator.allocate(android_profile())
+        try:
+            store.save([{'profile': profile, 'driver': StubDriver(), 'ports': allocation.ports}])
+        finally:
+            # 模拟进程退出释放端口锁
+            allocation.release()
+        assert store.saved_ports() == {48200}
+        assert store.load()[0]['ports'] == {'systemPort': 48200}
+
+        profile, allocation = allocator.allocate(android_profile(), store.saved_ports())
+        try:
+            assert profile.get('systemPort') == 48201
+        finally:
+            allocation.release()
+
+    def test_reserve_reacquires_saved_ports(self, allocator):
+        reserved = allocator.reserve({'systemPort': 48202})
+        try:
+            assert reserved is not None and reserved.ports == {'systemPort': 48202}
+            # 已被占用的端口不能再次占用，也不会被分配
+            assert allocator.reserve({'systemPort': 48202}) is None
+            profile, allocation = allocator.allocate(android_profile(), {48200, 48201})
+            assert profile.get('systemPort') == 48203
+            allocation.release()
+        finally:
+            reserved.release()
+
+
+def run_threads(target, count: int):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class TestSessionStateConcurrency:
+    """并发读写状态文件"""
+
+    def test_concurrent_saves_keep_all_entries(self, store):
+        profile = android_profile()
+
+        def save(worker):
+            for i in range(5):
+                store.save([{'profile': profile, 'driver': StubDriver(f"w{worker}-{i}")}])
+
+        run_threads(save, 8)
+        assert len({entry['session_id'] for entry in store.load()}) == 40
+
+    def test_each_session_claimed_once(self, store, monkeypatch):
+        monkeypatch.setattr('src.core.session_reuse.probe_session', lambda server_url, session_id: True)
+        profile = android_profile()
+        store.save([{'profile': profile, 'driver': StubDriver(f"s{i}")} for i in range(6)])
+        claimed = []
+
+        def claim(worker):
+            entry = store.claim(profile)
+            if entry is not None:
+                claimed.append(entry['session_id'])
+
+        run_threads(claim, 10)
+        assert sorted(claimed) == [f"s{i}" for i in range(6)]
+        assert store.load() == []
+
+    def test_dead_sessions_dropped_on_claim(self, store, monkeypatch):
+        monkeypatch.setattr('src.core.session_reuse.probe_session',
+                            lambda server_url, session_id: session_id == 'alive')
+        profile = android_profile()
+        store.save([{'profile': profile, 'driver': StubDriver(session_id)} for session_id in ('dead', 'alive')])
+        assert store.claim(profile)['session_id'] == 'alive'
+        assert store.load() == []
@@ -17,6 +17,8 @@ def get_app_info(apk_path):
         # 提取包名
         package_match = re.search(r"package: name='([^']+)'", output)
         package_name = package_match.group(1) if package_match else None
+        version_match = re.search(r"versionCode='(\d+)'", output)
+        version_code = version_match.group(1) if version_match else None
         
         # 提取启动Activity
         activity_match = re.search(r"launchable-activity: name='([^']+)'", output)
@@ -25,6 +27,7 @@ def get_app_info(apk_path):
         return {
             'app_path': os.path.abspath(apk_path),
             'appPackage': package_name,
+            'versionCode': version_code,
             'appActivity': activity_name
         }
         
@@ -129,7 +129,7 @@ class ElementAssert:
     """元素断言类"""
     
     def __init__(self, driver: WebDriver = None):
-        self.driver = driver or driver_manager.get_driver()
+        self.driver = driver if driver is not None else driver_manager.get_driver()
     
     def element_present(self, locator: tuple, timeout: int = 10, message: str = None):
         """断言元素存在"""
@@ -208,7 +208,7 @@ class WaitAssert:
     """等待断言类"""
     
     def __init__(self, driver: WebDriver = None):
-        self.driver = driver or driver_manager.get_driver()
+        self.driver = driver if driver is not None else driver_manager.get_driver()
     
     def wait_until_true(self, condition: Callable[[], bool], timeout: int = 30, 
                        interval: float = 0.5, message: str = None):
@@ -0,0 +1,231 @@
+"""
+命令耗时统计模块
+以命令执行器中间件的方式记录每条WebDriver命令的耗时和负载大小，按用例汇总为直方图并导出JSON
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from ..config import config
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 导出文件名前缀，与Allure结果放在同一目录
+METRICS_FILE_PREFIX = 'command-metrics'
+
+
+class LatencyHistogram:
+    """HDR风格的对数-线性直方图
+
+    以微秒记录，每个2的幂区间再细分为16个桶，相对误差不超过1/16，
+    内存占用与样本数量无关，可以直接合并。
+    """
+
+    SUB_BUCKET_BITS = 4
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def bucket_of(cls, value: int) -> int:
+        """计算值所在桶的下界"""
+        shift = value.bit_length() - 1 - cls.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return (value >> shift) << shift
+
+    def record(self, micros: int):
+        """记录一个样本（微秒）"""
+        micros = max(0, int(micros))
+        bucket = self.bucket_of(micros)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += micros
+        self.max = max(self.max, micros)
+
+    def percentile(self, percent: float) -> int:
+        """计算百分位数（微秒）"""
+        if not self.count:
+            return 0
+        target = max(1, int(round(self.count * percent / 100)))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return min(bucket, self.max)
+        return self.max
+
+    def merge(self, other: 'LatencyHistogram'):
+        """合并另一个直方图"""
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为字典"""
+        return {
+            'count': self.count,
+            'total_us': self.total,
+            'max_us': self.max,
+            'buckets': {str(bucket): count for bucket, count in sorted(self.buckets.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LatencyHistogram':
+        """从字典恢复"""
+        histogram = cls()
+        histogram.buckets = {int(bucket): count for bucket, count in data.get('buckets', {}).items()}
+        histogram.count = data.get('count', 0)
+        histogram.total = data.get('total_us', 0)
+        histogram.max = data.get('max_us', 0)
+        return histogram
+
+
+class CommandStats:
+    """单个命令的统计"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为字典"""
+        data = self.latency.to_dict()
+        data.update(request_bytes=self.request_bytes, response_bytes=self.response_bytes)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CommandStats':
+        """从字典恢复"""
+        stats = cls()
+        stats.latency = LatencyHistogram.from_dict(data)
+        stats.request_bytes = data.get('request_bytes', 0)
+        stats.response_bytes = data.get('response_bytes', 0)
+        return stats
+
+
+def _payload_size(value: Any) -> int:
+    """估算负载大小（字节），字符串（page_source、截图base64）直接取长度"""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value)
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class CommandMetrics:
+    """命令耗时统计，实例本身即命令执行器中间件"""
+
+    NO_TEST = '<no-test>'
+
+    def __init__(self):
+        # {用例node id: {命令名: CommandStats}}
+        self.stats: Dict[str, Dict[str, CommandStats]] = {}
+        # 当前用例按线程记录（线程并行执行时各线程同时运行不同用例）
+        self._context = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用命令耗时统计"""
+        return bool(config.get('command_metrics.enabled', False))
+
+    @property
+    def current_test(self) -> str:
+        """当前线程执行的用例"""
+        return getattr(self._context, 'node_id', self.NO_TEST)
+
+    def set_current_test(self, node_id: Optional[str]):
+        """设置当前线程执行的用例"""
+        self._context.node_id = node_id or self.NO_TEST
+
+    def __call__(self, command: str, params: Dict[str, Any], call_next: Callable) -> Any:
+        """中间件入口：计时并记录负载大小"""
+        request_bytes = _payload_size(params)
+        start = time.perf_counter()
+        try:
+            response = call_next(command, params)
+        finally:
+            elapsed_us = (time.perf_counter() - start) * 1_000_000
+        response_value = response.get('value') if isinstance(response, dict) else response
+        self.record(command, elapsed_us, request_bytes, _payload_size(response_value))
+        return response
+
+    def record(self, command: str, elapsed_us: float, request_bytes: int = 0, response_bytes: int = 0):
+        """记录一条命令"""
+        with self._lock:
+            stats = self.stats.setdefault(self.current_test, {}).setdefault(command, CommandStats())
+            stats.latency.record(elapsed_us)
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self.stats.clear()
+
+    def export(self, output_dir: str = None) -> Optional[Path]:
+        """导出为JSON，放在Allure结果目录下（xdist每个worker单独一个文件）"""
+        if not self.stats:
+            return None
+
+        output_dir = Path(output_dir or config.get_allure_config().get('results_dir', './reports/allure_raw'))
+        output_dir.mkdir(parents=True, exist_ok=True)
+        worker = os.getenv('PYTEST_XDIST_WORKER', 'master')
+        output_file = output_dir / f"{METRICS_FILE_PREFIX}-{worker}.json"
+
+        with self._lock:
+            data = {test: {command: stats.to_dict() for command, stats in commands.items()}
+                    for test, commands in self.stats.items()}
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+        logger.info(f"命令耗时统计已导出: {output_file}")
+        return output_file
+
+
+def load_command_stats(results_dir: str = None) -> Dict[str, CommandStats]:
+    """读取所有worker导出的统计，按命令名合并"""
+    results_dir = Path(results_dir or config.get_allure_config().get('results_dir', './reports/allure_raw'))
+    merged: Dict[str, CommandStats] = {}
+    for metrics_file in results_dir.glob(f"{METRICS_FILE_PREFIX}-*.json"):
+        with open(metrics_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for commands in data.values():
+            for command, stats_data in commands.items():
+                stats = CommandStats.from_dict(stats_data)
+                target = merged.setdefault(command, CommandStats())
+                target.latency.merge(stats.latency)
+                target.request_bytes += stats.request_bytes
+                target.response_bytes += stats.response_bytes
+    return merged
+
+
+def format_slowest_commands(stats: Dict[str, CommandStats], top_n: int = 10) -> List[str]:
+    """按总耗时排序，生成最慢命令表格"""
+    rows = sorted(stats.items(), key=lambda item: item[1].latency.total, reverse=True)[:top_n]
+    lines = [f"{'命令':<28}{'次数':>8}{'总耗时(s)':>12}{'p50(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}{'平均响应(KB)':>14}"]
+    for command, command_stats in rows:
+        latency = command_stats.latency
+        avg_kb = command_stats.response_bytes / latency.count / 1024 if latency.count else 0
+        lines.append(f"{command:<28}{latency.count:>8}{latency.total / 1e6:>12.2f}"
+                     f"{latency.percentile(50) / 1000:>10.1f}{latency.percentile(99) / 1000:>10.1f}"
+                     f"{latency.max / 1000:>10.1f}{avg_kb:>14.1f}")
+    return lines
+
+
+# 全局命令耗时统计实例
+command_metrics = CommandMetrics()
@@ -0,0 +1,227 @@
+"""
+MJPEG截图流模块
+读取UiAutomator2 MJPEG服务器的画面流，后台线程在内存中保留最新一帧，截图时直接取帧，无需经过截图命令
+"""
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+import requests
+from appium.webdriver.webdriver import WebDriver
+from .logger import get_logger
+from ..config import config
+from ..core.session_heartbeat import get_executor_url
+
+logger = get_logger(__name__)
+
+
+# JPEG起止标记（部分实现的分段头中没有Content-Length）
+JPEG_START = b'\xff\xd8'
+JPEG_END = b'\xff\xd9'
+# 读取流时每次最多读取的字节数
+READ_CHUNK_SIZE = 64 * 1024
+# 缓冲区上限，超过时丢弃（流格式异常）
+MAX_BUFFER_SIZE = 16 * 1024 * 1024
+
+
+class MjpegStream:
+    """MJPEG画面流读取器
+
+    后台线程持续读取multipart/x-mixed-replace流，只保留最新一帧及其接收时间。
+    连接断开后线程退出，alive变为False，由调用方决定是否重新连接。
+    """
+
+    def __init__(self, url: str, connect_timeout: float = 3):
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.frames = 0
+        self._frame: Optional[Tuple[bytes, float]] = None
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._response = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def alive(self) -> bool:
+        """读取线程是否仍在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> 'MjpegStream':
+        """启动后台读取线程"""
+        self._thread = threading.Thread(target=self._run, name=f"mjpeg-{urlparse(self.url).port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止读取并关闭连接"""
+        self._stopped.set()
+        response = self._response
+        if response is not None:
+            response.close()
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self):
+        try:
+            with requests.get(self.url, stream=True, timeout=(self.connect_timeout, 10)) as response:
+                response.raise_for_status()
+                self._response = response
+                self._read_frames(response)
+        except Exception as e:
+            if not self._stopped.is_set():
+                logger.debug(f"MJPEG流已断开: {self.url} ({e})")
+        finally:
+            self._response = None
+            with self._condition:
+                self._condition.notify_all()
+
+    def _read_frames(self, response):
+        """按JPEG起止标记切分帧（不依赖分段边界和头部）"""
+        buffer = b''
+        for chunk in self._iter_chunks(response):
+            if self._stopped.is_set():
+                return
+            buffer += chunk
+            while True:
+                start = buffer.find(JPEG_START)
+                if start < 0:
+                    buffer = buffer[-1:]
+                    break
+                end = buffer.find(JPEG_END, start + 2)
+                if end < 0:
+                    buffer = buffer[start:]
+                    break
+                self._publish(buffer[start:end + 2])
+                buffer = buffer[end + 2:]
+            if len(buffer) > MAX_BUFFER_SIZE:
+                buffer = b''
+
+    @staticmethod
+    def _iter_chunks(response):
+        """数据到达即返回（MJPEG流既没有Content-Length也不分块，按固定大小读取会等到凑满才返回）"""
+        read1 = getattr(response.raw, 'read1', None)
+        if read1 is None:
+            # urllib3 1.x
+            yield from response.iter_content(1024)
+            return
+        while True:
+            chunk = read1(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def _publish(self, frame: bytes):
+        with self._condition:
+            self._frame = (frame, time.time())
+            self.frames += 1
+            self._condition.notify_all()
+
+    def latest(self, max_age: float, timeout: float) -> Optional[bytes]:
+        """获取接收时间不早于max_age秒前的最新帧，等待timeout秒仍没有时返回None"""
+        deadline = time.time() + timeout
+        with self._condition:
+            while True:
+                now = time.time()
+                if self._frame is not None and now - self._frame[1] <= max_age:
+                    return self._frame[0]
+                if now >= deadline or not self.alive:
+                    return None
+                self._condition.wait(deadline - now)
+
+
+class MjpegScreenshotSource:
+    """MJPEG截图源
+
+    每个驱动一个画面流：按会话的mjpegServerPort连接Appium主机上转发的端口，首次截图时通过
+    settings调整帧率和画质后启动读取线程；流不可用时返回None，调用方回退到截图命令。
+    """
+
+    def __init__(self):
+        # {驱动: 画面流}
+        self._streams: 'weakref.WeakKeyDictionary[WebDriver, MjpegStream]' = weakref.WeakKeyDictionary()
+        # {驱动: 上次连接失败时间}
+        self._failures: 'weakref.WeakKeyDictionary[WebDriver, float]' = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用MJPEG截图"""
+        return bool(config.get('mjpeg_screenshot.enabled', False))
+
+    @staticmethod
+    def stream_url(driver: WebDriver) -> Optional[str]:
+        """会话的MJPEG流地址（会话未请求mjpegServerPort时为None）"""
+        capabilities = getattr(driver, 'capabilities', None) or {}
+        port = capabilities.get('mjpegServerPort') or capabilities.get('appium:mjpegServerPort')
+        server_url = get_executor_url(driver)
+        if not port or not server_url:
+            return None
+        return f"http://{urlparse(server_url).hostname}:{port}"
+
+    def _configure(self, driver: WebDriver):
+        """调整UiAutomator2 MJPEG服务器的帧率、画质和缩放比例"""
+        settings = {
+            'mjpegServerFramerate': config.get('mjpeg_screenshot.framerate', 10),
+            'mjpegServerScreenshotQuality': config.get('mjpeg_screenshot.quality', 50),
+            'mjpegScalingFactor': config.get('mjpeg_screenshot.scaling_factor', 100),
+        }
+        try:
+            driver.update_settings(settings)
+        except Exception as e:
+            logger.debug(f"设置MJPEG参数失败，使用服务端默认值: {e}")
+
+    def get_stream(self, driver: WebDriver) -> Optional[MjpegStream]:
+        """获取驱动的画面流，必要时启动；连接失败后在retry_interval秒内不再尝试"""
+        with self._lock:
+            stream = self._streams.get(driver)
+            if stream is not None and stream.alive:
+                return stream
+            failed_at = self._failures.get(driver)
+            if failed_at is not None and time.time() - failed_at < config.get('mjpeg_screenshot.retry_interval', 30):
+                return None
+            url = self.stream_url(driver)
+            if url is None:
+                self._failures[driver] = time.time()
+                logger.debug("会话未配置mjpegServerPort，使用截图命令")
+                return None
+
+            self._configure(driver)
+            stream = MjpegStream(url).start()
+            self._streams[driver] = stream
+            weakref.finalize(driver, stream.stop)
+            logger.info(f"启动MJPEG截图流: {url}")
+            return stream
+
+    def capture(self, driver: WebDriver) -> Optional[bytes]:
+        """从画面流获取最新一帧JPEG，不可用时返回None"""
+        stream = self.get_stream(driver)
+        if stream is None:
+            return None
+        frame = stream.latest(config.get('mjpeg_screenshot.max_age', 0.3),
+                              config.get('mjpeg_screenshot.wait_timeout', 1.0))
+        if frame is None:
+            with self._lock:
+                if not stream.alive:
+                    # 从未收到画面说明流不可用，稍后再试；收到过画面的流断开后下次截图直接重连
+                    self._streams.pop(driver, None)
+                    if not stream.frames:
+                        self._failures[driver] = time.time()
+            logger.debug("MJPEG流没有最新画面，使用截图命令")
+        return frame
+
+    def stop(self, driver: WebDriver):
+        """停止驱动的画面流"""
+        with self._lock:
+            stream = self._streams.pop(driver, None)
+        if stream is not None:
+            stream.stop()
+
+    def stats(self) -> Dict[str, int]:
+        """各画面流已接收的帧数"""
+        with self._lock:
+            return {stream.url: stream.frames for stream in self._streams.values()}
+
+
+# 全局MJPEG截图源实例
+mjpeg_source = MjpegScreenshotSource()
@@ -3,12 +3,14 @@
 提供截图功能，支持失败时自动截图
 """
 import os
+import threading
 import time
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 from appium.webdriver.webdriver import WebDriver
 from .logger import get_logger
+from .mjpeg_stream import mjpeg_source
 from ..config import config
 from ..core import driver_manager
 
@@ -19,10 +21,21 @@ class ScreenshotManager:
     """截图管理器"""
     
     def __init__(self, driver: WebDriver = None):
+        # 驱动按线程保存，全局实例在线程并行执行时各线程互不干扰
+        self._local = threading.local()
         self.driver = driver
         self.screenshot_dir = Path(config.get_test_config().get('screenshot_dir', './reports/screenshots'))
         self.screenshot_dir.mkdir(parents=True, exist_ok=True)
     
+    @property
+    def driver(self) -> Optional[WebDriver]:
+        """当前线程的WebDriver实例"""
+        return getattr(self._local, 'driver', None)
+    
+    @driver.setter
+    def driver(self, driver: Optional[WebDriver]):
+        self._local.driver = driver
+    
     def set_driver(self, driver: WebDriver):
         """设置WebDriver实例"""
         self.driver = driver
@@ -51,9 +64,14 @@ class ScreenshotManager:
             if not filename.endswith('.png'):
                 filename += '.png'
             
-            # 保存截图
-            filepath = self.screenshot_dir / filename
-            current_driver.save_screenshot(str(filepath))
+            # 保存截图：优先从MJPEG画面流取帧（JPEG），不可用时使用截图命令
+            frame = mjpeg_source.capture(current_driver) if mjpeg_source.enabled else None
+            if frame is not None:
+                filepath = (self.screenshot_dir / filename).with_suffix('.jpg')
+                filepath.write_bytes(frame)
+            else:
+                filepath = self.screenshot_dir / filename
+                current_driver.save_screenshot(str(filepath))
             
             logger.info(f"截图保存成功: {filepath}")
             
@@ -86,8 +104,9 @@ class ScreenshotManager:
         """添加到Allure报告"""
         try:
             import allure
+            attachment_type = allure.attachment_type.JPG if filepath.suffix == '.jpg' else allure.attachment_type.PNG
             with open(filepath, 'rb') as f:
-                allure.attach(f.read(), name=description, attachment_type=allure.attachment_type.PNG)
+                allure.attach(f.read(), name=description, attachment_type=attachment_type)
         except ImportError:
             pass  # Allure未安装时忽略
         except Exception as e:
@@ -97,7 +116,7 @@ class ScreenshotManager:
         """清理旧截图"""
         try:
             current_time = time.time()
-            for screenshot_file in self.screenshot_dir.glob("*.png"):
+            for screenshot_file in [*self.screenshot_dir.glob("*.png"), *self.screenshot_dir.glob("*.jpg")]:
                 file_time = screenshot_file.stat().st_mtime
                 if current_time - file_time > days * 24 * 3600:
                     screenshot_file.unlink()
@@ -0,0 +1,349 @@
+"""
+线程并行执行模块
+在同一进程内用多个线程并行执行用例（每个线程独占一台设备和自己的驱动），替代xdist多进程，节省重复导入和加载配置的内存
+"""
+import os
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+import pytest
+from allure_commons.reporter import ThreadContextItems
+from allure_commons.utils import uuid4
+from allure_pytest.listener import ItemCache
+from _pytest import runner
+from _pytest.fixtures import FixtureDef
+from _pytest.runner import SetupState
+from ..core.device_leaser import set_thread_worker
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 作用域比执行分组更大、会被多个线程共享的fixture
+SHARED_FIXTURE_SCOPES = ('session', 'package', 'module')
+
+
+def _update_current_test_var(item: pytest.Item, when: Optional[str]):
+    """PYTEST_CURRENT_TEST环境变量为进程级，多个线程同时执行时只保留最后写入的用例"""
+    if when:
+        os.environ['PYTEST_CURRENT_TEST'] = f"{item.nodeid} ({when})".replace("\x00", "(null)")
+    else:
+        os.environ.pop('PYTEST_CURRENT_TEST', None)
+
+
+def get_group_node(item: pytest.Item) -> pytest.Collector:
+    """用例的分组节点：测试类中的用例按类分组，模块级用例按模块分组（同xdist的loadscope）"""
+    return item.getparent(pytest.Class) or item.getparent(pytest.Module) or item.parent
+
+
+class ThreadSetupState:
+    """线程作用域的SetupState代理
+
+    每个线程维护自己的setup/teardown栈；注册在共享节点（分组节点的祖先，如session、module）上的
+    finalizer不随某个线程的最后一个用例执行，而是在所有线程结束后由主线程统一执行。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # {共享节点: finalizer列表}，按注册顺序
+        self._deferred: Dict[pytest.Collector, List[Callable[[], object]]] = OrderedDict()
+
+    @property
+    def _state(self) -> SetupState:
+        """当前线程的SetupState"""
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            state = self._local.state = SetupState()
+        return state
+
+    @property
+    def stack(self):
+        """当前线程的setup栈"""
+        return self._state.stack
+
+    def set_group(self, group_node: pytest.Collector):
+        """设置当前线程正在执行的分组，分组节点的祖先视为共享节点"""
+        self._local.shared_nodes = set(group_node.listchain()[:-1])
+
+    def is_node_active(self, node) -> bool:
+        return self._state.is_node_active(node)
+
+    def setup(self, item: pytest.Item):
+        self._state.setup(item)
+
+    def addfinalizer(self, finalizer: Callable[[], object], node):
+        if node in getattr(self._local, 'shared_nodes', ()):
+            assert node in self._state.stack, (node, self._state.stack)
+            with self._lock:
+                self._deferred.setdefault(node, []).append(finalizer)
+            return
+        self._state.addfinalizer(finalizer, node)
+
+    def teardown_exact(self, nextitem: Optional[pytest.Item]):
+        self._state.teardown_exact(nextitem)
+
+    def finish(self) -> List[BaseException]:
+        """执行共享节点的finalizer（深层节点先执行，同一节点后注册的先执行），返回出现的异常"""
+        exceptions = []
+        with self._lock:
+            nodes = sorted(self._deferred, key=lambda node: len(node.listchain()), reverse=True)
+            deferred = [(node, self._deferred[node]) for node in nodes]
+            self._deferred.clear()
+        for node, finalizers in deferred:
+            while finalizers:
+                finalizer = finalizers.pop()
+                try:
+                    finalizer()
+                except Exception as e:
+                    logger.error(f"清理 {node.nodeid or node.name} 失败: {e}")
+                    exceptions.append(e)
+        return exceptions
+
+
+class ThreadLocalFixtureAttr:
+    """FixtureDef属性描述符（线程并行执行期间挂到FixtureDef类上）
+
+    pytest把fixture的缓存值和finalizer保存在全局唯一的FixtureDef上，多个线程同时执行同一个
+    函数级fixture会互相覆盖。共享作用域的fixture仍使用实例属性，其余fixture按线程保存。
+    """
+
+    def __init__(self, name: str, default_factory: Callable[[], object]):
+        self.name = name
+        self.default_factory = default_factory
+        self._local = threading.local()
+
+    def _values(self) -> Dict[FixtureDef, object]:
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = self._local.values = {}
+        return values
+
+    def __get__(self, fixturedef, owner=None):
+        if fixturedef is None:
+            return self
+        if fixturedef.scope in SHARED_FIXTURE_SCOPES:
+            return fixturedef.__dict__[self.name]
+        values = self._values()
+        if fixturedef not in values:
+            values[fixturedef] = self.default_factory()
+        return values[fixturedef]
+
+    def __set__(self, fixturedef, value):
+        if fixturedef.scope in SHARED_FIXTURE_SCOPES:
+            fixturedef.__dict__[self.name] = value
+        else:
+            self._values()[fixturedef] = value
+
+
+class SharedThreadContextItems(ThreadContextItems):
+    """allure报告条目容器（线程并行执行期间替换原容器的类）
+
+    allure按线程记录条目，共享fixture的报告分组由首个使用它的线程创建，其他线程按uuid查找不到。
+    这里按uuid查找时回退到所有线程；"最后一个条目"仍按当前线程计算，步骤不会挂到其他线程的用例上。
+    执行期间不清理已结束线程的条目（共享分组可能仍在其中），结束后恢复原容器类时再清理。
+    """
+
+    @property
+    def thread_context(self):
+        context = self._thread_context[threading.current_thread()]
+        init_context = self._thread_context[self._init_thread]
+        if not context and threading.current_thread() is not self._init_thread and init_context:
+            uuid, last_item = next(reversed(init_context.items()))
+            context[uuid] = last_item
+        return context
+
+    def _find_context(self, key):
+        context = self.thread_context
+        if key in context:
+            return context
+        for other in list(self._thread_context.values()):
+            if key in other:
+                return other
+        return context
+
+    def __getitem__(self, item):
+        return self._find_context(item).__getitem__(item)
+
+    def get(self, key):
+        return self._find_context(key).get(key)
+
+    def pop(self, key):
+        return self._find_context(key).pop(key)
+
+    def cleanup(self):
+        pass
+
+
+class ThreadItemCache(ItemCache):
+    """allure的用例/fixture uuid缓存（线程并行执行期间替换原缓存的类），非共享作用域的fixture按线程缓存"""
+
+    _local = threading.local()
+
+    def _items_for(self, _id) -> dict:
+        if isinstance(_id, FixtureDef) and _id.scope not in SHARED_FIXTURE_SCOPES:
+            items = getattr(self._local, 'items', None)
+            if items is None:
+                items = self._local.items = {}
+            return items
+        return self._items
+
+    def get(self, _id):
+        return self._items_for(_id).get(id(_id))
+
+    def push(self, _id):
+        return self._items_for(_id).setdefault(id(_id), uuid4())
+
+    def pop(self, _id):
+        return self._items_for(_id).pop(id(_id), None)
+
+
+class ThreadExecutorPlugin:
+    """线程并行执行插件
+
+    接管pytest_runtestloop：按分组（测试类或模块）把用例放入队列，N个线程各自取整组执行，
+    同一分组内的用例始终在同一线程中按顺序执行，因此类级别的setup和驱动复用不受影响。
+    每个线程设置独立的worker标识（th0、th1...），设备租借、驱动和页面实例都按线程隔离。
+    """
+
+    def __init__(self, threads: int):
+        self.threads = threads
+        self._report_lock = threading.RLock()
+        self._fixture_lock = threading.RLock()
+
+    @staticmethod
+    def group_items(items: List[pytest.Item]) -> List[List[pytest.Item]]:
+        """按分组节点划分用例，保持收集顺序"""
+        groups: Dict[pytest.Collector, List[pytest.Item]] = OrderedDict()
+        for item in items:
+            groups.setdefault(get_group_node(item), []).append(item)
+        return list(groups.values())
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session: pytest.Session):
+        """线程并行执行用例"""
+        if session.testsfailed and not session.config.option.continue_on_collection_errors:
+            raise session.Interrupted(
+                f"{session.testsfailed} error{'s' if session.testsfailed != 1 else ''} during collection"
+            )
+        if session.config.option.collectonly:
+            return True
+
+        groups = self.group_items(session.items)
+        work: "queue.Queue[List[pytest.Item]]" = queue.Queue()
+        for group in groups:
+            work.put(group)
+
+        errors: List[BaseException] = []
+        thread_count = max(1, min(self.threads, len(groups)))
+        logger.info(f"线程并行执行: {len(session.items)} 个用例, {len(groups)} 个分组, {thread_count} 个线程")
+        with self._thread_safe_internals(session) as setup_state:
+            workers = [
+                threading.Thread(target=self._run_worker, args=(f"th{index}", session, work, setup_state, errors),
+                                 name=f"test-worker-{index}", daemon=True)
+                for index in range(thread_count)
+            ]
+            try:
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    # 限时join，主线程仍可响应Ctrl+C
+                    while worker.is_alive():
+                        worker.join(0.2)
+            except KeyboardInterrupt:
+                session.shouldstop = "KeyboardInterrupt"
+                raise
+            finally:
+                for _ in setup_state.finish():
+                    session.testsfailed += 1
+
+        if errors:
+            raise errors[0]
+        if session.shouldfail:
+            raise session.Failed(session.shouldfail)
+        if session.shouldstop:
+            raise session.Interrupted(session.shouldstop)
+        return True
+
+    @contextmanager
+    def _thread_safe_internals(self, session: pytest.Session):
+        """执行期间替换pytest和allure中按进程共享的状态，结束后恢复"""
+        allure_listener = session.config.pluginmanager.get_plugin('allure_listener')
+        if allure_listener is not None:
+            allure_listener.allure_logger._items.__class__ = SharedThreadContextItems
+            allure_listener._cache.__class__ = ThreadItemCache
+        setup_state = ThreadSetupState()
+        original_setup_state = session._setupstate
+        original_execute = FixtureDef.execute
+        original_update_current_test_var = runner._update_current_test_var
+        session._setupstate = setup_state
+        FixtureDef.execute = self._locked_execute(original_execute)
+        FixtureDef.cached_result = ThreadLocalFixtureAttr('cached_result', lambda: None)
+        FixtureDef._finalizers = ThreadLocalFixtureAttr('_finalizers', list)
+        runner._update_current_test_var = _update_current_test_var
+        try:
+            yield setup_state
+        finally:
+            runner._update_current_test_var = original_update_current_test_var
+            FixtureDef.execute = original_execute
+            del FixtureDef.cached_result
+            del FixtureDef._finalizers
+            session._setupstate = original_setup_state
+            if allure_listener is not None:
+                allure_listener.allure_logger._items.__class__ = ThreadContextItems
+                allure_listener._cache.__class__ = ItemCache
+
+    def _run_worker(self, worker_id: str, session: pytest.Session, work: "queue.Queue[List[pytest.Item]]",
+                    setup_state: ThreadSetupState, errors: List[BaseException]):
+        """工作线程：逐组取出用例执行，出现失败上限或中断时停止"""
+        set_thread_worker(worker_id)
+        try:
+            while not (session.shouldfail or session.shouldstop or errors):
+                try:
+                    group = work.get_nowait()
+                except queue.Empty:
+                    return
+                setup_state.set_group(get_group_node(group[0]))
+                for index, item in enumerate(group):
+                    nextitem = group[index + 1] if index + 1 < len(group) else None
+                    item.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+                    if session.shouldfail or session.shouldstop:
+                        # 已开始的分组仍需拆除setup栈
+                        if nextitem is not None:
+                            setup_state.teardown_exact(None)
+                        return
+        except BaseException as e:
+            logger.error(f"执行线程 {worker_id} 异常: {e}")
+            errors.append(e)
+        finally:
+            set_thread_worker(None)
+
+    def _locked_execute(self, original_execute):
+        """共享作用域的fixture串行初始化，避免多个线程同时创建同一个fixture"""
+        lock = self._fixture_lock
+
+        def execute(fixturedef, request):
+            if fixturedef.scope not in SHARED_FIXTURE_SCOPES:
+                return original_execute(fixturedef, request)
+            with lock:
+                return original_execute(fixturedef, request)
+
+        return execute
+
+    # 用例报告在多个线程中产生，串行化以免终端输出和统计交错
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_logstart(self, nodeid, location):
+        with self._report_lock:
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_logreport(self, report):
+        with self._report_lock:
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_logfinish(self, nodeid, location):
+        with self._report_lock:
+            yield